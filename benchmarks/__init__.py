@@ -0,0 +1,9 @@
+"""
+Performance benchmarks for the Weight Tracker API.
+
+    python -m benchmarks run [--users 5] [--years 2] [--output results.json]
+    python -m benchmarks compare baseline.json results.json
+
+The standalone scripts in this directory measure individual subsystems
+(storage profiles, logging); ``python -m benchmarks`` covers every API route.
+"""
@@ -0,0 +1,80 @@
+import argparse
+import json
+import sys
+
+from benchmarks import __doc__ as usage
+from benchmarks.compare import compare_reports
+from benchmarks.datagen import DatasetSpec
+
+
+def _run(args):
+    from benchmarks.runner import format_report, run, write_report
+
+    spec = DatasetSpec(users=args.users, years=args.years, goals_per_user=args.goals,
+                       measured_ratio=args.measured_ratio, seed=args.seed)
+    report = run(spec, iterations=args.iterations, warmup=args.warmup, only=args.only,
+                 server=args.server, clients=args.clients, seconds=args.seconds)
+    print(format_report(report))
+    if args.output:
+        write_report(report, args.output)
+        print(f"Report written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            return _report_comparison(json.load(baseline), report, args.threshold)
+    return 0
+
+
+def _compare(args):
+    with open(args.baseline) as baseline, open(args.current) as current:
+        return _report_comparison(json.load(baseline), json.load(current), args.threshold)
+
+
+def _report_comparison(baseline, current, threshold):
+    regressions, missing = compare_reports(baseline, current, threshold=threshold)
+    for key in missing:
+        print(f"missing   {key}")
+    for key, problems in regressions.items():
+        print(f"REGRESSED {key}: {'; '.join(problems)}")
+    if not regressions:
+        print(f"No regressions (threshold {threshold:.0%})")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=usage,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='seed a temporary database and benchmark the API')
+    run_parser.add_argument('--users', type=int, default=5)
+    run_parser.add_argument('--years', type=float, default=2, help='years of daily entries per user')
+    run_parser.add_argument('--goals', type=int, default=3, help='goals per user')
+    run_parser.add_argument('--measured-ratio', type=float, default=0.5,
+                            help='share of entries with neck/belly/hip measurements')
+    run_parser.add_argument('--seed', type=int, default=1234)
+    run_parser.add_argument('--iterations', type=int, default=50, help='timed requests per scenario')
+    run_parser.add_argument('--warmup', type=int, default=5)
+    run_parser.add_argument('--only', action='append', metavar='PREFIX',
+                            help='only run scenarios starting with PREFIX (repeatable)')
+    run_parser.add_argument('--server', action='store_true',
+                            help='also load-test read-only routes through a threaded WSGI server')
+    run_parser.add_argument('--clients', type=int, default=8, help='concurrent clients in --server mode')
+    run_parser.add_argument('--seconds', type=float, default=3.0, help='duration per scenario in --server mode')
+    run_parser.add_argument('--output', help='write the JSON report here')
+    run_parser.add_argument('--baseline', help='compare against this saved report')
+    run_parser.add_argument('--threshold', type=float, default=0.2)
+    run_parser.set_defaults(handler=_run)
+
+    compare_parser = commands.add_parser('compare', help='flag regressions between two reports')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.2,
+                                help='allowed relative slowdown (default 0.2 = 20%%)')
+    compare_parser.set_defaults(handler=_compare)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""
+Compare a benchmark report against a saved baseline.
+
+A scenario regresses when its p95 latency grows by more than the threshold
+(and by more than ``min_delta_ms``, so sub-millisecond noise is ignored), when
+it runs more SQL statements per request, or when server throughput drops by
+more than the threshold.
+"""
+
+
+def _regressions(name, base, current, threshold, min_delta_ms):
+    problems = []
+    if base.get('p95_ms') is not None and current.get('p95_ms') is not None:
+        delta = current['p95_ms'] - base['p95_ms']
+        if delta > min_delta_ms and current['p95_ms'] > base['p95_ms'] * (1 + threshold):
+            problems.append(f"p95 {base['p95_ms']} -> {current['p95_ms']} ms")
+    if base.get('queries_per_request') is not None and current.get('queries_per_request') is not None:
+        if current['queries_per_request'] > base['queries_per_request'] + 0.01:
+            problems.append(f"queries/request {base['queries_per_request']} -> {current['queries_per_request']}")
+    if base.get('throughput_rps') and current.get('throughput_rps') is not None and name.startswith('server:'):
+        if current['throughput_rps'] < base['throughput_rps'] * (1 - threshold):
+            problems.append(f"throughput {base['throughput_rps']} -> {current['throughput_rps']} req/s")
+    if current.get('errors', 0) > base.get('errors', 0):
+        problems.append(f"errors {base.get('errors', 0)} -> {current['errors']}")
+    return problems
+
+
+def compare_reports(baseline, current, threshold=0.2, min_delta_ms=0.5):
+    """
+    Return ``(regressions, missing)``.
+
+    ``regressions`` maps ``section:scenario`` to a list of human-readable
+    problems; ``missing`` lists scenarios present in the baseline only.
+    """
+    regressions = {}
+    missing = []
+    for section in ('client', 'server'):
+        for name, base in baseline.get(section, {}).items():
+            key = f'{section}:{name}'
+            result = current.get(section, {}).get(name)
+            if result is None:
+                if section in current:
+                    missing.append(key)
+                continue
+            problems = _regressions(key, base, result, threshold, min_delta_ms)
+            if problems:
+                regressions[key] = problems
+    return regressions, missing
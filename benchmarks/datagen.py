@@ -0,0 +1,94 @@
+"""
+Synthetic data for the benchmarks.
+
+Generates users with a daily entry for a number of years and a handful of goals
+each.  A fixed seed makes every run produce the same database, so results from
+different commits can be compared.
+"""
+import random
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+
+PASSWORD = 'bench'
+
+
+@dataclass
+class DatasetSpec:
+    users: int = 5
+    years: float = 2
+    goals_per_user: int = 3
+    # Share of entries that also record neck/belly (and hip for women)
+    measured_ratio: float = 0.5
+    seed: int = 1234
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _entry_rows(rng, user_id, sex, days, start, measured_ratio):
+    weight = rng.uniform(60, 100)
+    belly = weight + rng.uniform(0, 15)
+    for day in range(days):
+        weight += rng.gauss(-0.01, 0.3)
+        belly += rng.gauss(-0.01, 0.2)
+        row = {
+            'date': (start + timedelta(days=day)).strftime('%Y-%m-%d'),
+            'weight': round(weight, 1),
+            'user_id': user_id
+        }
+        if rng.random() < measured_ratio:
+            row['neck'] = round(rng.uniform(32, 42), 1)
+            row['belly'] = round(belly, 1)
+            if sex == 'female':
+                row['hip'] = round(rng.uniform(90, 110), 1)
+        yield row
+
+
+def populate(spec: DatasetSpec) -> dict:
+    """
+    Fill the current app's database according to ``spec``.
+
+    Must be called inside an application context.  Returns the ids of the
+    generated users, entries and goals for the benchmark scenarios to use.
+    """
+    from weight_tracker.bulk import import_entries
+    from weight_tracker.models import db, Entry, Goal, User
+
+    rng = random.Random(spec.seed)
+    days = max(1, int(spec.years * 365))
+    start = datetime(2020, 1, 1)
+
+    users = []
+    for index in range(spec.users):
+        sex = 'male' if index % 2 == 0 else 'female'
+        user = User(username=f'bench{index}', name=f'Bench User {index}', age=rng.randint(20, 70),
+                    sex=sex, height=round(rng.uniform(155, 195), 1))
+        user.set_password(PASSWORD)
+        users.append(user)
+    db.session.add_all(users)
+    db.session.commit()
+
+    for user in users:
+        import_entries(_entry_rows(rng, user.id, user.sex, days, start, spec.measured_ratio))
+
+    goals = []
+    now = datetime.now()
+    for user in users:
+        for index in range(spec.goals_per_user):
+            goals.append(Goal(
+                user_id=user.id,
+                start_date=now - timedelta(days=30 * (index + 1)),
+                target_date=now + timedelta(days=30 * (index + 1)),
+                target_weight=round(rng.uniform(60, 90), 1),
+                target_fat_percentage=round(rng.uniform(10, 25), 1),
+                description=f'Goal {index}'
+            ))
+    db.session.add_all(goals)
+    db.session.commit()
+
+    return {
+        'user_ids': [user.id for user in users],
+        'usernames': [user.username for user in users],
+        'entry_ids': [entry_id for (entry_id,) in db.session.query(Entry.id).order_by(Entry.id)],
+        'goal_ids': [goal.id for goal in goals]
+    }
@@ -0,0 +1,93 @@
+"""
+Per-request cost of application logging on the request thread.
+
+Simulates the log calls a typical API request makes (one INFO line and two
+DEBUG lines with formatted values) under three configurations:
+
+  legacy        synchronous FileHandler + StreamHandler at DEBUG, f-string messages
+                (the configuration before the queue-based pipeline)
+  queue-debug   QueueHandler/QueueListener pipeline at DEBUG, lazy %-style messages
+  queue-info    the same pipeline at INFO, the production default
+
+Only time spent on the calling thread is measured; console output goes to
+/dev/null so terminal speed does not skew the results.
+
+    python benchmarks/logging_overhead.py [--requests 20000]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from weight_tracker.logging_setup import LOG_FORMAT, configure_logging, stop_logging  # noqa: E402
+
+ROWS = list(range(365))
+
+
+def legacy_request(logger, user_id):
+    logger.info("Processing GET request for entries")
+    logger.debug(f"Retrieved {len(ROWS)} entries")
+    logger.debug(f"Calculated progress for {len(ROWS) // 100} goals for user {user_id}")
+
+
+def lazy_request(logger, user_id):
+    logger.info("Processing GET request for entries")
+    logger.debug("Retrieved %s entries", len(ROWS))
+    logger.debug("Calculated progress for %s goals for user %s", len(ROWS) // 100, user_id)
+
+
+def configure_legacy(log_file):
+    stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    formatter = logging.Formatter(LOG_FORMAT)
+    for handler in (logging.FileHandler(log_file), logging.StreamHandler(sys.stderr)):
+        handler.setFormatter(formatter)
+        root.addHandler(handler)
+    root.setLevel(logging.DEBUG)
+
+
+def measure(request, requests):
+    logger = logging.getLogger('weight_tracker.bench')
+    start = time.perf_counter()
+    for i in range(requests):
+        request(logger, i)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    stdout = sys.stdout
+    sys.stderr = open(os.devnull, 'w')
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = os.path.join(tmp, 'app.log')
+
+        configure_legacy(log_file)
+        results['legacy'] = measure(legacy_request, args.requests)
+
+        configure_logging('DEBUG', log_file)
+        results['queue-debug'] = measure(lazy_request, args.requests)
+        stop_logging()
+
+        configure_logging('INFO', log_file)
+        results['queue-info'] = measure(lazy_request, args.requests)
+        stop_logging()
+
+    baseline = results['legacy']
+    print(f"{'configuration':<14}{'us/request':>12}{'vs legacy':>11}", file=stdout)
+    for name, micros in results.items():
+        print(f"{name:<14}{micros:>12.2f}{baseline / micros:>10.1f}x", file=stdout)
+
+
+if __name__ == '__main__':
+    main()
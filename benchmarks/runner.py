@@ -0,0 +1,361 @@
+"""
+Drive every API route against a seeded database and measure it.
+
+Each scenario is one request shape (method, path and body).  In-process runs
+use the Flask test client and record per-request latency and the number of SQL
+statements executed; server runs start a threaded WSGI server and hammer the
+read-only scenarios from concurrent client threads.
+"""
+import itertools
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Optional
+
+from benchmarks.datagen import PASSWORD, populate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    # Formatted with the dataset ids plus whatever prepare() returns
+    path: str
+    # A JSON body, or a callable (ctx, iteration, values) -> body
+    body: object = None
+    # Untimed setup run before every request, e.g. creating the row a DELETE removes
+    prepare: Optional[Callable] = None
+    # Read-only scenarios are also run against the WSGI server by concurrent clients
+    read_only: bool = False
+
+    def build(self, client, ctx, iteration):
+        values = {
+            'user_id': ctx['user_ids'][iteration % len(ctx['user_ids'])],
+            'entry_id': ctx['entry_ids'][iteration % len(ctx['entry_ids'])],
+            'goal_id': ctx['goal_ids'][iteration % len(ctx['goal_ids'])] if ctx['goal_ids'] else 0
+        }
+        if self.prepare is not None:
+            values.update(self.prepare(client, ctx, values))
+        body = self.body(ctx, iteration, values) if callable(self.body) else self.body
+        return self.path.format(**values), body
+
+
+def _new_entry(client, ctx, values):
+    response = client.post('/api/entries', json={
+        'date': '2019-06-01', 'weight': 80, 'neck': 40, 'belly': 90, 'user_id': values['user_id']
+    })
+    return {'entry_id': response.get_json()['id']}
+
+
+def _one_change(client, ctx, values):
+    # The user's current version, read without returning any rows, then one new entry
+    response = client.get(f"/api/sync/user/{values['user_id']}?since_time=9999-01-01T00:00:00")
+    return dict(_new_entry(client, ctx, values), since=response.get_json()['version'])
+
+
+def _new_goal(client, ctx, values):
+    response = client.post('/api/goals', json={
+        'target_weight': 75, 'target_date': '2030-01-01', 'user_id': values['user_id']
+    })
+    return {'goal_id': response.get_json()['id']}
+
+
+def _new_user(client, ctx, values):
+    username = f"scratch{next(ctx['counter'])}"
+    response = client.post('/api/register', json={
+        'username': username, 'password': PASSWORD, 'sex': 'male', 'height': 180
+    })
+    user_id = response.get_json()['user']['id']
+    client.post(f'/api/entries/import?user_id={user_id}', json=[
+        {'date': f'2021-01-{day:02d}', 'weight': 80, 'neck': 40, 'belly': 90} for day in range(1, 29)
+    ])
+    return {'user_id': user_id}
+
+
+def _import_body(ctx, iteration, values):
+    # Dates far in the past so imports never collide with generated history
+    return [{'date': f'{1900 + iteration % 100}-{month:02d}-15', 'weight': 80, 'user_id': values['user_id']}
+            for month in range(1, 13)]
+
+
+SCENARIOS = [
+    # auth
+    Scenario('auth.register', 'POST', '/api/register',
+             lambda ctx, i, v: {'username': f"reg{next(ctx['counter'])}", 'password': PASSWORD}),
+    Scenario('auth.login', 'POST', '/api/login',
+             lambda ctx, i, v: {'username': ctx['usernames'][i % len(ctx['usernames'])], 'password': PASSWORD}),
+    Scenario('auth.status', 'GET', '/api/status', read_only=True),
+    Scenario('auth.logout', 'POST', '/api/logout'),
+    # debug
+    Scenario('debug.status', 'GET', '/api/debug/status', read_only=True),
+    Scenario('debug.metrics', 'GET', '/api/debug/metrics', read_only=True),
+    # entries
+    Scenario('entries.list', 'GET', '/api/entries', read_only=True),
+    Scenario('entries.list_page', 'GET', '/api/entries?limit=100', read_only=True),
+    Scenario('entries.user', 'GET', '/api/entries/user/{user_id}', read_only=True),
+    Scenario('entries.user_page', 'GET', '/api/entries/user/{user_id}?limit=100', read_only=True),
+    Scenario('entries.export_ndjson', 'GET', '/api/entries/export?format=ndjson&user_id={user_id}',
+             read_only=True),
+    Scenario('entries.export_csv', 'GET', '/api/entries/export?format=csv&user_id={user_id}', read_only=True),
+    Scenario('entries.aggregate_week', 'GET', '/api/entries/user/{user_id}/aggregate?bucket=week',
+             read_only=True),
+    Scenario('entries.aggregate_lttb', 'GET', '/api/entries/user/{user_id}/aggregate?mode=lttb&points=200',
+             read_only=True),
+    Scenario('entries.add', 'POST', '/api/entries',
+             lambda ctx, i, v: {'date': '2019-01-01', 'weight': 80, 'neck': 40, 'belly': 90,
+                                'user_id': v['user_id']}),
+    Scenario('entries.import', 'POST', '/api/entries/import?mode=upsert', _import_body),
+    Scenario('entries.update', 'PUT', '/api/entries/{entry_id}',
+             lambda ctx, i, v: {'weight': 80 + i % 5}),
+    Scenario('entries.delete', 'DELETE', '/api/entries/{entry_id}', prepare=_new_entry),
+    # goals
+    Scenario('goals.list', 'GET', '/api/goals', read_only=True),
+    Scenario('goals.get', 'GET', '/api/goals/{goal_id}', read_only=True),
+    Scenario('goals.user', 'GET', '/api/goals/user/{user_id}', read_only=True),
+    Scenario('goals.add', 'POST', '/api/goals',
+             lambda ctx, i, v: {'target_weight': 75, 'target_date': '2030-01-01', 'user_id': v['user_id']}),
+    Scenario('goals.batch', 'POST', '/api/goals/batch',
+             lambda ctx, i, v: [{'target_weight': 75, 'target_date': '2030-01-01',
+                                 'user_ids': ctx['user_ids'][:10]}]),
+    Scenario('goals.update', 'PUT', '/api/goals/{goal_id}',
+             lambda ctx, i, v: {'target_weight': 70 + i % 5}),
+    Scenario('goals.delete', 'DELETE', '/api/goals/{goal_id}', prepare=_new_goal),
+    # progress
+    Scenario('progress.all', 'GET', '/api/progress', read_only=True),
+    Scenario('progress.user', 'GET', '/api/progress/user/{user_id}', read_only=True),
+    # analytics
+    Scenario('analytics.cohort', 'GET', '/api/analytics/cohort', read_only=True),
+    # delta sync
+    Scenario('sync.snapshot', 'GET', '/api/sync/user/{user_id}', read_only=True),
+    Scenario('sync.changes', 'GET', '/api/sync/user/{user_id}?since={since}', prepare=_one_change),
+    # users
+    Scenario('users.list', 'GET', '/api/users', read_only=True),
+    Scenario('users.get', 'GET', '/api/users/{user_id}', read_only=True),
+    Scenario('users.add', 'POST', '/api/users',
+             lambda ctx, i, v: {'name': f'Added {i}', 'sex': 'male', 'height': 180}),
+    Scenario('users.update', 'PUT', '/api/users/{user_id}',
+             lambda ctx, i, v: {'name': f'Bench User {i}'}),
+    Scenario('users.update_profile', 'PUT', '/api/users/{user_id}',
+             lambda ctx, i, v: {'height': 170 + i % 2}),
+    Scenario('users.delete', 'DELETE', '/api/users/{user_id}', prepare=_new_user),
+]
+
+
+def percentile(sorted_values, fraction):
+    """Linearly interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def peak_rss_mb():
+    """High-water mark of this process's resident set size."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def summarize(latencies, queries, errors, elapsed):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3) if count else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3) if count else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if count else None,
+        'mean_ms': round(sum(latencies) / count * 1000, 3) if count else None,
+        'throughput_rps': round(count / elapsed, 1) if elapsed else None,
+        'queries_per_request': round(queries / count, 2) if count and queries is not None else None,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self.count += 1
+
+
+def run_client(app, counter, ctx, scenarios, iterations, warmup):
+    """Time each scenario sequentially through the Flask test client."""
+    client = app.test_client()
+    results = {}
+    for scenario in scenarios:
+        latencies = []
+        queries = 0
+        errors = 0
+        elapsed = 0.0
+        for iteration in range(warmup + iterations):
+            path, body = scenario.build(client, ctx, iteration)
+            before = counter.count
+            start = time.perf_counter()
+            response = client.open(path, method=scenario.method, json=body)
+            # Streamed bodies are produced while they are read
+            response.get_data()
+            duration = time.perf_counter() - start
+            response.close()
+            if iteration < warmup:
+                continue
+            latencies.append(duration)
+            elapsed += duration
+            queries += counter.count - before
+            if response.status_code >= 400:
+                errors += 1
+        results[scenario.name] = summarize(latencies, queries, errors, elapsed)
+    return results
+
+
+def load_test(base_url, ctx, scenarios, clients, seconds, counter=None):
+    """
+    Run each read-only scenario against the server at ``base_url`` from concurrent clients.
+
+    ``counter`` counts SQL statements when the server runs in this process.
+    """
+    results = {}
+    for scenario in scenarios:
+        if not scenario.read_only:
+            continue
+        latencies = []
+        errors = [0]
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def worker(offset):
+            local = []
+            local_errors = 0
+            for iteration in itertools.count(offset * 1000):
+                if time.perf_counter() >= deadline:
+                    break
+                path, _ = scenario.build(None, ctx, iteration)
+                start = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(base_url + path) as response:
+                        response.read()
+                except urllib.error.URLError:
+                    local_errors += 1
+                local.append(time.perf_counter() - start)
+            with lock:
+                latencies.extend(local)
+                errors[0] += local_errors
+
+        before = counter.count if counter is not None else None
+        workers = [threading.Thread(target=worker, args=(index,)) for index in range(clients)]
+        start = time.perf_counter()
+        for worker_thread in workers:
+            worker_thread.start()
+        for worker_thread in workers:
+            worker_thread.join()
+        elapsed = time.perf_counter() - start
+        queries = counter.count - before if counter is not None else None
+        results[scenario.name] = summarize(latencies, queries, errors[0], elapsed)
+    return results
+
+
+def run_server(app, counter, ctx, scenarios, clients, seconds):
+    """Load-test the read-only scenarios through a threaded WSGI server in this process."""
+    from werkzeug.serving import make_server
+
+    # The development server logs every request
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        return load_test(f'http://127.0.0.1:{server.server_port}', ctx, scenarios, clients, seconds, counter)
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+def run(spec, iterations=50, warmup=5, only=None, server=False, clients=8, seconds=3.0):
+    """
+    Seed a temporary database from ``spec`` and benchmark the selected scenarios.
+
+    ``only`` is an optional list of scenario-name prefixes (e.g. ``['entries.']``).
+    Returns the report as a JSON-serialisable dict.
+    """
+    scenarios = [scenario for scenario in SCENARIOS
+                 if not only or any(scenario.name.startswith(prefix) for prefix in only)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # weight_tracker reads its configuration from the environment at import time
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        os.environ.setdefault('LOG_LEVEL', 'CRITICAL')
+        sys.path.insert(0, ROOT)
+        from sqlalchemy import event
+        from weight_tracker import create_app
+        from weight_tracker.models import db
+
+        app = create_app()
+        counter = _QueryCounter()
+        with app.app_context():
+            seed_start = time.perf_counter()
+            ids = populate(spec)
+            seed_seconds = time.perf_counter() - seed_start
+            event.listen(db.engine, 'before_cursor_execute', counter)
+
+        ctx = dict(ids, counter=itertools.count())
+        report = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'storage_profile': app.config['STORAGE_PROFILE'],
+                'dataset': spec.to_dict(),
+                'entries': len(ids['entry_ids']),
+                'seed_seconds': round(seed_seconds, 2),
+                'iterations': iterations,
+                'warmup': warmup
+            },
+            'client': run_client(app, counter, ctx, scenarios, iterations, warmup)
+        }
+        if server:
+            report['meta'].update(clients=clients, seconds=seconds)
+            report['server'] = run_server(app, counter, ctx, scenarios, clients, seconds)
+        report['meta']['peak_rss_mb'] = peak_rss_mb()
+
+        with app.app_context():
+            db.engine.dispose()
+    return report
+
+
+def write_report(report, path):
+    with open(path, 'w') as output:
+        json.dump(report, output, indent=2, sort_keys=True)
+        output.write('\n')
+
+
+def format_report(report):
+    lines = []
+    for section in ('client', 'server'):
+        if section not in report:
+            continue
+        lines.append(f"[{section}]")
+        lines.append(f"{'scenario':<28}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}"
+                     f"{'queries':>9}{'errors':>8}")
+        for name, result in report[section].items():
+            lines.append(f"{name:<28}{result['p50_ms']:>9}{result['p95_ms']:>9}{result['p99_ms']:>9}"
+                         f"{result['throughput_rps']:>9}{result['queries_per_request']:>9}"
+                         f"{result['errors']:>8}")
+    lines.append(f"peak RSS: {report['meta']['peak_rss_mb']} MB")
+    return '\n'.join(lines)
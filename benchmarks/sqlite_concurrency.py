@@ -0,0 +1,110 @@
+"""
+Concurrent read/write throughput of the SQLite storage profiles.
+
+Runs the same mixed workload - reader threads paging through a user's entries
+while writer threads add entries - against a fresh temporary database once per
+storage profile.  Each profile runs in its own interpreter because the profile
+is read from the environment when weight_tracker.config is imported.
+
+    python benchmarks/sqlite_concurrency.py [--readers 8] [--writers 4] [--seconds 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILES = ('default', 'production')
+
+
+def run_workload(readers, writers, seconds, seed_entries):
+    """Run the workload in this process and return the measured counters."""
+    sys.path.insert(0, ROOT)
+    from weight_tracker import create_app
+
+    app = create_app()
+    client = app.test_client()
+    user = client.post('/api/register', json={
+        'username': 'bench', 'password': 'bench', 'sex': 'male', 'height': 180
+    }).get_json()['user']
+    client.post(f"/api/entries/import?user_id={user['id']}", json=[
+        {'date': f"{2000 + i // 365}-{(i // 28) % 12 + 1:02d}-{i % 28 + 1:02d}",
+         'weight': 80 + i % 7, 'neck': 40, 'belly': 90}
+        for i in range(seed_entries)
+    ])
+
+    counters = {'reads': 0, 'writes': 0, 'read_errors': 0, 'write_errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def reader():
+        local = app.test_client()
+        while time.perf_counter() < deadline:
+            ok = local.get(f"/api/entries/user/{user['id']}?limit=100").status_code == 200
+            with lock:
+                counters['reads' if ok else 'read_errors'] += 1
+
+    def writer():
+        local = app.test_client()
+        while time.perf_counter() < deadline:
+            response = local.post('/api/entries', json={
+                'weight': 80, 'neck': 40, 'belly': 90, 'user_id': user['id']
+            })
+            with lock:
+                counters['writes' if response.status_code == 201 else 'write_errors'] += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    counters['reads_per_second'] = round(counters['reads'] / elapsed, 1)
+    counters['writes_per_second'] = round(counters['writes'] / elapsed, 1)
+    return counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--seed-entries', type=int, default=5000)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # Keep stdout clean for the JSON result
+        import logging
+        logging.disable(logging.CRITICAL)
+        print(json.dumps(run_workload(args.readers, args.writers, args.seconds, args.seed_entries)))
+        return
+
+    results = {}
+    for profile in PROFILES:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, STORAGE_PROFILE=profile,
+                       DATABASE_URL='sqlite:///' + os.path.join(tmp, 'bench.db'))
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child',
+                 '--readers', str(args.readers), '--writers', str(args.writers),
+                 '--seconds', str(args.seconds), '--seed-entries', str(args.seed_entries)],
+                env=env, check=True, capture_output=True, text=True
+            ).stdout
+        results[profile] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'profile':<12}{'reads/s':>10}{'writes/s':>10}{'read err':>10}{'write err':>11}")
+    for profile, result in results.items():
+        print(f"{profile:<12}{result['reads_per_second']:>10}{result['writes_per_second']:>10}"
+              f"{result['read_errors']:>10}{result['write_errors']:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Cold-start time of the application, each sample in a fresh Python process.
+
+Seeds one temporary database, then measures:
+
+  import         import weight_tracker
+  create_app     create_app() against the already migrated database
+  first request  the first /api/debug/status through the test client
+  first compute  the first request that needs NumPy (/api/progress/user/<id>)
+  flask run      spawning python -m flask run until it answers a request
+  gunicorn       spawning gunicorn -c gunicorn.conf.py until it answers a request
+
+Medians over --repeat runs are reported in milliseconds.
+
+    python -m benchmarks.startup [--repeat 5] [--workers 2] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.datagen import DatasetSpec, populate
+from benchmarks.runner import ROOT
+from benchmarks.wsgi_servers import _free_port, _server_commands, _wait_until_ready
+
+# Run in a fresh interpreter; prints the in-process timings as JSON
+_IN_PROCESS = """
+import json, sys, time
+start = time.perf_counter()
+import weight_tracker
+imported = time.perf_counter()
+app = weight_tracker.create_app()
+created = time.perf_counter()
+client = app.test_client()
+client.get('/api/debug/status')
+requested = time.perf_counter()
+client.get('/api/progress/user/%d')
+computed = time.perf_counter()
+print(json.dumps({
+    'import': 1000 * (imported - start),
+    'create_app': 1000 * (created - imported),
+    'first request': 1000 * (requested - created),
+    'first compute': 1000 * (computed - requested),
+}))
+"""
+
+
+def _in_process(env, user_id):
+    output = subprocess.run([sys.executable, '-c', _IN_PROCESS % user_id], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _server_ready_ms(name, env, workers):
+    port = _free_port()
+    command, extra_env = _server_commands(port, workers, 1)[name]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=dict(env, **extra_env),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_until_ready(f'http://127.0.0.1:{port}', process, poll_interval=0.01)
+        return 1000 * (time.perf_counter() - start)
+    finally:
+        process.terminate()
+        process.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args()
+
+    samples = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(tmp, 'bench.db'),
+                   LOG_LEVEL='WARNING', PYTHONPATH=ROOT)
+        os.environ.update(env)
+        sys.path.insert(0, ROOT)
+        from weight_tracker import create_app
+        from weight_tracker.models import db
+
+        app = create_app()
+        with app.app_context():
+            user_id = populate(DatasetSpec(users=2, years=1))['user_ids'][0]
+            db.engine.dispose()
+
+        for _ in range(args.repeat):
+            for stage, ms in _in_process(env, user_id).items():
+                samples.setdefault(stage, []).append(ms)
+            for name in ('flask', 'gunicorn'):
+                samples.setdefault(f'{name} ready', []).append(_server_ready_ms(name, env, args.workers))
+
+    results = {stage: round(statistics.median(values), 1) for stage, values in samples.items()}
+    for stage, ms in results.items():
+        print(f"{stage:<16}{ms:>10.1f} ms")
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'args': vars(args), 'results': results}, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
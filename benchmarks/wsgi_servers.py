@@ -0,0 +1,117 @@
+"""
+Throughput of the development server vs gunicorn under concurrent clients.
+
+Seeds one temporary database, then starts each server against it in turn as a
+subprocess and load-tests the read-only API routes:
+
+  flask     python -m flask run - the single-process Werkzeug development
+            server the Docker image used to run
+  gunicorn  gunicorn -c gunicorn.conf.py weight_tracker.wsgi:app with
+            --workers processes of --threads threads
+
+    python -m benchmarks.wsgi_servers [--clients 16] [--seconds 5] [--workers 4] [--threads 4]
+"""
+import argparse
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.datagen import DatasetSpec, populate
+from benchmarks.runner import ROOT, SCENARIOS, load_test
+
+DEFAULT_SCENARIOS = ('entries.user_page', 'entries.aggregate_week', 'goals.user',
+                     'progress.user', 'users.get')
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_ready(base_url, process, timeout=30, poll_interval=0.2):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            with urllib.request.urlopen(base_url + '/api/debug/status', timeout=1):
+                return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(poll_interval)
+    raise RuntimeError("Server did not start in time")
+
+
+def _server_commands(port, workers, threads):
+    return {
+        'flask': ([sys.executable, '-m', 'flask', '--app', 'weight_tracker', 'run',
+                   '--host', '127.0.0.1', '--port', str(port)], {}),
+        'gunicorn': ([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'weight_tracker.wsgi:app'],
+                     {'BIND': f'127.0.0.1:{port}', 'WEB_CONCURRENCY': str(workers),
+                      'GUNICORN_THREADS': str(threads)}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--years', type=float, default=2)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--storage-profile', default='production')
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args()
+
+    scenarios = [scenario for scenario in SCENARIOS if scenario.name in DEFAULT_SCENARIOS]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(tmp, 'bench.db'),
+                   STORAGE_PROFILE=args.storage_profile, LOG_LEVEL='WARNING',
+                   METRICS_SLOW_REQUEST_MS='0')
+        os.environ.update(env)
+        sys.path.insert(0, ROOT)
+        from weight_tracker import create_app
+        from weight_tracker.models import db
+
+        app = create_app()
+        with app.app_context():
+            ids = populate(DatasetSpec(users=args.users, years=args.years))
+            db.engine.dispose()
+        ctx = dict(ids, counter=itertools.count())
+
+        for name in ('flask', 'gunicorn'):
+            port = _free_port()
+            command, extra_env = _server_commands(port, args.workers, args.threads)[name]
+            process = subprocess.Popen(command, cwd=ROOT, env=dict(env, **extra_env),
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                base_url = f'http://127.0.0.1:{port}'
+                _wait_until_ready(base_url, process)
+                results[name] = load_test(base_url, ctx, scenarios, args.clients, args.seconds)
+            finally:
+                process.terminate()
+                process.wait(timeout=60)
+
+    print(f"{'scenario':<26}" + ''.join(f"{name + ' req/s':>16}{'p95 ms':>10}" for name in results))
+    for scenario in scenarios:
+        row = f"{scenario.name:<26}"
+        for name in results:
+            result = results[name][scenario.name]
+            row += f"{result['throughput_rps']:>16}{result['p95_ms']:>10}"
+        print(row)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'args': vars(args), 'results': results}, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
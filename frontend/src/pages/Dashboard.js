@@ -46,7 +46,7 @@ import 'chartjs-adapter-date-fns';
 import { useNavigate } from 'react-router-dom';
 import { useUserContext } from '../contexts/UserContext';
 import { useThemeContext } from '../contexts/ThemeContext';
-import { getEntries, deleteEntry } from '../services/api';
+import { getEntries, getEntrySeries, deleteEntry } from '../services/api';
 
 // Register ChartJS components
 ChartJS.register(
@@ -67,7 +67,11 @@ const Dashboard = () => {
   const theme = useTheme();
   const isSmallScreen = useMediaQuery(theme.breakpoints.down('sm'));
   const tickAngle = isSmallScreen ? 90 : 45;
+  // The newest entries for the table, a downsampled history for the chart and
+  // the last entry from 30 days ago or earlier to compare the latest against
   const [entries, setEntries] = useState([]);
+  const [chartEntries, setChartEntries] = useState([]);
+  const [comparisonEntry, setComparisonEntry] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [deleteDialogOpen, setDeleteDialogOpen] = useState(false);
@@ -76,8 +80,22 @@ const Dashboard = () => {
   const fetchEntries = useCallback(async () => {
     try {
       setLoading(true);
-      const data = await getEntries(currentUser?.id);
-      setEntries(data);
+      if (!currentUser) {
+        setEntries([]);
+        setChartEntries([]);
+        setComparisonEntry(null);
+        return;
+      }
+      const thirtyDaysAgo = new Date();
+      thirtyDaysAgo.setDate(thirtyDaysAgo.getDate() - 30);
+      const [recent, series, older] = await Promise.all([
+        getEntries(currentUser.id, { limit: 10 }),
+        getEntrySeries(currentUser.id, { mode: 'lttb' }),
+        getEntries(currentUser.id, { to: format(thirtyDaysAgo, 'yyyy-MM-dd'), limit: 1 }),
+      ]);
+      setEntries(recent);
+      setChartEntries(series);
+      setComparisonEntry(older[0] || null);
     } catch (err) {
       setError('Failed to load entries');
       console.error(err);
@@ -105,9 +123,9 @@ const Dashboard = () => {
     
     try {
       await deleteEntry(entryToDelete.id);
-      setEntries(entries.filter(entry => entry.id !== entryToDelete.id));
       setDeleteDialogOpen(false);
       setEntryToDelete(null);
+      fetchEntries();
     } catch (err) {
       setError('Failed to delete entry');
       console.error(err);
@@ -125,9 +143,9 @@ const Dashboard = () => {
 
   // Prepare chart data
   const prepareChartData = () => {
-    if (!entries.length) return null;
+    if (!chartEntries.length) return null;
 
-    const sortedEntries = [...entries].sort((a, b) => new Date(a.date) - new Date(b.date));
+    const sortedEntries = [...chartEntries].sort((a, b) => new Date(a.date) - new Date(b.date));
     
     const labels = sortedEntries.map(entry => new Date(entry.date));
     
@@ -264,23 +282,15 @@ const Dashboard = () => {
   const calculateStats = () => {
     if (!entries.length) return null;
 
-    const latestEntry = entries.sort((a, b) => new Date(b.date) - new Date(a.date))[0];
-    
-    // Find entry from 30 days ago or the oldest if less than 30 days of data
-    const thirtyDaysAgo = new Date();
-    thirtyDaysAgo.setDate(thirtyDaysAgo.getDate() - 30);
-    
-    const entriesSortedByDate = [...entries].sort((a, b) => new Date(a.date) - new Date(b.date));
-    const oldestEntry = entriesSortedByDate[0];
-    
-    const comparisonEntry = entries.find(entry => 
-      new Date(entry.date) <= thirtyDaysAgo
-    ) || oldestEntry;
+    // Entries come newest first; the downsampled series always keeps the
+    // oldest entry, which is compared against with less than 30 days of data
+    const latestEntry = entries[0];
+    const comparedEntry = comparisonEntry || chartEntries[0] || latestEntry;
 
     // Calculate changes
-    const weightChange = latestEntry.weight - comparisonEntry.weight;
-    const fatChange = latestEntry.fat_percentage - comparisonEntry.fat_percentage;
-    const muscleChange = latestEntry.muscle_mass - comparisonEntry.muscle_mass;
+    const weightChange = latestEntry.weight - comparedEntry.weight;
+    const fatChange = latestEntry.fat_percentage - comparedEntry.fat_percentage;
+    const muscleChange = latestEntry.muscle_mass - comparedEntry.muscle_mass;
 
     return {
       current: {
@@ -293,7 +303,7 @@ const Dashboard = () => {
         fat: fatChange,
         muscle: muscleChange,
       },
-      comparisonDate: comparisonEntry.date,
+      comparisonDate: comparedEntry.date,
     };
   };
 
@@ -28,6 +28,12 @@ import {
 } from '@mui/icons-material';
 import { getDebugStatus } from '../services/api';
 
+// Number of server log lines kept on screen while polling
+const MAX_SERVER_LOG_LINES = 1000;
+
+// Shown where the server skipped lines because too many arrived between polls
+const SKIPPED_LOG_LINES_MARKER = '[... more lines were logged than fit in one poll; some were skipped ...]';
+
 // TabPanel component for tab content
 function TabPanel(props) {
   const { children, value, index, ...other } = props;
@@ -54,6 +60,7 @@ const Debug = () => {
   const [logs, setLogs] = useState([]);
   const [clientLogs, setClientLogs] = useState([]);
   const refreshIntervalRef = useRef(null);
+  const logCursorRef = useRef(null);
   const logsEndRef = useRef(null);
 
   useEffect(() => {
@@ -120,10 +127,19 @@ const Debug = () => {
   const fetchDebugStatus = async () => {
     try {
       setLoading(true);
-      const data = await getDebugStatus();
+      const since = logCursorRef.current;
+      const data = await getDebugStatus(since);
       setDebugStatus(data);
       if (data.logs) {
-        setLogs(data.logs);
+        // Only lines newer than the cursor are returned after the first poll.
+        // A poll answered by another server worker (or after a restart) starts
+        // over with that worker's lines, flagged by log_reset.
+        const newLines = data.log_truncated ? [SKIPPED_LOG_LINES_MARKER, ...data.logs] : data.logs;
+        setLogs(prevLogs => (since === null || data.log_reset ? newLines : [...prevLogs, ...newLines])
+          .slice(-MAX_SERVER_LOG_LINES));
+      }
+      if (data.log_cursor !== undefined) {
+        logCursorRef.current = data.log_cursor;
       }
       setError(null);
     } catch (err) {
@@ -289,8 +305,8 @@ Debug Mode: ${localStorage.getItem('debugMode') === 'true' ? 'Enabled' : 'Disabl
             ) : (
               <Typography variant="body2" color="text.secondary" align="center">
                 {debugStatus && debugStatus.warning 
-                  ? "Server logs are only available when debug mode is enabled" 
-                  : "No server logs available. Make sure debug mode is enabled on the server."}
+                  ? "Server logs are only available in debug mode, which is off by default. Restart the backend with DEBUG_MODE=true (e.g. ./start.sh --debug) to see them here." 
+                  : "No server logs available. Make sure debug mode is enabled on the server (DEBUG_MODE=true)."}
               </Typography>
             )}
           </Paper>
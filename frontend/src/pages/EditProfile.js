@@ -81,6 +81,7 @@ const EditProfile = () => {
         height: height ? parseFloat(height) : null
       };
       
+      // Waits for the metric recompute a height or sex change starts
       await updateUser(userId, userData);
       setSuccess(true);
       
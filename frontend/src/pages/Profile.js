@@ -76,6 +76,8 @@ const Profile = () => {
     
     try {
       setLoading(true);
+      // Resolves only once the background deletion job has finished, so the
+      // reloaded list no longer contains the user
       await deleteUser(userToDelete.id);
       
       // Close dialog
@@ -30,7 +30,7 @@ import {
   TimeScale,
 } from 'chart.js';
 import 'chartjs-adapter-date-fns';
-import { getEntries, getGoals, getProgress } from '../services/api';
+import { getEntrySeries, getGoals, getProgress } from '../services/api';
 import { useUserContext } from '../contexts/UserContext';
 
 // JS implementation of the backend's infer_belly_circumference logic
@@ -584,8 +584,9 @@ const Progress = () => {
   const fetchData = useCallback(async () => {
     setLoading(true);
     try {
+      // The charts plot a downsampled history, which keeps the latest entry
       const [entriesData, goalsData, progressData] = await Promise.all([
-        getEntries(currentUser?.id),
+        currentUser?.id ? getEntrySeries(currentUser.id, { mode: 'lttb' }) : [],
         getGoals(currentUser?.id),
         getProgress(currentUser?.id),
       ]);
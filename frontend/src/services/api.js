@@ -14,6 +14,32 @@ axios.interceptors.response.use(
   }
 );
 
+// Conditional GETs: the per-user entries, goals, progress and profile routes
+// send an ETag that changes only when that user's data (or profile) changes.  The last ETag and body
+// of each URL are kept here and sent back as If-None-Match; a 304 reply reuses
+// the stored body instead of downloading and parsing it again.
+const etagCache = new Map();
+
+const getWithETag = async (url, config = {}) => {
+  const key = axios.getUri({ url, params: config.params });
+  const cached = etagCache.get(key);
+  const response = await axios.get(url, {
+    ...config,
+    headers: { ...config.headers, ...(cached ? { 'If-None-Match': cached.etag } : {}) },
+    validateStatus: status => (status >= 200 && status < 300) || status === 304
+  });
+  if (response.status === 304 && cached) {
+    return cached.data;
+  }
+  const etag = response.headers.etag;
+  if (etag) {
+    etagCache.set(key, { etag, data: response.data });
+  } else {
+    etagCache.delete(key);
+  }
+  return response.data;
+};
+
 // User API
 export const getUsers = async () => {
   try {
@@ -35,9 +61,16 @@ export const addUser = async (userData) => {
   }
 };
 
+// With background set, a height or sex change for a long history is answered
+// with 202 and applied by a job together with every entry's derived metrics;
+// this resolves with the user once the change is in effect
 export const updateUser = async (userId, userData) => {
   try {
-    const response = await axios.put(`${API_URL}/users/${userId}`, userData);
+    const response = await axios.put(`${API_URL}/users/${userId}`, userData, { params: { background: 1 } });
+    if (response.status === 202) {
+      await waitForJob(response.data.job_id);
+      return await getUser(userId);
+    }
     return response.data;
   } catch (error) {
     console.error('Error updating user:', error);
@@ -45,9 +78,13 @@ export const updateUser = async (userId, userData) => {
   }
 };
 
+// Deletion runs as a background job; this resolves once the user is gone
 export const deleteUser = async (userId) => {
   try {
-    await axios.delete(`${API_URL}/users/${userId}`);
+    const response = await axios.delete(`${API_URL}/users/${userId}`, { params: { background: 1 } });
+    if (response.status === 202) {
+      await waitForJob(response.data.job_id);
+    }
     return true;
   } catch (error) {
     console.error('Error deleting user:', error);
@@ -55,10 +92,40 @@ export const deleteUser = async (userId) => {
   }
 };
 
-export const getUser = async (userId) => {
+// Status of a background job returned by a 202 response (e.g. deleting a
+// user, a profile change that recomputes metrics, or a background export)
+export const getJob = async (jobId) => {
   try {
-    const response = await axios.get(`${API_URL}/users/${userId}`);
+    const response = await axios.get(`${API_URL}/jobs/${jobId}`);
     return response.data;
+  } catch (error) {
+    console.error('Error fetching job:', error);
+    throw error;
+  }
+};
+
+// Poll a background job until it has finished; resolves with the job and
+// rejects if it failed or is still unfinished after `timeout` milliseconds
+export const waitForJob = async (jobId, { interval = 500, timeout = 120000 } = {}) => {
+  const deadline = Date.now() + timeout;
+  for (;;) {
+    const job = await getJob(jobId);
+    if (job.status === 'succeeded') {
+      return job;
+    }
+    if (job.status === 'failed') {
+      throw new Error(`Job ${jobId} failed: ${job.error}`);
+    }
+    if (Date.now() >= deadline) {
+      throw new Error(`Job ${jobId} did not finish in time`);
+    }
+    await new Promise(resolve => setTimeout(resolve, interval));
+  }
+};
+
+export const getUser = async (userId) => {
+  try {
+    return await getWithETag(`${API_URL}/users/${userId}`);
   } catch (error) {
     console.error('Error fetching user:', error);
     throw error;
@@ -66,17 +133,30 @@ export const getUser = async (userId) => {
 };
 
 // Entries API
-export const getEntries = async (userId = null) => {
+// `params` takes the listing's query arguments, e.g. { limit: 10 } for the
+// newest entries or { to: 'YYYY-MM-DD', limit: 1 } for the last one up to a day
+export const getEntries = async (userId = null, params = {}) => {
   try {
     const url = userId ? `${API_URL}/entries/user/${userId}` : `${API_URL}/entries`;
-    const response = await axios.get(url);
-    return response.data;
+    return await getWithETag(url, { params });
   } catch (error) {
     console.error('Error fetching entries:', error);
     throw error;
   }
 };
 
+// Chart-ready series for a user: time buckets (mode 'bucket', bucket 'day' | 'week' | 'month')
+// or LTTB-downsampled entries (mode 'lttb', points, metric).  LTTB results are
+// ordinary entries, oldest first, and always include the first and last one
+export const getEntrySeries = async (userId, params = {}) => {
+  try {
+    return await getWithETag(`${API_URL}/entries/user/${userId}/aggregate`, { params });
+  } catch (error) {
+    console.error('Error fetching entry series:', error);
+    throw error;
+  }
+};
+
 export const addEntry = async (entryData) => {
   try {
     const response = await axios.post(`${API_URL}/entries`, entryData);
@@ -111,8 +191,7 @@ export const deleteEntry = async (entryId) => {
 export const getGoals = async (userId = null) => {
   try {
     const url = userId ? `${API_URL}/goals/user/${userId}` : `${API_URL}/goals`;
-    const response = await axios.get(url);
-    return response.data;
+    return await getWithETag(url);
   } catch (error) {
     console.error('Error fetching goals:', error);
     throw error;
@@ -139,6 +218,18 @@ export const updateGoal = async (goalId, goalData) => {
   }
 };
 
+// Create and update many goals in one request; items with an id are updated
+// and items with user_ids create the same goal for each of those users
+export const saveGoalsBatch = async (goals) => {
+  try {
+    const response = await axios.post(`${API_URL}/goals/batch`, goals);
+    return response.data;
+  } catch (error) {
+    console.error('Error saving goals:', error);
+    throw error;
+  }
+};
+
 export const deleteGoal = async (goalId) => {
   try {
     await axios.delete(`${API_URL}/goals/${goalId}`);
@@ -153,18 +244,48 @@ export const deleteGoal = async (goalId) => {
 export const getProgress = async (userId = null) => {
   try {
     const url = userId ? `${API_URL}/progress/user/${userId}` : `${API_URL}/progress`;
-    const response = await axios.get(url);
-    return response.data;
+    return await getWithETag(url);
   } catch (error) {
     console.error('Error fetching progress:', error);
     throw error;
   }
 };
 
+// Analytics API
+// Returns { as_of, period_days, columns, rows } with one row per user in `columns` order
+export const getCohortAnalytics = async (days = 30) => {
+  try {
+    const response = await axios.get(`${API_URL}/analytics/cohort`, { params: { days } });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching cohort analytics:', error);
+    throw error;
+  }
+};
+
+// Sync API
+// Returns { user_id, version, since, profile, entries, goals, deleted: { entries, goals } };
+// pass the version from the previous response as `since` to receive only what changed
+export const getUserChanges = async (userId, since = 0) => {
+  try {
+    const response = await axios.get(`${API_URL}/sync/user/${userId}`, { params: { since } });
+    return response.data;
+  } catch (error) {
+    console.error(`Error fetching changes for user ${userId}:`, error);
+    throw error;
+  }
+};
+
 // Debug API
-export const getDebugStatus = async () => {
+// Pass the log_cursor from the previous response as `since` to receive only new log lines;
+// log_reset means the lines replace the previous ones and log_truncated that lines were skipped
+export const getDebugStatus = async (since = null) => {
   try {
-    const response = await axios.get(`${API_URL}/debug/status`);
+    const params = since !== null ? { since } : {};
+    // Servers reached through a proxy only show details to requests with their DEBUG_TOKEN
+    const token = localStorage.getItem('debugToken');
+    const headers = token ? { 'X-Debug-Token': token } : {};
+    const response = await axios.get(`${API_URL}/debug/status`, { params, headers });
     return response.data;
   } catch (error) {
     console.error('Error fetching debug status:', error);
@@ -0,0 +1,73 @@
+"""
+Gunicorn settings for serving the app in production.
+
+    gunicorn -c gunicorn.conf.py weight_tracker.wsgi:app
+
+Every setting can be overridden from the environment:
+
+  BIND / PORT               address to listen on (default 0.0.0.0:5000)
+  WEB_CONCURRENCY           worker processes (default 2 x CPUs + 1)
+  GUNICORN_THREADS          threads per worker (default 4)
+  GUNICORN_PRELOAD          import the app once in the master before forking (default true)
+  GUNICORN_MAX_REQUESTS     recycle a worker after this many requests, 0 = never (default 1000)
+  GUNICORN_TIMEOUT          seconds before a silent worker is killed (default 60)
+  GUNICORN_GRACEFUL_TIMEOUT seconds workers get to finish requests on shutdown (default 30)
+  LOG_FILE_MODE             how workers write logs/app.log (default off: stderr only)
+
+Each worker keeps its own in-memory state.  The progress, profile and entry
+caches check the user's version in the database on every read, so a write
+handled by one worker is never hidden by another worker's cache.  Metrics and
+the debug log buffer are per worker: /api/debug/status log cursors name their
+worker's buffer and start over when a poll reaches another worker.
+"""
+import multiprocessing
+import os
+
+# Every worker would otherwise rotate logs/app.log on its own and lose lines;
+# log to stderr, or set LOG_FILE_MODE=watch and rotate the file externally
+os.environ.setdefault('LOG_FILE_MODE', 'off')
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+
+# Recycling bounds the memory a long-lived worker can accumulate; the jitter
+# stops all workers from restarting at the same moment
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+
+def on_starting(server):
+    """
+    Check (and, if allowed, migrate) the database schema once, before any worker
+    is forked, and requeue the jobs a previous run of the server left running.
+    """
+    from weight_tracker import create_app, init_database
+    from weight_tracker.jobs import requeue_interrupted_jobs
+    from weight_tracker.models import db
+
+    app = create_app(initialize_database=False)
+    if not init_database(app):
+        raise RuntimeError("Database is not ready; see the log above")
+    with app.app_context():
+        # No worker is running jobs yet, so any marked running were interrupted
+        requeue_interrupted_jobs()
+        db.session.commit()
+    if preload_app:
+        # Forked workers then share the already imported module
+        import numpy  # noqa: F401
+    # Connections opened here must not be inherited by the workers
+    with app.app_context():
+        db.engine.dispose()
+
+
+def post_worker_init(worker):
+    """Pick up background jobs left queued or abandoned, e.g. by a previous run of the server."""
+    # Every worker tries; each job is claimed by exactly one of them
+    worker.wsgi.extensions['jobs'].resume()
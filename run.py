@@ -1,21 +1,19 @@
-from flask import Flask, send_from_directory
 import os
 
-app = Flask(
-    __name__,
-    static_folder='frontend/build',       # <-- point at the React build
-    static_url_path=''                    # <-- serve files at root URL
-)
+from weight_tracker import create_app, init_database
+from weight_tracker.config import HOST, PORT
+from weight_tracker.jobs import requeue_interrupted_jobs
+from weight_tracker.models import db
 
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve_react(path):
-    # if the user requests /foo, serve build/foo or fallback to index.html
-    if path and os.path.exists(os.path.join(app.static_folder, path)):
-        return send_from_directory(app.static_folder, path)
-    return send_from_directory(app.static_folder, 'index.html')
+# Development server.  For production use gunicorn (see gunicorn.conf.py).
+app = create_app(initialize_database=False)
 
 if __name__ == '__main__':
-    # use port from $PORT or default 5000
-    port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    if not init_database(app):
+        raise SystemExit("Database is not ready; see the log above")
+    with app.app_context():
+        # This process is the whole server, so any jobs marked running were interrupted
+        requeue_interrupted_jobs()
+        db.session.commit()
+    app.extensions['jobs'].resume()
+    app.run(host=os.environ.get('HOST', HOST), port=int(os.environ.get('PORT', PORT)))
@@ -0,0 +1,71 @@
+"""
+Shared fixtures.  The app is created once per test run against a throwaway
+SQLite database; configuration is read from the environment at import time,
+so it is set here before weight_tracker is imported.
+"""
+import itertools
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+_DB_DIR = tempfile.mkdtemp(prefix='weight-tracker-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ['JOB_WORKERS'] = '0'
+os.environ['JOB_OUTPUT_DIR'] = os.path.join(_DB_DIR, 'jobs')
+os.environ['LOG_FILE_MODE'] = 'off'
+
+from weight_tracker import create_app  # noqa: E402
+from weight_tracker.cache import profile_cache, progress_cache  # noqa: E402
+from weight_tracker.models import db, User  # noqa: E402
+
+_usernames = itertools.count(1)
+
+
+@pytest.fixture(scope='session')
+def app():
+    return create_app()
+
+
+@pytest.fixture(autouse=True)
+def app_context(app):
+    """Run each test in an app context, with the in-process caches emptied."""
+    progress_cache.clear()
+    profile_cache.clear()
+    with app.app_context():
+        yield
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user():
+    """Create a user directly in the database and return their id."""
+    def make(height=180.0, sex='male', **fields):
+        number = next(_usernames)
+        user = User(username=f'user{number}', password_hash='unused', name=f'User {number}',
+                    age=30, height=height, sex=sex, **fields)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+    return make
+
+
+@pytest.fixture
+def add_entries(client):
+    """Add daily entries for a user through the API and return their ids."""
+    def add(user_id, count, start=datetime(2024, 1, 1), **fields):
+        ids = []
+        for day in range(count):
+            values = {'user_id': user_id, 'date': (start + timedelta(days=day)).strftime('%Y-%m-%d'),
+                      'weight': 80.0 - day * 0.1, 'neck': 40.0, 'belly': 90.0 - day * 0.05, **fields}
+            response = client.post('/api/entries', json=values)
+            assert response.status_code == 201, response.get_json()
+            ids.append(response.get_json()['id'])
+        return ids
+    return add
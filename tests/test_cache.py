@@ -0,0 +1,193 @@
+"""Cached per-user results must never outlive the data they were computed from."""
+from datetime import date, timedelta
+
+import pytest
+
+from weight_tracker import security
+from weight_tracker.cache import profile_cache, progress_cache
+from weight_tracker.models import db, Entry, User, bump_data_version
+
+TODAY = date.today()
+
+
+def _day(offset):
+    return (TODAY + timedelta(days=offset)).strftime('%Y-%m-%d')
+
+
+@pytest.fixture
+def tracked_user(client, make_user):
+    """A user with two recent entries and a goal in the future; returns ``(user_id, goal_id)``."""
+    user_id = make_user()
+    for offset, weight in ((-2, 82.0), (-1, 81.0)):
+        response = client.post('/api/entries', json={'user_id': user_id, 'date': _day(offset),
+                                                     'weight': weight, 'neck': 40.0, 'belly': 90.0})
+        assert response.status_code == 201
+    response = client.post('/api/goals', json={'user_id': user_id, 'target_date': _day(120), 'target_weight': 75.0})
+    assert response.status_code == 201
+    return user_id, response.get_json()['id']
+
+
+def _progress(client, user_id):
+    response = client.get(f'/api/progress/user/{user_id}')
+    assert response.status_code == 200
+    goal, = response.get_json()
+    return goal
+
+
+def test_progress_is_served_from_the_cache(client, tracked_user):
+    user_id, _ = tracked_user
+    first = _progress(client, user_id)
+    hits = progress_cache.hits
+    assert _progress(client, user_id) == first
+    assert progress_cache.hits == hits + 1
+
+
+def test_entry_writes_refresh_progress(client, tracked_user):
+    user_id, _ = tracked_user
+    assert _progress(client, user_id)['weight']['current'] == 81.0
+
+    response = client.post('/api/entries', json={'user_id': user_id, 'date': _day(0), 'weight': 80.0})
+    entry_id = response.get_json()['id']
+    assert _progress(client, user_id)['weight']['current'] == 80.0
+
+    assert client.put(f'/api/entries/{entry_id}', json={'weight': 79.5}).status_code == 200
+    assert _progress(client, user_id)['weight']['current'] == 79.5
+
+    assert client.delete(f'/api/entries/{entry_id}').status_code == 204
+    assert _progress(client, user_id)['weight']['current'] == 81.0
+
+
+def test_goal_and_profile_writes_refresh_progress(client, tracked_user):
+    user_id, goal_id = tracked_user
+    before = _progress(client, user_id)
+
+    assert client.put(f'/api/goals/{goal_id}', json={'target_weight': 70.0}).status_code == 200
+    assert _progress(client, user_id)['weight']['target'] == 70.0
+
+    assert client.put(f'/api/users/{user_id}', json={'height': 165.0}).status_code == 200
+    assert _progress(client, user_id)['fat_percentage']['current'] != before['fat_percentage']['current']
+
+    assert client.delete(f'/api/goals/{goal_id}').status_code == 200
+    assert client.get(f'/api/progress/user/{user_id}').get_json() == []
+
+
+def test_progress_follows_writes_made_by_another_process(client, tracked_user):
+    user_id, _ = tracked_user
+    assert _progress(client, user_id)['weight']['current'] == 81.0
+
+    # Another worker commits a change; this process's caches are not told
+    latest = Entry.query.filter_by(user_id=user_id).order_by(Entry.date.desc()).first()
+    latest.weight = 78.0
+    latest.version = bump_data_version(user_id)[user_id]
+    db.session.commit()
+
+    assert _progress(client, user_id)['weight']['current'] == 78.0
+
+
+def _etag(client, url):
+    response = client.get(url)
+    assert response.status_code == 200 and response.headers['ETag']
+    return response.headers['ETag']
+
+
+def _not_modified(client, url, etag):
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code in (200, 304)
+    return response.status_code == 304
+
+
+@pytest.mark.parametrize('path', ['/api/entries/user/{}', '/api/entries/user/{}/aggregate',
+                                  '/api/goals/user/{}', '/api/progress/user/{}', '/api/sync/user/{}'])
+def test_user_data_etags_change_with_writes(client, make_user, tracked_user, path):
+    user_id, goal_id = tracked_user
+    other_user = make_user()
+    url = path.format(user_id)
+    etag = _etag(client, url)
+
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 304 and response.data == b''
+    # Another user's writes leave this user's representation alone
+    client.post('/api/entries', json={'user_id': other_user, 'date': _day(0), 'weight': 60.0})
+    assert _not_modified(client, url, etag)
+
+    writes = [
+        lambda: client.post('/api/entries', json={'user_id': user_id, 'date': _day(0), 'weight': 80.0}),
+        lambda: client.put(f'/api/goals/{goal_id}', json={'target_weight': 74.0}),
+        lambda: client.put(f'/api/users/{user_id}', json={'age': 31}),
+    ]
+    for write in writes:
+        assert write().status_code in (200, 201)
+        assert not _not_modified(client, url, etag)
+        etag = _etag(client, url)
+
+
+def test_etags_depend_on_the_query_string(client, tracked_user):
+    user_id, _ = tracked_user
+    url = f'/api/entries/user/{user_id}'
+    assert _etag(client, url) != _etag(client, url + '?limit=1')
+    assert not _not_modified(client, url + '?limit=1', _etag(client, url))
+
+
+def test_profile_etag_follows_profile_changes_only(client, tracked_user):
+    user_id, _ = tracked_user
+    url = f'/api/users/{user_id}'
+    etag = _etag(client, url)
+    assert _not_modified(client, url, etag)
+
+    client.post('/api/entries', json={'user_id': user_id, 'date': _day(0), 'weight': 80.0})
+    assert _not_modified(client, url, etag)
+
+    assert client.put(url, json={'name': 'Renamed'}).status_code == 200
+    assert not _not_modified(client, url, etag)
+    assert client.get(url).get_json()['name'] == 'Renamed'
+    # The data ETag of another route never validates the profile
+    assert not _not_modified(client, url, _etag(client, f'/api/entries/user/{user_id}'))
+
+
+def test_profile_cache_follows_updates(client, make_user):
+    user_id = make_user()
+    url = f'/api/users/{user_id}'
+    assert client.get(url).status_code == 200
+    hits = profile_cache.hits
+    client.get(url)
+    assert profile_cache.hits == hits + 1
+
+    assert client.put(url, json={'name': 'Through the API'}).status_code == 200
+    assert client.get(url).get_json()['name'] == 'Through the API'
+
+    # Another worker commits a profile change; this process's cache is not told
+    user = db.session.get(User, user_id)
+    user.name = 'Elsewhere'
+    user.profile_version = bump_data_version(user_id)[user_id]
+    db.session.commit()
+    assert client.get(url).get_json()['name'] == 'Elsewhere'
+
+
+def test_deleted_user_is_not_served_from_the_cache(client, make_user):
+    user_id = make_user()
+    make_user()  # so the deleted id is not the highest and cannot be reused
+    assert client.get(f'/api/users/{user_id}').status_code == 200
+    assert client.delete(f'/api/users/{user_id}').status_code == 200
+    assert client.get(f'/api/users/{user_id}').status_code == 404
+
+
+@pytest.mark.parametrize('snapshot', [False, True])
+def test_status_reflects_profile_changes(app, snapshot, monkeypatch):
+    monkeypatch.setattr(security, 'SESSION_PROFILE_SNAPSHOT', snapshot)
+    session_client, other_client = app.test_client(), app.test_client()
+    response = session_client.post('/api/register', json={'username': f'status-{snapshot}', 'password': 'secret',
+                                                          'name': 'Before', 'height': 180.0, 'sex': 'male'})
+    assert response.status_code == 201
+    user_id = response.get_json()['user']['id']
+    assert session_client.get('/api/status').get_json()['user']['name'] == 'Before'
+
+    # A change made by this session is visible to it at once
+    assert session_client.put(f'/api/users/{user_id}', json={'name': 'Mine'}).status_code == 200
+    assert session_client.get('/api/status').get_json()['user']['name'] == 'Mine'
+
+    # One made elsewhere at once without a snapshot, and once it expires with one
+    assert other_client.put(f'/api/users/{user_id}', json={'name': 'Theirs'}).status_code == 200
+    expected = 'Mine' if snapshot else 'Theirs'
+    assert session_client.get('/api/status').get_json()['user']['name'] == expected
+    monkeypatch.setattr(security, 'SESSION_PROFILE_MAX_AGE', -1)
+    assert session_client.get('/api/status').get_json()['user']['name'] == 'Theirs'
@@ -0,0 +1,79 @@
+"""Stored fat percentage and muscle mass must follow the entry and its owner's profile."""
+import pytest
+
+from weight_tracker.models import db, Entry, User, recompute_entry_metrics
+from weight_tracker.routes import users as users_routes
+from weight_tracker.utils import calculate_body_fat_percentage, calculate_muscle_mass
+
+
+def _stored_entries(user_id):
+    """The user's entries as stored, oldest first."""
+    db.session.expire_all()
+    return Entry.query.filter_by(user_id=user_id).order_by(Entry.date, Entry.id).all()
+
+
+def _assert_metrics_current(user_id):
+    user = db.session.get(User, user_id)
+    entries = _stored_entries(user_id)
+    assert entries
+    for entry in entries:
+        fat = calculate_body_fat_percentage(entry.weight, entry.neck, entry.belly, user.height, user.sex, entry.hip)
+        assert entry.fat_percentage == pytest.approx(fat)
+        assert entry.muscle_mass == pytest.approx(calculate_muscle_mass(entry.weight, fat))
+
+
+def test_metrics_stored_on_create_and_update(client, make_user, add_entries):
+    user_id = make_user()
+    entry_id, = add_entries(user_id, 1)
+    _assert_metrics_current(user_id)
+
+    response = client.put(f'/api/entries/{entry_id}', json={'belly': 100.0})
+    assert response.status_code == 200
+    _assert_metrics_current(user_id)
+
+
+def test_profile_change_recomputes_in_the_request(client, make_user, add_entries):
+    user_id = make_user()
+    add_entries(user_id, 5)
+
+    response = client.put(f'/api/users/{user_id}', json={'height': 165.0, 'sex': 'female'})
+    assert response.status_code == 200
+    assert response.get_json()['height'] == 165.0
+    _assert_metrics_current(user_id)
+
+
+def test_background_profile_change_applies_profile_with_metrics(client, make_user, add_entries, monkeypatch):
+    monkeypatch.setattr(users_routes, 'PROFILE_RECOMPUTE_SYNC_MAX_ENTRIES', 2)
+    user_id = make_user()
+    add_entries(user_id, 5)
+
+    response = client.put(f'/api/users/{user_id}?background=true', json={'height': 165.0, 'name': 'Renamed'})
+    assert response.status_code == 202
+    body = response.get_json()
+    # The job has run inline, but the response reports the profile as it was
+    assert body['user']['height'] == 180.0 and body['user']['name'] == 'Renamed'
+    job = client.get(body['status_url']).get_json()
+    assert job['status'] == 'succeeded' and job['result']['entries_updated'] == 5
+
+    assert client.get(f'/api/users/{user_id}').get_json()['height'] == 165.0
+    _assert_metrics_current(user_id)
+
+
+def test_background_profile_change_is_synchronous_for_short_histories(client, make_user, add_entries):
+    user_id = make_user()
+    add_entries(user_id, 3)
+    response = client.put(f'/api/users/{user_id}?background=true', json={'sex': 'female'})
+    assert response.status_code == 200
+    _assert_metrics_current(user_id)
+
+
+def test_recompute_entry_metrics_repairs_stale_values(make_user, add_entries):
+    user_id = make_user()
+    add_entries(user_id, 4)
+    for entry in _stored_entries(user_id):
+        entry.fat_percentage = entry.muscle_mass = None
+    db.session.commit()
+
+    assert recompute_entry_metrics(user_id=user_id, chunk_size=3) == 4
+    db.session.commit()
+    _assert_metrics_current(user_id)
@@ -0,0 +1,86 @@
+"""Keyset pagination of the entry listings."""
+from datetime import datetime
+
+import pytest
+
+from weight_tracker.models import Entry
+from weight_tracker.routes.entries import _decode_cursor, _encode_cursor
+from weight_tracker.timeseries import entry_store
+
+
+def test_cursor_round_trip():
+    key = [datetime(2024, 3, 1, 7, 30, 15, 250), 42]
+    cursor = _encode_cursor(key)
+    assert '=' not in cursor
+    assert _decode_cursor(cursor, (Entry.date, Entry.id)) == key
+    assert _decode_cursor(_encode_cursor([7]), (Entry.id,)) == [7]
+
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', _encode_cursor([1, 2, 3]), _encode_cursor(['x', 1]),
+                                    _encode_cursor({'id': 1})])
+def test_malformed_cursor_is_rejected(cursor, client):
+    with pytest.raises(ValueError):
+        _decode_cursor(cursor, (Entry.date, Entry.id))
+    assert client.get(f'/api/entries/user/1?cursor={cursor}').status_code == 400
+
+
+def _walk(client, url, limit):
+    """Follow X-Next-Cursor from the first page to the last; returns the ids in page order."""
+    ids, cursor = [], None
+    while True:
+        params = {'limit': limit, **({'cursor': cursor} if cursor else {})}
+        response = client.get(url, query_string=params)
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page) <= limit
+        ids += [entry['id'] for entry in page]
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return ids
+
+
+@pytest.fixture(params=['store', 'sql'])
+def listing_source(request, monkeypatch):
+    """Run a test against the in-process entry store and against plain SQL."""
+    if request.param == 'sql':
+        monkeypatch.setattr(entry_store, 'max_bytes', 0)
+    return request.param
+
+
+def test_user_listing_pages_cover_every_entry_once(client, make_user, add_entries, listing_source):
+    user_id = make_user()
+    add_entries(user_id, 7)
+    # Several entries on one day are ordered by id
+    add_entries(user_id, 1, start=datetime(2024, 1, 3))
+    add_entries(user_id, 1, start=datetime(2024, 1, 3))
+
+    full = [entry['id'] for entry in client.get(f'/api/entries/user/{user_id}').get_json()]
+    assert len(full) == 9
+    for limit in (1, 2, 4, 9, 50):
+        assert _walk(client, f'/api/entries/user/{user_id}', limit) == full
+
+
+def test_user_listing_date_filters(client, make_user, add_entries, listing_source):
+    user_id = make_user()
+    add_entries(user_id, 10)
+    url = f'/api/entries/user/{user_id}?from=2024-01-03&to=2024-01-06'
+    dates = [entry['date'] for entry in client.get(url).get_json()]
+    assert dates == ['2024-01-06', '2024-01-05', '2024-01-04', '2024-01-03']
+
+    response = client.get(url + '&limit=3')
+    assert [entry['date'] for entry in response.get_json()] == dates[:3]
+    assert '<' in response.headers['Link'] and 'rel="next"' in response.headers['Link']
+
+
+def test_listing_of_all_entries_pages_by_user_then_date(client, make_user, add_entries):
+    for user_id in (make_user(), make_user()):
+        add_entries(user_id, 3)
+    entries = client.get('/api/entries').get_json()
+    expected = [entry['id'] for entry in sorted(entries, key=lambda e: (e['user_id'], e['date'], e['id']))]
+    assert _walk(client, '/api/entries', 2) == expected
+
+
+@pytest.mark.parametrize('query', ['limit=0', 'limit=x', 'from=2024-13-01'])
+def test_invalid_arguments_are_rejected(client, make_user, query):
+    user_id = make_user()
+    assert client.get(f'/api/entries/user/{user_id}?{query}').status_code == 400
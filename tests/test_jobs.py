@@ -0,0 +1,138 @@
+"""Background jobs: leases, retries and the opt-in 202 responses of the user routes."""
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from weight_tracker import jobs
+from weight_tracker.models import db, Entry, Job, User
+from weight_tracker.routes import users as users_routes
+from weight_tracker.utils import calculate_body_fat_percentage
+
+
+def _job(status='queued', attempts=0, lease=None, kind='noop'):
+    job = Job(kind=kind, status=status, attempts=attempts, params={},
+              lease_expires_at=datetime.utcnow() + timedelta(seconds=lease) if lease is not None else None)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def _reload(job_id):
+    db.session.expire_all()
+    return db.session.get(Job, job_id)
+
+
+@pytest.fixture(autouse=True)
+def noop_handler(monkeypatch):
+    monkeypatch.setitem(jobs.JOB_HANDLERS, 'noop', lambda job: {'ok': True})
+
+
+def test_finished_job_releases_its_lease():
+    job_id = _job()
+    assert jobs.run_job(job_id)
+    job = _reload(job_id)
+    assert (job.status, job.attempts, job.result, job.lease_expires_at) == ('succeeded', 1, {'ok': True}, None)
+    # Only a queued job can be claimed
+    assert not jobs.run_job(job_id)
+
+
+def test_expired_leases_are_requeued_up_to_the_attempt_limit(monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_MAX_ATTEMPTS', 3)
+    retry = _job('running', attempts=1, lease=-5)
+    exhausted = _job('running', attempts=3, lease=-5)
+    alive = _job('running', attempts=1, lease=3600)
+
+    assert jobs.requeue_expired_jobs() == [retry]
+    db.session.commit()
+    assert _reload(retry).status == 'queued'
+    assert _reload(exhausted).status == 'failed' and 'after 3 attempts' in _reload(exhausted).error
+    assert _reload(alive).status == 'running'
+
+    assert jobs.run_job(retry) and _reload(retry).attempts == 2
+    db.session.execute(update(Job).where(Job.id == alive).values(status='succeeded'))
+    db.session.commit()
+
+
+def test_run_that_lost_its_lease_does_not_overwrite_the_next_attempt(monkeypatch):
+    job_id = _job()
+
+    def swept_meanwhile(job):
+        # The lease ran out and another worker claimed the job again
+        with db.engine.begin() as connection:
+            connection.execute(update(Job).where(Job.id == job_id).values(attempts=Job.attempts + 1))
+        return {'ok': 'stale'}
+
+    monkeypatch.setitem(jobs.JOB_HANDLERS, 'noop', swept_meanwhile)
+    assert jobs.run_job(job_id)
+    job = _reload(job_id)
+    assert (job.status, job.result) == ('running', None)
+
+
+def test_lease_is_renewed_while_the_handler_runs(monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_LEASE_SECONDS', 0.3)
+    job_id = _job()
+    leases = []
+
+    def slow(job):
+        for _ in range(3):
+            threading.Event().wait(0.25)
+            leases.append(_reload(job_id).lease_expires_at)
+            assert jobs.requeue_expired_jobs() == []
+            db.session.commit()
+        return {}
+
+    monkeypatch.setitem(jobs.JOB_HANDLERS, 'noop', slow)
+    assert jobs.run_job(job_id)
+    assert _reload(job_id).status == 'succeeded'
+    assert leases == sorted(leases) and leases[0] < leases[-1]
+
+
+def test_user_routes_answer_200_unless_background_is_requested(client, make_user, add_entries, monkeypatch):
+    monkeypatch.setattr(users_routes, 'PROFILE_RECOMPUTE_SYNC_MAX_ENTRIES', 0)
+    user_id = make_user()
+    add_entries(user_id, 2)
+
+    response = client.put(f'/api/users/{user_id}', json={'height': 170.0})
+    assert response.status_code == 200 and response.get_json()['height'] == 170.0
+    response = client.put(f'/api/users/{user_id}?background=1', json={'height': 160.0})
+    assert response.status_code == 202 and response.headers['Location'] == response.get_json()['status_url']
+
+    doomed = make_user()
+    queued = make_user()
+    make_user()  # so neither deleted id is the highest and gets reused
+    response = client.delete(f'/api/users/{doomed}')
+    assert response.status_code == 200 and 'message' in response.get_json()
+    response = client.delete(f'/api/users/{queued}?background=true')
+    assert response.status_code == 202
+    assert client.get(response.get_json()['status_url']).get_json()['status'] == 'succeeded'
+    assert client.get(f'/api/users/{queued}').status_code == 404
+
+
+def test_profile_job_recomputes_entries_written_while_it_ran(client, make_user, add_entries, monkeypatch):
+    monkeypatch.setattr(users_routes, 'PROFILE_RECOMPUTE_SYNC_MAX_ENTRIES', 0)
+    user_id = make_user()
+    ids = add_entries(user_id, 4)
+    compute = users_routes._entry_metrics
+
+    def with_concurrent_writes(query, height, sex):
+        result = compute(query, height, sex)
+        if len(result) == 4:
+            # Between the job's read and its write another request edits and adds entries
+            assert client.put(f'/api/entries/{ids[0]}', json={'belly': 99.0}).status_code == 200
+            client.post('/api/entries', json={'user_id': user_id, 'date': '2030-01-01',
+                                              'weight': 70.0, 'neck': 38.0, 'belly': 85.0})
+        return result
+
+    monkeypatch.setattr(users_routes, '_entry_metrics', with_concurrent_writes)
+    response = client.put(f'/api/users/{user_id}?background=1', json={'height': 165.0, 'sex': 'female'})
+    job = client.get(response.get_json()['status_url']).get_json()
+    assert job['status'] == 'succeeded'
+    assert job['result'] == {'entries_updated': 5, 'entries_recomputed_again': 2}
+
+    db.session.expire_all()
+    assert (db.session.get(User, user_id).height, db.session.get(User, user_id).sex) == (165.0, 'female')
+    for entry in Entry.query.filter_by(user_id=user_id):
+        expected = calculate_body_fat_percentage(entry.weight, entry.neck, entry.belly, 165.0, 'female', entry.hip)
+        assert entry.fat_percentage == pytest.approx(expected)
@@ -0,0 +1,115 @@
+"""The delta-sync feed must let a client reproduce the server's state from any version."""
+
+
+def _sync(client, user_id, since=0, **args):
+    response = client.get(f'/api/sync/user/{user_id}', query_string={'since': since, **args})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def _apply(state, changes):
+    """Apply a sync response to a client-side copy ``{'entries': {id: row}, 'goals': {id: row}}``."""
+    if not changes['since']:
+        state = {'entries': {}, 'goals': {}}
+    for kind in ('entries', 'goals'):
+        for object_id in changes['deleted'][kind]:
+            state[kind].pop(object_id, None)
+        for row in changes[kind]:
+            state[kind][row['id']] = row
+    return state
+
+
+def _server_state(client, user_id):
+    return _apply(None, _sync(client, user_id))
+
+
+def _post_entry(client, user_id, date, weight):
+    response = client.post('/api/entries', json={'user_id': user_id, 'date': date, 'weight': weight})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def test_incremental_sync_reports_changes_and_deletions(client, make_user, add_entries):
+    user_id = make_user()
+    ids = add_entries(user_id, 3)
+    goal = client.post('/api/goals', json={'user_id': user_id, 'target_date': '2030-01-01',
+                                           'target_weight': 70.0}).get_json()
+    first = _sync(client, user_id)
+    assert first['profile']['id'] == user_id
+    assert {row['id'] for row in first['entries']} == set(ids)
+    state, version = _apply(None, first), first['version']
+
+    assert client.put(f'/api/entries/{ids[1]}', json={'weight': 77.0}).status_code == 200
+    assert client.delete(f'/api/entries/{ids[0]}').status_code == 204
+    assert client.delete(f'/api/goals/{goal["id"]}').status_code == 200
+
+    changes = _sync(client, user_id, since=version)
+    assert [row['id'] for row in changes['entries']] == [ids[1]]
+    assert changes['deleted'] == {'entries': [ids[0]], 'goals': [goal['id']]}
+    assert changes['profile'] is None
+    assert _apply(state, changes) == _server_state(client, user_id)
+
+    # Nothing changed since the last sync
+    latest = _sync(client, user_id, since=changes['version'])
+    assert latest['entries'] == [] and latest['deleted'] == {'entries': [], 'goals': []}
+
+
+def test_sync_after_delete_and_re_add(client, make_user):
+    user_id = make_user()
+    _post_entry(client, user_id, '2024-01-01', 80.0)
+    newest = _post_entry(client, user_id, '2024-01-02', 79.0)
+    before_delete = _sync(client, user_id)
+    state = _apply(None, before_delete)
+
+    assert client.delete(f'/api/entries/{newest}').status_code == 204
+    after_delete = _sync(client, user_id, since=before_delete['version'])
+    assert after_delete['deleted']['entries'] == [newest]
+
+    # SQLite hands the highest deleted id out again, so the same id comes back
+    re_added = _post_entry(client, user_id, '2024-01-03', 78.0)
+    assert re_added == newest
+
+    for since in (before_delete['version'], after_delete['version']):
+        changes = _sync(client, user_id, since=since)
+        assert [row['id'] for row in changes['entries']] == [re_added]
+        assert changes['entries'][0]['weight'] == 78.0
+        assert changes['deleted']['entries'] == []
+
+    # A client that saw the deletion and one that did not end up in the same state
+    stale = _apply(state, _sync(client, user_id, since=before_delete['version']))
+    caught_up = _apply(_apply(state, after_delete), _sync(client, user_id, since=after_delete['version']))
+    assert stale == caught_up == _server_state(client, user_id)
+
+
+def test_goal_id_reused_after_delete(client, make_user):
+    user_id = make_user()
+    goal = {'user_id': user_id, 'target_date': '2030-01-01', 'target_weight': 70.0}
+    goal_id = client.post('/api/goals', json=goal).get_json()['id']
+    version = _sync(client, user_id)['version']
+
+    assert client.delete(f'/api/goals/{goal_id}').status_code == 200
+    assert client.post('/api/goals', json={**goal, 'target_weight': 72.0}).get_json()['id'] == goal_id
+
+    changes = _sync(client, user_id, since=version)
+    assert [row['target_weight'] for row in changes['goals']] == [72.0]
+    assert changes['deleted']['goals'] == []
+
+
+def test_profile_changes_are_reported_once(client, make_user):
+    user_id = make_user()
+    version = _sync(client, user_id)['version']
+    assert client.put(f'/api/users/{user_id}', json={'age': 41}).status_code == 200
+
+    changes = _sync(client, user_id, since=version)
+    assert changes['profile']['age'] == 41
+    assert _sync(client, user_id, since=changes['version'])['profile'] is None
+
+
+def test_invalid_cursors(client, make_user):
+    user_id = make_user()
+    version = _sync(client, user_id)['version']
+    response = client.get(f'/api/sync/user/{user_id}?since={version + 1}')
+    assert response.status_code == 409 and response.get_json()['version'] == version
+    assert client.get(f'/api/sync/user/{user_id}?since=-1').status_code == 400
+    assert client.get(f'/api/sync/user/{user_id}?since_time=yesterday').status_code == 400
+    assert client.get('/api/sync/user/999999').status_code == 404
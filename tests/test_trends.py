@@ -0,0 +1,74 @@
+"""Trends maintained entry by entry must equal trends rebuilt from scratch."""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from weight_tracker.models import db, TrendState
+from weight_tracker.trends import load_trends, rebuild_trends
+
+
+def _states(user_id):
+    db.session.expire_all()
+    states = TrendState.query.filter_by(user_id=user_id).all()
+    return {state.metric: (state.count, sorted(map(tuple, state.window))) for state in states}
+
+
+def _assert_matches_rebuild(user_id):
+    incremental, incremental_states = load_trends([user_id]), _states(user_id)
+    rebuild_trends([user_id])
+    db.session.commit()
+    rebuilt, rebuilt_states = load_trends([user_id]), _states(user_id)
+
+    assert incremental.keys() == rebuilt.keys()
+    assert incremental_states == rebuilt_states
+    for key, summary in rebuilt.items():
+        for field, value in summary.items():
+            if isinstance(value, float):
+                assert incremental[key][field] == pytest.approx(value, rel=1e-9, abs=1e-9), (key, field)
+            else:
+                assert incremental[key][field] == value, (key, field)
+
+
+def _post(client, user_id, date, **values):
+    response = client.post('/api/entries', json={'user_id': user_id, 'date': date.strftime('%Y-%m-%d'), **values})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def test_entries_added_out_of_order(client, make_user):
+    user_id = make_user()
+    rng = random.Random(18)
+    days = list(range(60))
+    rng.shuffle(days)
+    for day in days:
+        # Measurements on some days only, so the derived metrics have gaps
+        measured = {'neck': 40.0, 'belly': 95.0 - day * 0.1} if day % 3 == 0 else {}
+        _post(client, user_id, datetime(2024, 1, 1) + timedelta(days=day), weight=90.0 - day * 0.2, **measured)
+    _assert_matches_rebuild(user_id)
+
+
+def test_entries_edited_and_deleted(client, make_user, add_entries):
+    user_id = make_user()
+    ids = add_entries(user_id, 30)
+
+    # An old value, a value inside the rolling window, a move across the
+    # window boundary and the removal of a measurement
+    assert client.put(f'/api/entries/{ids[2]}', json={'weight': 95.0}).status_code == 200
+    assert client.put(f'/api/entries/{ids[-2]}', json={'weight': 70.0}).status_code == 200
+    assert client.put(f'/api/entries/{ids[5]}', json={'date': '2024-01-29'}).status_code == 200
+    assert client.put(f'/api/entries/{ids[-1]}', json={'neck': None, 'belly': None}).status_code == 200
+    _assert_matches_rebuild(user_id)
+
+    for entry_id in (ids[0], ids[-1], ids[-3]):
+        assert client.delete(f'/api/entries/{entry_id}').status_code == 204
+    _assert_matches_rebuild(user_id)
+
+
+def test_deleting_every_entry_removes_the_trends(client, make_user, add_entries):
+    user_id = make_user()
+    for entry_id in add_entries(user_id, 3):
+        assert client.delete(f'/api/entries/{entry_id}').status_code == 204
+    assert _states(user_id) == {}
+    assert load_trends([user_id]) == {}
+    _assert_matches_rebuild(user_id)
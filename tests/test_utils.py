@@ -0,0 +1,74 @@
+"""The vectorised body-composition helpers must match the scalar ones exactly."""
+import math
+import random
+
+import pytest
+
+from weight_tracker.utils import (calculate_body_fat_percentage, calculate_body_fat_percentage_array,
+                                  calculate_muscle_mass, calculate_muscle_mass_array,
+                                  infer_belly_circumference, infer_belly_circumference_array)
+
+
+def _maybe(rng, low, high, missing=0.15):
+    """A measurement, or None/0 for a share of rows as real histories have."""
+    roll = rng.random()
+    if roll < missing / 2:
+        return None
+    if roll < missing:
+        return 0
+    return round(rng.uniform(low, high), 1)
+
+
+def _rows(seed, count=500):
+    rng = random.Random(seed)
+    return [(_maybe(rng, 45, 140), _maybe(rng, 30, 48), _maybe(rng, 60, 140),
+             rng.choice([150.0, 172.5, 190.0, None]), rng.choice(['male', 'female', 'Male', None]),
+             _maybe(rng, 80, 130, missing=0.5))
+            for _ in range(count)]
+
+
+def _same(actual, expected):
+    if expected is None:
+        return actual is None
+    return actual is not None and (actual == expected or (math.isnan(actual) and math.isnan(expected)))
+
+
+def _scalar_body_fat(weight, neck, belly, height, sex, hip):
+    if height is None or sex is None:
+        return None
+    return calculate_body_fat_percentage(weight, neck, belly, height, sex, hip)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_body_fat_and_muscle_mass_match_scalar(seed):
+    rows = _rows(seed)
+    weights, necks, bellies, heights, sexes, hips = map(list, zip(*rows))
+
+    fat_array = calculate_body_fat_percentage_array(weights, necks, bellies, heights, sexes, hips)
+    fat = fat_array.tolist()
+    muscle = calculate_muscle_mass_array(weights, fat_array).tolist()
+
+    expected_fat = [_scalar_body_fat(*row) for row in rows]
+    expected_muscle = [calculate_muscle_mass(row[0], value) for row, value in zip(rows, expected_fat)]
+
+    mismatches = [i for i in range(len(rows)) if not _same(fat[i], expected_fat[i])]
+    assert not mismatches, [(rows[i], fat[i], expected_fat[i]) for i in mismatches[:5]]
+    mismatches = [i for i in range(len(rows)) if not _same(muscle[i], expected_muscle[i])]
+    assert not mismatches, [(rows[i], muscle[i], expected_muscle[i]) for i in mismatches[:5]]
+
+
+def test_scalar_profile_is_broadcast():
+    weights, necks, bellies = [80.0, 90.0, None], [40.0, 42.0, 40.0], [90.0, 100.0, 95.0]
+    fat = calculate_body_fat_percentage_array(weights, necks, bellies, 180.0, 'female', 100.0).tolist()
+    assert fat == [calculate_body_fat_percentage(80.0, 40.0, 90.0, 180.0, 'female', 100.0),
+                   calculate_body_fat_percentage(90.0, 42.0, 100.0, 180.0, 'female', 100.0),
+                   None]
+
+
+@pytest.mark.parametrize('sex, hip', [('male', None), ('female', None), ('female', 100.0)])
+def test_inferred_belly_matches_scalar(sex, hip):
+    targets = [None, 0, 8.0, 12.5, 18.0, 25.0, 32.0, 45.0]
+    inferred = infer_belly_circumference_array(targets, 38.0, 175.0, sex, hip).tolist()
+    expected = [infer_belly_circumference(target, 38.0, 175.0, sex, hip) if target else None
+                for target in targets]
+    assert inferred == expected
@@ -1,41 +1,112 @@
-from flask import Flask, send_from_directory
+import click
+from flask import Flask
 from flask_cors import CORS
 
-from weight_tracker.config import (logger, SQLALCHEMY_DATABASE_URI,
+from weight_tracker.config import (logger, init_logging, SQLALCHEMY_DATABASE_URI,
                                    SQLALCHEMY_TRACK_MODIFICATIONS,
-                                   SECRET_KEY)
+                                   SECRET_KEY, STORAGE_PROFILE,
+                                   SQLITE_PRAGMAS, DB_POOL_OPTIONS,
+                                   METRICS_ENABLED, METRICS_SLOW_REQUEST_MS,
+                                   METRICS_N_PLUS_ONE_THRESHOLD, FRONTEND_BUILD_DIR,
+                                   JOB_WORKERS, SCHEMA_AUTO_MIGRATE)
 from weight_tracker.models import db
 from weight_tracker.routes import register_blueprints
+from weight_tracker.schema import SCHEMA_VERSION, current_schema_version, migrate
+from weight_tracker.cli import register_commands
+from weight_tracker.storage import engine_options, configure_sqlite_pragmas
+from weight_tracker.metrics import init_metrics
+from weight_tracker.static import init_static
+from weight_tracker.jobs import init_jobs
+from weight_tracker.lazy import load_lazy_modules
 
-def create_app():
-    """Create and configure the Flask application"""
-    # Initialize Flask app and serve React build directory
-    app = Flask(__name__, static_folder='../frontend/build', static_url_path='')
-    CORS(app)
+def init_database(app, auto_migrate=SCHEMA_AUTO_MIGRATE) -> bool:
+    """
+    Check the database schema version and bring the database up to date.
+
+    An up-to-date database costs a single query.  Pending migrations are
+    applied when ``auto_migrate`` is set; otherwise an error is logged and
+    False is returned so the caller can refuse to start.
+    """
+    with app.app_context():
+        try:
+            version = current_schema_version()
+            if version < SCHEMA_VERSION:
+                if not auto_migrate:
+                    logger.error("Database schema is at version %s but version %s is required; "
+                                 "run `flask --app weight_tracker migrate`", version, SCHEMA_VERSION)
+                    return False
+                applied = migrate()
+                logger.info("Database migrated to schema version %s (applied %s)", SCHEMA_VERSION, applied)
+            elif version > SCHEMA_VERSION:
+                logger.warning("Database schema version %s is newer than this code (%s)",
+                               version, SCHEMA_VERSION)
+            return True
+        except Exception as e:
+            logger.error("Error initializing database: %s", e)
+            return False
+
+
+def create_app(initialize_database=True):
+    """
+    Create and configure the Flask application.
+
+    Pass ``initialize_database=False`` when the schema is set up separately,
+    e.g. once by the gunicorn master rather than by every worker.  Queued
+    background jobs are resumed only when the database is initialised here
+    and is up to date, and never inside a ``flask`` CLI command, which may run
+    next to a live server; gunicorn workers resume them from gunicorn.conf.py
+    once forked.  Outside CLI commands, lazily imported modules such as NumPy
+    are loaded here so the first request does not wait for them.
+    """
+    init_logging()
+
+    # Initialize Flask app; the React build is served by init_static below
+    app = Flask(__name__, static_folder=None)
+    # Expose pagination and caching headers to cross-origin clients
+    CORS(app, expose_headers=['X-Next-Cursor', 'Link', 'ETag'])
 
     # Load configuration
     app.config['SQLALCHEMY_DATABASE_URI'] = SQLALCHEMY_DATABASE_URI
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = SQLALCHEMY_TRACK_MODIFICATIONS
     app.config['SECRET_KEY'] = SECRET_KEY
+    app.config['STORAGE_PROFILE'] = STORAGE_PROFILE
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(SQLALCHEMY_DATABASE_URI, DB_POOL_OPTIONS)
 
     # Initialize database
     db.init_app(app)
 
-    # Create tables if they don't exist
     with app.app_context():
-        try:
-            db.create_all()
-            logger.info("Database tables created successfully")
-        except Exception as e:
-            logger.error(f"Error creating database tables: {str(e)}")
+        # Must be registered before the first connection is opened
+        configure_sqlite_pragmas(db.engine, SQLITE_PRAGMAS)
+        # Request latency and SQL counts, served at /api/debug/metrics
+        if METRICS_ENABLED:
+            init_metrics(app, db.engine,
+                         slow_request_ms=METRICS_SLOW_REQUEST_MS,
+                         n_plus_one_threshold=METRICS_N_PLUS_ONE_THRESHOLD)
+
+    # Background jobs run on a thread pool created lazily in each process
+    runner = init_jobs(app, JOB_WORKERS)
+
+    # Check the schema version, migrating if needed
+    database_ready = initialize_database and init_database(app)
 
     # Register API blueprints
     register_blueprints(app)
 
-    # Serve React front-end for root path
-    @app.route('/', methods=['GET'])
-    def serve():
-        return app.send_static_file('index.html')
+    # Register CLI commands (e.g. flask --app weight_tracker backfill-metrics)
+    register_commands(app)
+
+    # Serve the React front-end, precompressed from memory
+    init_static(app, FRONTEND_BUILD_DIR)
+
+    # CLI commands (migrate, backfill-metrics, ...) may run next to a live
+    # server and mostly compute nothing, so only a serving process resumes
+    # jobs and pays for NumPy up front instead of on its first request
+    serving = click.get_current_context(silent=True) is None
+    if serving:
+        load_lazy_modules()
+    if database_ready and serving:
+        runner.resume()
 
     logger.info("Application initialized successfully")
     return app
@@ -0,0 +1,187 @@
+import csv
+import io
+from datetime import datetime
+
+from sqlalchemy import insert, update
+
+from weight_tracker.cache import invalidate_user
+from weight_tracker.config import logger, IMPORT_CHUNK_SIZE
+from weight_tracker.models import db, Entry, bump_data_version, load_user_profiles, written_values
+from weight_tracker.trends import rebuild_trends
+from weight_tracker.utils import calculate_body_fat_percentage_array, calculate_muscle_mass_array
+
+# Columns accepted from imported rows (CSV header names / JSON keys)
+ENTRY_FIELDS = ('date', 'weight', 'neck', 'belly', 'hip', 'user_id')
+
+
+def parse_entry_data(data) -> dict:
+    """
+    Validate a submitted entry and convert it to Entry column values.
+
+    This is the validation used by POST /api/entries and by the bulk import.
+    Raises ValueError with a user-facing message if the data is invalid.
+    """
+    # Validate required fields
+    if not data.get('weight'):
+        raise ValueError('Weight is required')
+
+    # Parse date (if provided) or use current date
+    entry_date = data.get('date')
+    if entry_date:
+        try:
+            entry_date = datetime.strptime(entry_date, '%Y-%m-%d')
+        except (TypeError, ValueError):
+            raise ValueError('Invalid date format. Use YYYY-MM-DD')
+    else:
+        entry_date = datetime.now()
+
+    values = {'date': entry_date}
+    for field in ('weight', 'neck', 'belly', 'hip'):
+        try:
+            values[field] = float(data.get(field)) if data.get(field) else None
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid number for {field}')
+
+    # user_id can be null for backward compatibility
+    user_id = data.get('user_id')
+    try:
+        values['user_id'] = int(user_id) if user_id not in (None, '') else None
+    except (TypeError, ValueError):
+        raise ValueError('Invalid user_id')
+    return values
+
+
+def read_csv_rows(text) -> list:
+    """Parse CSV text with a header row into a list of dicts (empty cells become None)."""
+    reader = csv.DictReader(io.StringIO(text))
+    return [{key: (value or None) for key, value in row.items() if key in ENTRY_FIELDS}
+            for row in reader]
+
+
+def _with_derived_metrics(rows, profiles):
+    """Add fat_percentage/muscle_mass to a chunk of entry value dicts."""
+    row_profiles = [profiles[row['user_id']] for row in rows]
+    weights = [row['weight'] for row in rows]
+    fat_percentages = calculate_body_fat_percentage_array(
+        weights,
+        [row['neck'] for row in rows],
+        [row['belly'] for row in rows],
+        [height for height, _ in row_profiles],
+        [sex for _, sex in row_profiles],
+        [row['hip'] for row in rows]
+    )
+    muscle_masses = calculate_muscle_mass_array(weights, fat_percentages)
+    for row, fat_percentage, muscle_mass in zip(rows, fat_percentages.tolist(), muscle_masses.tolist()):
+        row['fat_percentage'] = fat_percentage
+        row['muscle_mass'] = muscle_mass
+    return rows
+
+
+def _upsert_chunk(rows):
+    """
+    Update entries that already exist for the same (user_id, date) and insert the rest.
+
+    Returns ``(inserted, updated)``.
+    """
+    # Later rows for the same key win
+    by_key = {(row['user_id'], row['date']): row for row in rows}
+
+    existing = db.session.query(Entry.id, Entry.user_id, Entry.date).filter(
+        Entry.user_id.in_({user_id for user_id, _ in by_key}),
+        Entry.date.in_({entry_date for _, entry_date in by_key})
+    )
+    updates = []
+    for entry_id, user_id, entry_date in existing:
+        row = by_key.pop((user_id, entry_date), None)
+        if row is not None:
+            updates.append(dict(row, id=entry_id))
+
+    if updates:
+        db.session.execute(update(Entry), updates)
+    if by_key:
+        db.session.execute(insert(Entry), list(by_key.values()))
+    return len(by_key), len(updates)
+
+
+def import_entries(rows, upsert=False, chunk_size=IMPORT_CHUNK_SIZE, default_user_id=None) -> dict:
+    """
+    Validate and insert many entries, committing once per chunk of ``chunk_size`` rows.
+
+    Each row is validated like a single POST /api/entries.  Rows that fail are
+    reported by index and skipped; a database error fails only its own chunk.
+    With ``upsert`` an existing entry for the same user and date is updated
+    instead of a duplicate being inserted.
+
+    Returns a report dict with inserted/updated/failed counts and per-row errors.
+    """
+    report = {'inserted': 0, 'updated': 0, 'failed': 0, 'errors': []}
+
+    def fail(index, message):
+        report['failed'] += 1
+        report['errors'].append({'row': index, 'error': message})
+
+    valid = []
+    for index, data in enumerate(rows):
+        if not isinstance(data, dict):
+            fail(index, 'Row must be an object')
+            continue
+        if default_user_id is not None and not data.get('user_id'):
+            data = dict(data, user_id=default_user_id)
+        try:
+            values = parse_entry_data(data)
+        except ValueError as e:
+            fail(index, str(e))
+            continue
+        if values['user_id'] is None:
+            fail(index, 'user_id is required')
+            continue
+        valid.append((index, values))
+
+    # Derived metrics need each owner's profile; load them all up front
+    profiles = load_user_profiles(values['user_id'] for _, values in valid)
+    known = []
+    for index, values in valid:
+        if values['user_id'] in profiles:
+            known.append((index, values))
+        else:
+            fail(index, f"User {values['user_id']} not found")
+
+    affected_users = set()
+    for start in range(0, len(known), chunk_size):
+        chunk = known[start:start + chunk_size]
+        chunk_rows = _with_derived_metrics([values for _, values in chunk], profiles)
+        try:
+            versions = bump_data_version(*{row['user_id'] for row in chunk_rows})
+            now = datetime.utcnow()
+            for row in chunk_rows:
+                row.update(written_values(row['user_id'], versions, now))
+            if upsert:
+                inserted, updated = _upsert_chunk(chunk_rows)
+            else:
+                db.session.execute(insert(Entry), chunk_rows)
+                inserted, updated = len(chunk_rows), 0
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error importing entries %s-%s: %s", chunk[0][0], chunk[-1][0], e)
+            for index, _ in chunk:
+                fail(index, 'Database error while importing this row')
+            continue
+        report['inserted'] += inserted
+        report['updated'] += updated
+        affected_users.update(row['user_id'] for row in chunk_rows)
+
+    report['errors'].sort(key=lambda error: error['row'])
+    if affected_users:
+        # Imports can land anywhere in a user's history, so rebuild their trends
+        # once rather than adjusting them row by row
+        try:
+            rebuild_trends(affected_users)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error rebuilding trends after import: %s", e)
+    invalidate_user(*affected_users)
+    logger.info("Imported entries: %s inserted, %s updated, %s failed",
+                report['inserted'], report['updated'], report['failed'])
+    return report
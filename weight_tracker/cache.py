@@ -0,0 +1,138 @@
+import threading
+from collections import OrderedDict
+
+from flask import g
+
+from weight_tracker.config import PROGRESS_CACHE_SIZE, PROFILE_CACHE_SIZE
+from weight_tracker.models import db, User
+
+
+class LRUCache:
+    """
+    A small thread-safe mapping with least-recently-used eviction.
+
+    Values are computed outside the cache, so a request may read the database
+    while another request commits a write and invalidates the same key.  To stop
+    the reader from then storing its stale result, callers take a token from
+    ``generation()`` before reading and pass it to ``set()``; the value is
+    dropped if anything was invalidated in between.
+
+    The cache lives in process memory, so each server worker has its own copy
+    and invalidate() only reaches the worker that handled the write.  Values
+    derived from data that other processes may change are therefore stored
+    with the ``version`` they were computed at, and ``get()`` with a different
+    version is a miss.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def generation(self) -> int:
+        """Return a token to pass to set() for values computed from now on."""
+        return self._generation
+
+    def get(self, key, default=None, version=None):
+        """Return the value stored for ``key`` (at ``version``, if given), else ``default``."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (version is None or item[0] == version):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, generation=None, version=None) -> None:
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (version, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """Return the current size and hit/miss/eviction counters."""
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+# Computed /api/progress/user/<id> results, keyed by user id
+progress_cache = LRUCache(PROGRESS_CACHE_SIZE)
+
+# Serialised User.to_dict() profiles, keyed by user id
+profile_cache = LRUCache(PROFILE_CACHE_SIZE)
+
+
+def get_user_profile(user_id):
+    """
+    Return a user's serialised profile, or None if there is no such user.
+
+    A cached profile is used only while the user's profile_version (and
+    creation time, in case a deleted user's id is reused) still match, which
+    costs one primary-key lookup instead of loading the user.  Changes made
+    through another worker are therefore never hidden by this one's cache.
+    The returned dict is shared between requests and must not be modified.
+    """
+    # conditional_profile_response may have read the version already
+    version = g.get('user_profile_versions', {}).get(user_id)
+    if version is None:
+        row = db.session.query(User.profile_version, User.created_at).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        version = tuple(row)
+    profile = profile_cache.get(user_id, version=version)
+    if profile is not None:
+        return profile
+    generation = profile_cache.generation()
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    profile = user.to_dict()
+    profile_cache.set(user_id, profile, generation, version=version)
+    return profile
+
+
+def invalidate_user(*user_ids) -> None:
+    """
+    Drop every cached value derived from the given users' entries, goals or profile.
+
+    Write routes call this after committing a change to a user's data.
+    """
+    for user_id in user_ids:
+        if user_id is not None:
+            progress_cache.invalidate(user_id)
+
+
+def invalidate_profile(*user_ids) -> None:
+    """
+    Drop the cached profiles of the given users.
+
+    Routes that change or delete a user call this after committing.
+    """
+    for user_id in user_ids:
+        if user_id is not None:
+            profile_cache.invalidate(user_id)
@@ -0,0 +1,60 @@
+import click
+from flask.cli import with_appcontext
+
+from weight_tracker.models import db, recompute_entry_metrics
+from weight_tracker.schema import SCHEMA_VERSION, current_schema_version, migrate
+from weight_tracker.static import write_precompressed
+from weight_tracker.trends import rebuild_trends
+from weight_tracker.config import FRONTEND_BUILD_DIR
+
+
+@click.command('migrate')
+@click.option('--check', is_flag=True,
+              help='Only report the schema version; exit with status 1 if migrations are pending.')
+@with_appcontext
+def migrate_command(check):
+    """Create missing tables and apply pending schema migrations."""
+    version = current_schema_version()
+    if check:
+        click.echo(f"Schema version {version} (required: {SCHEMA_VERSION})")
+        if version < SCHEMA_VERSION:
+            raise SystemExit(1)
+        return
+    applied = migrate()
+    if applied:
+        click.echo(f"Applied migrations {', '.join(map(str, applied))}; schema version {SCHEMA_VERSION}")
+    else:
+        click.echo(f"Schema is up to date (version {version})")
+
+
+@click.command('backfill-metrics')
+@click.option('--user-id', type=int, default=None,
+              help='Only recompute entries belonging to this user.')
+@click.option('--chunk-size', type=int, default=5000, show_default=True,
+              help='Number of entries updated per statement batch.')
+@with_appcontext
+def backfill_metrics_command(user_id, chunk_size):
+    """Recompute the stored fat percentage and muscle mass of existing entries and their trends."""
+    count = recompute_entry_metrics(user_id=user_id, chunk_size=chunk_size)
+    states = rebuild_trends(None if user_id is None else [user_id])
+    db.session.commit()
+    click.echo(f"Recomputed derived metrics for {count} entries and {states} trend states")
+
+
+@click.command('compress-static')
+@click.argument('build_dir', default=FRONTEND_BUILD_DIR)
+def compress_static_command(build_dir):
+    """Write gzip and brotli variants of the React build for the server to load."""
+    count = write_precompressed(build_dir)
+    click.echo(f"Wrote {count} precompressed files in {build_dir}")
+
+
+def register_commands(app):
+    """
+    Register the application's custom Flask CLI commands.
+    """
+    app.cli.add_command(migrate_command)
+    # Name used before schema versioning
+    app.cli.add_command(migrate_command, 'init-db')
+    app.cli.add_command(backfill_metrics_command)
+    app.cli.add_command(compress_static_command)
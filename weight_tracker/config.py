@@ -2,35 +2,189 @@ import os
 import logging
 from datetime import datetime
 
-# Debug mode flag - standardize the check
-DEBUG_MODE = True  # Force debug mode to be True for debugging
-
-# Initialize logging
-log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
-os.makedirs(log_dir, exist_ok=True)
-log_file = os.path.join(log_dir, 'app.log')
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,  # Set to DEBUG to capture all messages
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file),
-        logging.StreamHandler()
-    ]
-)
+from weight_tracker.logging_setup import configure_logging
+
+# Debug mode flag, enabled with DEBUG_MODE=true (e.g. ./start.sh --debug)
+DEBUG_MODE = os.environ.get('DEBUG_MODE', 'false').lower() in ('1', 'true', 'yes')
+
+# Server details, logs and metrics under /api/debug are served only to
+# requests sending this token in X-Debug-Token.  Without a token they are
+# served only to clients on this host (127.0.0.1 / ::1); set one whenever the
+# app runs behind a proxy, where every request appears to come from the proxy.
+DEBUG_TOKEN = os.environ.get('DEBUG_TOKEN') or None
+
+# Logging configuration.  The level defaults to DEBUG in debug mode and INFO
+# otherwise; the log file rotates at LOG_MAX_BYTES keeping LOG_BACKUP_COUNT old
+# files; LOG_DEBUG_SAMPLE_RATE=N keeps only one in N debug messages per call site.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG' if DEBUG_MODE else 'INFO').upper()
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+LOG_DEBUG_SAMPLE_RATE = int(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 1))
+# Number of recent log lines kept in memory for /api/debug/status
+LOG_BUFFER_LINES = int(os.environ.get('LOG_BUFFER_LINES', 1000))
+# How logs/app.log is written (see logging_setup.LOG_FILE_MODES): 'rotate' by
+# size, only safe with a single process; 'watch' for several processes with
+# external rotation; 'off' for console only.  gunicorn.conf.py defaults to 'off'.
+LOG_FILE_MODE = os.environ.get('LOG_FILE_MODE', 'rotate').lower()
+
+# Log files are written to logs/ at the top of the repository
+LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
+LOG_FILE = os.path.join(LOG_DIR, 'app.log')
+
 logger = logging.getLogger(__name__)
 
-if DEBUG_MODE:
-    logger.setLevel(logging.DEBUG)
-    logger.debug("Debug mode enabled")
-else:
-    logger.info("Debug mode is disabled. Set DEBUG_MODE=true to enable.")
+_logging_initialized = False
+
+
+def init_logging() -> None:
+    """
+    Configure logging once per process; called by create_app.
+
+    Records are queued and written by a background thread (see
+    weight_tracker.logging_setup).  Doing this on first use rather than on
+    import keeps importing the package free of file and thread setup.
+    """
+    global _logging_initialized
+    if _logging_initialized:
+        return
+    _logging_initialized = True
+    if LOG_FILE_MODE != 'off':
+        os.makedirs(LOG_DIR, exist_ok=True)
+    configure_logging(
+        level=LOG_LEVEL,
+        log_file=LOG_FILE,
+        file_mode=LOG_FILE_MODE,
+        max_bytes=LOG_MAX_BYTES,
+        backup_count=LOG_BACKUP_COUNT,
+        debug_sample_rate=LOG_DEBUG_SAMPLE_RATE,
+        ring_buffer_size=LOG_BUFFER_LINES
+    )
+    if DEBUG_MODE:
+        logger.debug("Debug mode enabled")
+    else:
+        logger.info("Debug mode is disabled. Set DEBUG_MODE=true to enable.")
 
 # Database configuration
-SQLALCHEMY_DATABASE_URI = 'sqlite:///weight_tracker.db'
+# DATABASE_URL overrides the default SQLite file (relative paths live in instance/)
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///weight_tracker.db')
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# Apply pending schema migrations when the app starts (see weight_tracker.schema).
+# With SCHEMA_AUTO_MIGRATE=false startup only checks the schema version and
+# refuses to start on an outdated database; run `flask --app weight_tracker
+# migrate` as a separate deployment step instead.
+SCHEMA_AUTO_MIGRATE = os.environ.get('SCHEMA_AUTO_MIGRATE', 'true').lower() in ('1', 'true', 'yes')
+
+# Storage profile, selected with STORAGE_PROFILE=<name>.
+#   default    - SQLite's stock settings (rollback journal, full sync)
+#   production - WAL journal so readers and writers don't block each other,
+#                relaxed fsync, a busy timeout instead of immediate
+#                "database is locked" errors, a larger page cache, memory-mapped
+#                reads and a connection pool sized for a threaded server
+# Individual values can be overridden with the SQLITE_* / DB_POOL_* variables.
+STORAGE_PROFILE = os.environ.get('STORAGE_PROFILE', 'default')
+
+STORAGE_PROFILES = {
+    'default': {
+        'pragmas': {},
+        'pool': {}
+    },
+    'production': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+            'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64000)),  # negative = KiB
+            'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+            'temp_store': 'MEMORY'
+        },
+        'pool': {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10)),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            'pool_pre_ping': True
+        }
+    }
+}
+
+if STORAGE_PROFILE not in STORAGE_PROFILES:
+    raise ValueError(f"Unknown STORAGE_PROFILE {STORAGE_PROFILE!r}; "
+                     f"expected one of {', '.join(STORAGE_PROFILES)}")
+SQLITE_PRAGMAS = STORAGE_PROFILES[STORAGE_PROFILE]['pragmas']
+DB_POOL_OPTIONS = STORAGE_PROFILES[STORAGE_PROFILE]['pool']
+
+# Entry listing pagination: upper bound for the ?limit= query parameter
+ENTRIES_MAX_PAGE_SIZE = int(os.environ.get('ENTRIES_MAX_PAGE_SIZE', 1000))
+
+# Entry export: number of rows fetched from the database per chunk
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 1000))
+
+# Bulk import: default number of rows written per transaction
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 1000))
+
+# Maximum number of goals accepted by one POST /api/goals/batch
+GOAL_BATCH_LIMIT = int(os.environ.get('GOAL_BATCH_LIMIT', 1000))
+
+# Maximum number of users whose computed progress is kept in memory
+PROGRESS_CACHE_SIZE = int(os.environ.get('PROGRESS_CACHE_SIZE', 256))
+
+# Maximum number of serialised user profiles kept in memory for /api/status
+# and GET /api/users/<id>
+PROFILE_CACHE_SIZE = int(os.environ.get('PROFILE_CACHE_SIZE', 1024))
+
+# Copy the user's profile into the (signed) session cookie at login so
+# /api/status can answer without the database.  Profile changes made from
+# another session show up after at most SESSION_PROFILE_MAX_AGE seconds.
+SESSION_PROFILE_SNAPSHOT = os.environ.get('SESSION_PROFILE_SNAPSHOT', 'false').lower() in ('1', 'true', 'yes')
+SESSION_PROFILE_MAX_AGE = int(os.environ.get('SESSION_PROFILE_MAX_AGE', 300))
+
+# At most PASSWORD_HASH_WORKERS password hashes run at once (0 = on the
+# request thread); once PASSWORD_HASH_QUEUE more are waiting, login
+# and register answer 503 instead of queueing further.  The request thread
+# still waits for its hash, so this caps hashing CPU rather than freeing threads
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))
+
+# Memory budget in bytes for the per-user entry arrays that back the entry
+# listing, aggregation and progress routes (see weight_tracker/timeseries.py);
+# 0 disables them and the routes query the database directly
+ENTRY_STORE_MAX_BYTES = int(os.environ.get('ENTRY_STORE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Request metrics (served at /api/debug/metrics).  Requests slower than
+# METRICS_SLOW_REQUEST_MS, or running the same SQL statement at least
+# METRICS_N_PLUS_ONE_THRESHOLD times, are logged as warnings; 0 disables a check.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+METRICS_SLOW_REQUEST_MS = float(os.environ.get('METRICS_SLOW_REQUEST_MS', 500))
+METRICS_N_PLUS_ONE_THRESHOLD = int(os.environ.get('METRICS_N_PLUS_ONE_THRESHOLD', 10))
+
+# Entry trends (see weight_tracker/trends.py): half-life in days of the
+# exponentially weighted average and slope, and length of the rolling average
+TREND_HALF_LIFE_DAYS = float(os.environ.get('TREND_HALF_LIFE_DAYS', 14))
+TREND_WINDOW_DAYS = int(os.environ.get('TREND_WINDOW_DAYS', 7))
+
+# Background jobs (see weight_tracker/jobs.py): threads per process running
+# them (0 runs each job inline when it is enqueued) and where job output
+# files such as exports are written
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+# A running job holds a lease of JOB_LEASE_SECONDS that its worker renews while
+# it runs.  A job whose lease ran out (its worker died) is queued again, up to
+# JOB_MAX_ATTEMPTS runs in total, and then marked failed
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 60))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+# A height or sex change recomputes the derived metrics of every entry of the
+# user.  Up to this many entries that happens in the request's transaction;
+# for a longer history a job recomputes them and then applies the change
+PROFILE_RECOMPUTE_SYNC_MAX_ENTRIES = int(os.environ.get('PROFILE_RECOMPUTE_SYNC_MAX_ENTRIES', 10000))
+JOB_OUTPUT_DIR = os.environ.get(
+    'JOB_OUTPUT_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'jobs')
+)
+
+# React production build served at / (see weight_tracker/static.py)
+FRONTEND_BUILD_DIR = os.environ.get(
+    'FRONTEND_BUILD_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'frontend', 'build')
+)
 
 # Server configuration
 HOST = '127.0.0.1'
@@ -0,0 +1,78 @@
+import hashlib
+from functools import wraps
+
+from flask import g, make_response, request
+
+from weight_tracker.models import db, User
+
+
+def user_etag(user_id: int, version: int, created_at, kind: str = 'u') -> str:
+    """
+    Build the entity tag for a per-user resource at a given data version.
+
+    The creation time distinguishes a user from a later one that reuses a
+    deleted user's id, and the query string is folded in because pagination
+    and range arguments change the representation without changing the data.
+    ``kind`` tells apart tags built from different version counters.
+    """
+    tag = f"{kind}{user_id}.{int(created_at.timestamp()) if created_at else 0}-v{version}"
+    args = sorted(request.args.items(multi=True))
+    if args:
+        digest = hashlib.blake2b(repr(args).encode(), digest_size=6).hexdigest()
+        tag = f"{tag}-{digest}"
+    return tag
+
+
+def _conditional_response(view, version_column, kind, remember):
+    """Shared body of the conditional_*_response decorators; ``remember(user_id, version, created_at)`` stores the version in ``g``."""
+    @wraps(view)
+    def wrapper(user_id, **kwargs):
+        # Read the version before the data: a write committed in between then
+        # only makes the ETag older than the body, which is safe
+        row = db.session.query(version_column, User.created_at).filter(User.id == user_id).first()
+        if row is None:
+            return view(user_id=user_id, **kwargs)
+
+        # Let the view reuse the version, e.g. to validate cached entry arrays
+        remember(user_id, *row)
+        etag = user_etag(user_id, *row, kind=kind)
+        if request.if_none_match.contains_weak(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(view(user_id=user_id, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        # Let browsers keep the body but always revalidate it
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    return wrapper
+
+
+def conditional_user_response(view):
+    """
+    Serve a per-user GET route conditionally using the user's data version.
+
+    The route must take a ``user_id`` argument and its output must depend only
+    on that user's entries, goals and profile.  A request whose If-None-Match
+    matches the current version gets an empty 304 without the view running, so
+    no rows are loaded or serialised; otherwise successful responses carry the
+    ETag for the client to send back next time.
+    """
+    def remember(user_id, version, created_at):
+        g.setdefault('user_data_versions', {})[user_id] = version
+    return _conditional_response(view, User.data_version, 'u', remember)
+
+
+def conditional_profile_response(view):
+    """
+    Like conditional_user_response, for routes whose output is only the user's profile.
+
+    The ETag follows ``profile_version``, so entry and goal writes do not
+    change it.  The view can read ``(profile_version, created_at)`` from
+    ``g.user_profile_versions``.
+    """
+    def remember(user_id, version, created_at):
+        g.setdefault('user_profile_versions', {})[user_id] = (version, created_at)
+    return _conditional_response(view, User.profile_version, 'p', remember)
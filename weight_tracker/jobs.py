@@ -0,0 +1,272 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app, jsonify, request, url_for
+from sqlalchemy import true, update
+
+from weight_tracker.config import logger, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS
+from weight_tracker.models import db, Job
+
+# kind -> function(job) returning the job's JSON result; see job_handler()
+JOB_HANDLERS = {}
+
+
+def job_handler(kind: str):
+    """
+    Register a function as the handler for jobs of ``kind``.
+
+    The handler is called with the Job inside an application context, does
+    (and commits) its own work and returns a JSON-serialisable result.  An
+    exception marks the job failed.
+    """
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+
+def _lease_expiry() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)
+
+
+def _renew_lease(engine, job_id: int, attempt: int, stop: threading.Event) -> None:
+    """Extend a running job's lease every third of JOB_LEASE_SECONDS until ``stop`` is set."""
+    while not stop.wait(JOB_LEASE_SECONDS / 3):
+        try:
+            with engine.begin() as connection:
+                connection.execute(
+                    update(Job).where(Job.id == job_id, Job.status == 'running', Job.attempts == attempt)
+                    .values(lease_expires_at=_lease_expiry())
+                )
+        except Exception as e:
+            # The next renewal retries; the lease leaves room for a missed one
+            logger.warning("Could not renew the lease of job %s: %s", job_id, e)
+
+
+def run_job(job_id: int) -> bool:
+    """
+    Claim a queued job and run it to completion in the current app context.
+
+    The claim is a conditional UPDATE, so when several processes try to run the
+    same job only one of them does.  While the handler runs, a thread renews
+    the job's lease; if the lease expires anyway (see requeue_expired_jobs),
+    another worker may run the job again and this run's outcome is dropped.
+    Returns False if the job was not queued.
+    """
+    claimed = db.session.execute(
+        update(Job).where(Job.id == job_id, Job.status == 'queued')
+        .values(status='running', started_at=datetime.utcnow(), attempts=Job.attempts + 1,
+                lease_expires_at=_lease_expiry())
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return False
+
+    job = db.session.get(Job, job_id)
+    attempt = job.attempts
+    logger.info("Running job %s (%s), attempt %s", job.id, job.kind, attempt)
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_renew_lease, args=(db.engine, job_id, attempt, stop),
+                                 name=f'job-{job_id}-lease', daemon=True)
+    heartbeat.start()
+    try:
+        handler = JOB_HANDLERS.get(job.kind)
+        if handler is None:
+            raise LookupError(f"Unknown job kind {job.kind!r}")
+        result = handler(job)
+        outcome = {'status': 'succeeded', 'result': result}
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Job %s (%s) failed: %s", job_id, job.kind, e)
+        outcome = {'status': 'failed', 'error': str(e)}
+    finally:
+        stop.set()
+        heartbeat.join()
+
+    finished = db.session.execute(
+        update(Job).where(Job.id == job_id, Job.status == 'running', Job.attempts == attempt)
+        .values(finished_at=datetime.utcnow(), lease_expires_at=None, **outcome)
+    ).rowcount
+    db.session.commit()
+    if not finished:
+        logger.warning("Job %s lost its lease during attempt %s; its outcome was dropped", job_id, attempt)
+    else:
+        logger.info("Job %s finished: %s", job_id, outcome['status'])
+    return True
+
+
+class JobRunner:
+    """
+    Runs jobs on a bounded pool of threads in the current process.
+
+    The pool is created on first use in each process, so a runner built before
+    gunicorn forks its workers does not start threads in the master.
+    """
+
+    def __init__(self, app, max_workers: int):
+        self.app = app
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._sweeper_pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, job_id: int) -> None:
+        with self.app.app_context():
+            try:
+                run_job(job_id)
+            except Exception as e:
+                logger.error("Error running job %s: %s", job_id, e)
+            finally:
+                db.session.remove()
+
+    def submit(self, job_id: int) -> None:
+        """Run a queued job in the background (inline when max_workers is 0)."""
+        if self.max_workers <= 0:
+            self._run(job_id)
+        else:
+            self._get_executor().submit(self._run, job_id)
+
+    def sweep(self) -> int:
+        """Queue jobs whose lease expired again and submit them; returns how many."""
+        with self.app.app_context():
+            try:
+                job_ids = requeue_expired_jobs()
+                db.session.commit()
+            finally:
+                db.session.remove()
+        for job_id in job_ids:
+            self.submit(job_id)
+        return len(job_ids)
+
+    def _sweep_periodically(self) -> None:
+        while True:
+            time.sleep(JOB_LEASE_SECONDS)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error("Error sweeping expired jobs: %s", e)
+
+    def _start_sweeper(self) -> None:
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+        threading.Thread(target=self._sweep_periodically, name='job-sweeper', daemon=True).start()
+
+    def resume(self) -> int:
+        """
+        Submit every job still queued in the database; returns how many.
+
+        Jobs whose lease expired are queued again first, and from then on a
+        thread in this process repeats that every JOB_LEASE_SECONDS.
+        """
+        self.sweep()
+        with self.app.app_context():
+            job_ids = [job_id for (job_id,) in
+                       db.session.query(Job.id).filter(Job.status == 'queued').order_by(Job.id)]
+            db.session.remove()
+        for job_id in job_ids:
+            self.submit(job_id)
+        if job_ids:
+            logger.info("Resumed %s queued jobs", len(job_ids))
+        self._start_sweeper()
+        return len(job_ids)
+
+
+def init_jobs(app, max_workers: int) -> JobRunner:
+    """Attach a JobRunner to the app as ``app.extensions['jobs']``."""
+    runner = JobRunner(app, max_workers)
+    app.extensions['jobs'] = runner
+    return runner
+
+
+def _abandon_jobs(condition) -> list:
+    """
+    Queue running jobs matching ``condition`` again, or fail those out of attempts.
+
+    Each job is updated on its own condition, so a job that finished or was
+    swept by another process meanwhile is left alone.  Returns the requeued ids.
+    """
+    now = datetime.utcnow()
+    requeued = []
+    for job_id, attempts in db.session.query(Job.id, Job.attempts).filter(Job.status == 'running', condition):
+        if attempts < JOB_MAX_ATTEMPTS:
+            values = {'status': 'queued'}
+        else:
+            values = {'status': 'failed', 'finished_at': now,
+                      'error': f'Abandoned by its worker after {attempts} attempts'}
+        changed = db.session.execute(
+            update(Job).where(Job.id == job_id, Job.status == 'running', Job.attempts == attempts, condition)
+            .values(lease_expires_at=None, **values)
+        ).rowcount
+        if changed and values['status'] == 'queued':
+            requeued.append(job_id)
+        elif changed:
+            logger.error("Job %s failed: abandoned by its worker after %s attempts", job_id, attempts)
+    return requeued
+
+
+def requeue_expired_jobs() -> list:
+    """
+    Queue running jobs whose lease has expired again (see run_job).
+
+    Jobs that have already run JOB_MAX_ATTEMPTS times are marked failed
+    instead.  Safe to call at any time from any process.  The caller is
+    responsible for committing.  Returns the ids of the requeued jobs.
+    """
+    job_ids = _abandon_jobs(Job.lease_expires_at < datetime.utcnow())
+    if job_ids:
+        logger.warning("Requeued %s jobs whose lease expired", len(job_ids))
+    return job_ids
+
+
+def requeue_interrupted_jobs() -> int:
+    """
+    Mark jobs left running by a stopped server as queued again.
+
+    Only safe while no process is running jobs, i.e. when the server starts
+    and before its workers do: gunicorn's on_starting hook or run.py, never
+    create_app(), which CLI commands next to a live server also call.  Jobs
+    that have already run JOB_MAX_ATTEMPTS times are marked failed instead.
+    The caller is responsible for committing.  Returns the number of requeued jobs.
+    """
+    count = len(_abandon_jobs(true()))
+    if count:
+        logger.warning("Requeued %s jobs interrupted by a restart", count)
+    return count
+
+
+def enqueue_job(kind: str, params=None, user_id=None) -> Job:
+    """Store a new job, commit it and hand it to this process's runner."""
+    job = Job(kind=kind, status='queued', params=params or {}, user_id=user_id)
+    db.session.add(job)
+    db.session.commit()
+    job_id = job.id
+    current_app.extensions['jobs'].submit(job_id)
+    logger.info("Queued job %s (%s)", job_id, kind)
+    return db.session.get(Job, job_id)
+
+
+def wants_background() -> bool:
+    """True if the request asked to run as a background job (``?background=true``)."""
+    return request.args.get('background', 'false').lower() in ('1', 'true', 'yes')
+
+
+def accepted_response(job: Job, **extra):
+    """A 202 Accepted response pointing at the job's status endpoint."""
+    status_url = url_for('jobs.get_job', job_id=job.id)
+    response = jsonify({'job_id': job.id, 'status': job.status, 'status_url': status_url, **extra})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
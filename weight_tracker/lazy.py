@@ -0,0 +1,48 @@
+import importlib
+import threading
+
+# Every LazyModule created, for load_lazy_modules()
+_lazy_modules = []
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    Used for heavy dependencies such as NumPy that most requests (and every
+    CLI command that does not compute anything) never touch, so importing the
+    app does not pay for them.  After the import the module's attributes are
+    copied onto the stand-in, so later lookups cost the same as on the module.
+    """
+
+    def __init__(self, name: str):
+        self.__dict__['_lazy_name'] = name
+        self.__dict__['_lazy_lock'] = threading.Lock()
+
+    def _load(self):
+        with self._lazy_lock:
+            if '_lazy_module' not in self.__dict__:
+                module = importlib.import_module(self._lazy_name)
+                self.__dict__.update(vars(module))
+                self.__dict__['_lazy_module'] = module
+        return self.__dict__['_lazy_module']
+
+    def __getattr__(self, attr):
+        # Only called for attributes not yet copied from the module
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._lazy_name!r}>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Return a LazyModule for ``name`` (e.g. ``np = lazy_import('numpy')``)."""
+    module = LazyModule(name)
+    _lazy_modules.append(module)
+    return module
+
+
+def load_lazy_modules() -> None:
+    """Import every lazily imported module now, e.g. so a server's first request does not pay for it."""
+    for module in _lazy_modules:
+        module._load()
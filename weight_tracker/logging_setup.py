@@ -0,0 +1,203 @@
+import atexit
+import itertools
+import logging
+import os
+import queue
+import sys
+from collections import deque, namedtuple
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, WatchedFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Listener draining the log queue; None until configure_logging() runs
+_listener = None
+
+# In-memory buffer of recent log lines served by /api/debug/status
+_ring_buffer = None
+
+# A read from RingBufferHandler.since: ``reset`` is set when the cursor was
+# missing or came from another buffer (another process, or before a restart),
+# so the lines replace rather than extend what the client shows; ``truncated``
+# is set when more lines arrived than were returned
+LogPage = namedtuple('LogPage', ('lines', 'cursor', 'reset', 'truncated'))
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Let through one in every ``rate`` DEBUG records from each call site.
+
+    Hot request paths log the same debug line on every request; sampling keeps a
+    representative trickle of them without paying for every one.  Records at
+    INFO and above always pass.
+    """
+
+    def __init__(self, rate: int = 1):
+        super().__init__()
+        self.rate = max(1, rate)
+        self._counters = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate == 1 or record.levelno > logging.DEBUG:
+            return True
+        key = (record.pathname, record.lineno)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters.setdefault(key, itertools.count())
+        return next(counter) % self.rate == 0
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    Keep the most recent formatted log lines in memory for pollers.
+
+    Every line gets a sequence number, so a client can pass back the last number
+    it saw and receive only newer lines.  Reads cost the same however long the
+    server has been running, unlike re-reading the log file.
+
+    Each process has its own buffer, so cursors are ``<buffer id>.<sequence>``
+    and a cursor from another buffer is treated as no cursor at all.  The id
+    changes in a forked child (see new_buffer_id).
+    """
+
+    def __init__(self, capacity: int = 1000):
+        super().__init__()
+        self._lines = deque(maxlen=capacity)
+        self._sequence = 0
+        self.new_buffer_id()
+
+    def new_buffer_id(self) -> None:
+        """Give the buffer an id of its own, e.g. in a forked worker that inherited its lines."""
+        self.buffer_id = f"{os.getpid()}-{os.urandom(4).hex()}"
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        # handle() already holds self.lock while calling emit()
+        self._sequence += 1
+        self._lines.append(line)
+
+    def since(self, cursor=None, limit: int = 100) -> LogPage:
+        """
+        Return a LogPage with up to ``limit`` lines newer than ``cursor``.
+
+        Without a cursor from this buffer the latest ``limit`` lines are
+        returned.  When more lines are newer than ``cursor`` only the latest
+        ``limit`` are returned.  The returned cursor is passed to the next call.
+        """
+        buffer_id, _, sequence = str(cursor or '').rpartition('.')
+        with self.lock:
+            latest = self._sequence
+            reset = buffer_id != self.buffer_id or not sequence.isdigit() or int(sequence) > latest
+            after = 0 if reset else int(sequence)
+            count = min(latest - after, limit, len(self._lines))
+            lines = list(itertools.islice(self._lines, len(self._lines) - count, None))
+            # A fresh view starting at the latest lines has missed nothing
+            truncated = not reset and latest - after > count
+            return LogPage(lines, f"{self.buffer_id}.{latest}", reset, truncated)
+
+
+class _ThreadQueueHandler(QueueHandler):
+    """QueueHandler for an in-process queue, leaving all formatting to the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock implementation merges the message arguments and formats any
+        # traceback on the calling thread so the record can be pickled.  Records
+        # on this queue never leave the process, so that work is deferred.
+        return record
+
+
+# How the log file is written: 'rotate' rotates it by size in this process,
+# which is only safe while one process writes the file; 'watch' leaves
+# rotation to an external tool (e.g. logrotate) and reopens the file once it
+# has been moved, so several processes can append to it; 'off' writes no file
+LOG_FILE_MODES = ('rotate', 'watch', 'off')
+
+
+def configure_logging(level='INFO', log_file=None, max_bytes=10 * 1024 * 1024,
+                      backup_count=5, debug_sample_rate=1, console=True,
+                      ring_buffer_size=1000, file_mode='rotate') -> None:
+    """
+    Route all logging through a queue drained by a background listener thread.
+
+    Request threads only append records to an in-memory queue; formatting and
+    file/console I/O happen on the listener thread.  With ``file_mode``
+    'rotate' the log file rotates at ``max_bytes`` keeping ``backup_count``
+    old files (see LOG_FILE_MODES for the others), and the last
+    ``ring_buffer_size`` lines are also kept in memory (see recent_logs).
+    Calling this again replaces the previous configuration.
+    """
+    global _listener, _ring_buffer
+    stop_logging()
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    if file_mode not in LOG_FILE_MODES:
+        raise ValueError(f"Unknown log file mode {file_mode!r}")
+    if log_file and file_mode == 'rotate':
+        handlers.append(RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count))
+    elif log_file and file_mode == 'watch':
+        handlers.append(WatchedFileHandler(log_file))
+    if console:
+        handlers.append(logging.StreamHandler(sys.stderr))
+    _ring_buffer = RingBufferHandler(ring_buffer_size) if ring_buffer_size else None
+    if _ring_buffer is not None:
+        handlers.append(_ring_buffer)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _ThreadQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(debug_sample_rate))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def recent_logs(cursor=None, limit: int = 100) -> LogPage:
+    """
+    Return a LogPage from the in-memory log buffer.
+
+    Pass the returned cursor back to get only lines logged since.  Lines are
+    per process: each server worker keeps its own buffer, and a cursor from
+    another worker's buffer starts over (``reset``).
+    """
+    if _ring_buffer is None:
+        return LogPage([], None, True, False)
+    return _ring_buffer.since(cursor, limit)
+
+
+def _restart_listener_after_fork() -> None:
+    """
+    Give a forked child its own listener thread.
+
+    Threads do not survive fork(), so without this a pre-forking server's
+    workers would queue records that nothing ever writes out.
+    """
+    global _listener
+    if _listener is not None:
+        _listener = QueueListener(_listener.queue, *_listener.handlers, respect_handler_level=True)
+        _listener.start()
+    if _ring_buffer is not None:
+        # Cursors into the parent's buffer must not match the child's copy
+        _ring_buffer.new_buffer_id()
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+os.register_at_fork(after_in_child=_restart_listener_after_fork)
@@ -0,0 +1,245 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from weight_tracker.config import logger
+
+# Upper bounds (seconds / bytes / statements) of the histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class CounterMetric:
+    """A monotonically increasing value per label set."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class HistogramMetric:
+    """Cumulative bucket counts, sum and count per label set."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # One slot per bucket plus +Inf, then the sum
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = sorted((labels, list(state)) for labels, state in self._values.items())
+        names = self.labelnames + ('le',)
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state[:-1]):
+                cumulative += count
+                yield (f'{self.name}_bucket',
+                       _format_labels(names, labels + (_format_value(float(bound)),)), cumulative)
+            yield f'{self.name}_sum', _format_labels(self.labelnames, labels), state[-1]
+            yield f'{self.name}_count', _format_labels(self.labelnames, labels), cumulative
+
+
+class MetricsRegistry:
+    """The set of metrics exposed by /api/debug/metrics."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()) -> CounterMetric:
+        metric = CounterMetric(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> HistogramMetric:
+        metric = HistogramMetric(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# Requests are labelled by blueprint and URL rule, e.g. ("entries", "/api/entries/<int:entry_id>")
+REQUEST_LABELS = ('blueprint', 'route', 'method')
+
+request_duration = registry.histogram(
+    'weight_tracker_http_request_duration_seconds',
+    'Time spent handling HTTP requests.', REQUEST_LABELS)
+response_size = registry.histogram(
+    'weight_tracker_http_response_size_bytes',
+    'Size of HTTP response bodies with a known length.', REQUEST_LABELS, SIZE_BUCKETS)
+requests_total = registry.counter(
+    'weight_tracker_http_requests_total',
+    'HTTP requests handled, by status code.', REQUEST_LABELS + ('status',))
+request_queries = registry.histogram(
+    'weight_tracker_db_queries_per_request',
+    'SQL statements executed while handling a request.', REQUEST_LABELS, QUERY_COUNT_BUCKETS)
+request_query_duration = registry.histogram(
+    'weight_tracker_db_query_duration_per_request_seconds',
+    'Total SQL execution time while handling a request.', REQUEST_LABELS)
+queries_total = registry.counter(
+    'weight_tracker_db_queries_total',
+    'SQL statements executed, including those outside requests.')
+query_duration_total = registry.counter(
+    'weight_tracker_db_query_duration_seconds_total',
+    'Total time spent executing SQL statements.')
+slow_requests_total = registry.counter(
+    'weight_tracker_slow_requests_total',
+    'Requests slower than METRICS_SLOW_REQUEST_MS.', REQUEST_LABELS)
+repeated_queries_total = registry.counter(
+    'weight_tracker_repeated_query_requests_total',
+    'Requests that ran one statement at least METRICS_N_PLUS_ONE_THRESHOLD times.', REQUEST_LABELS)
+
+
+def _request_labels():
+    rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    return (request.blueprint or 'app', rule, request.method)
+
+
+def _before_request() -> None:
+    g.metrics_start = time.perf_counter()
+    g.sql_count = 0
+    g.sql_time = 0.0
+    g.sql_statements = Counter()
+
+
+def _after_request(response):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    labels = _request_labels()
+    sql_count = g.get('sql_count', 0)
+    sql_time = g.get('sql_time', 0.0)
+    statements = g.get('sql_statements') or Counter()
+
+    request_duration.observe(elapsed, labels)
+    requests_total.inc(labels + (str(response.status_code),))
+    # Streamed responses have no length until they have been sent
+    if response.content_length is not None:
+        response_size.observe(response.content_length, labels)
+    request_queries.observe(sql_count, labels)
+    request_query_duration.observe(sql_time, labels)
+
+    slow_request_ms = current_app.config['METRICS_SLOW_REQUEST_MS']
+    if slow_request_ms and elapsed * 1000 >= slow_request_ms:
+        slow_requests_total.inc(labels)
+        logger.warning("Slow request: %s %s took %.1f ms (%s SQL statements, %.1f ms in SQL)",
+                       request.method, request.path, elapsed * 1000, sql_count, sql_time * 1000)
+
+    n_plus_one_threshold = current_app.config['METRICS_N_PLUS_ONE_THRESHOLD']
+    if n_plus_one_threshold and statements:
+        statement, repeats = statements.most_common(1)[0]
+        if repeats >= n_plus_one_threshold:
+            repeated_queries_total.inc(labels)
+            logger.warning("Possible N+1 query: %s %s ran the same statement %s times: %s",
+                           request.method, request.path, repeats, ' '.join(statement.split())[:200])
+    return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    queries_total.inc()
+    query_duration_total.inc(amount=elapsed)
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_count += 1
+        g.sql_time += elapsed
+        g.sql_statements[statement] += 1
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    if context.connection is not None:
+        starts = context.connection.info.get('metrics_query_start')
+        if starts:
+            starts.pop()
+
+
+def init_metrics(app, engine, slow_request_ms=0, n_plus_one_threshold=0) -> None:
+    """
+    Record request and SQL metrics for ``app``.
+
+    Every request's latency, response size and status code are recorded per
+    blueprint and route, along with the number of SQL statements it ran and the
+    time they took (timed with the engine's cursor-execute events).  Requests
+    slower than ``slow_request_ms`` and requests that ran the same statement at
+    least ``n_plus_one_threshold`` times are logged; 0 disables either check.
+
+    Metrics are kept in process memory, so each server worker reports its own.
+    """
+    app.config['METRICS_SLOW_REQUEST_MS'] = slow_request_ms
+    app.config['METRICS_N_PLUS_ONE_THRESHOLD'] = n_plus_one_threshold
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
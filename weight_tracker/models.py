@@ -1,8 +1,11 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import update
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
-from weight_tracker.utils import calculate_body_fat_percentage, calculate_muscle_mass
+from weight_tracker.utils import (calculate_body_fat_percentage, calculate_muscle_mass,
+                                  calculate_body_fat_percentage_array,
+                                  calculate_muscle_mass_array)
 
 # Initialize SQLAlchemy instance
 # NOTE: the db object is used by other modules to initialise the app's database
@@ -37,6 +40,14 @@ class User(db.Model):
     height = db.Column(db.Float)  # height in cm
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
+    # Incremented whenever the user's entries, goals or profile change; used as
+    # the ETag of the per-user GET routes (see bump_data_version)
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # data_version at the last profile change and when it happened, for the
+    # change feed (see weight_tracker.routes.sync)
+    profile_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+
     # establish ORM relationships to entries and goals
     entries = db.relationship('Entry', backref='user', lazy=True)
     goals = db.relationship('Goal', backref='user', lazy=True)
@@ -79,22 +90,44 @@ class Entry(db.Model):
     # associate entry with a user – must not be null now that authentication is required
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
-    def to_dict(self) -> dict:
-        """Return a serialisable representation of this entry including derived metrics."""
-        # Calculate values on-the-fly when converting to dict
-        # Get user details if available (there should always be a user now)
-        user = User.query.get(self.user_id) if self.user_id else None
-        height = user.height if user else None
-        gender = user.sex if user else None
+    # user-scoped listings filter on user_id and order/range-scan on date; the
+    # change feed looks up rows written after a given data version
+    __table_args__ = (db.Index('ix_entry_user_id_date', 'user_id', 'date'),
+                      db.Index('ix_entry_user_id_version', 'user_id', 'version'))
+
+    # derived metrics, stored at write time so reads are plain column fetches.
+    # They depend on the owner's height and sex as well as the measurements, so
+    # they must be refreshed whenever either changes (see recompute_entry_metrics).
+    fat_percentage = db.Column(db.Float)
+    muscle_mass = db.Column(db.Float)
+
+    # owner's data_version when this row was last written and the time of that
+    # write (see mark_written)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+
+    def refresh_derived_metrics(self, profile=None) -> None:
+        """
+        Recalculate fat_percentage and muscle_mass from this entry's measurements.
 
-        fat_percentage = calculate_body_fat_percentage(
+        ``profile`` is an optional ``(height, sex)`` pair for the owning user; when
+        omitted the user is looked up.
+        """
+        if profile is None:
+            user = User.query.get(self.user_id) if self.user_id else None
+            profile = (user.height, user.sex) if user else (None, None)
+        height, gender = profile
+
+        self.fat_percentage = calculate_body_fat_percentage(
             self.weight, self.neck, self.belly, height, gender, self.hip
-        ) if all([self.weight, self.neck, self.belly]) else None
+        ) if all([self.weight, self.neck, self.belly, gender]) and height is not None else None
 
-        muscle_mass = calculate_muscle_mass(
-            self.weight, fat_percentage
-        ) if all([self.weight, fat_percentage]) else None
+        self.muscle_mass = calculate_muscle_mass(
+            self.weight, self.fat_percentage
+        ) if all([self.weight, self.fat_percentage]) else None
 
+    def to_dict(self) -> dict:
+        """Return a serialisable representation of this entry including derived metrics."""
         return {
             'id': self.id,
             'date': self.date.strftime('%Y-%m-%d'),
@@ -102,12 +135,133 @@ class Entry(db.Model):
             'neck': self.neck,
             'belly': self.belly,
             'hip': self.hip,
-            'fat_percentage': fat_percentage,
-            'muscle_mass': muscle_mass,
+            'fat_percentage': self.fat_percentage,
+            'muscle_mass': self.muscle_mass,
             'user_id': self.user_id
         }
 
 
+def load_user_profiles(user_ids) -> dict:
+    """
+    Return a mapping of user id to ``(height, sex)`` for the given ids.
+
+    All profiles are fetched with a single query regardless of how many ids are
+    requested, so this is safe to call once per request for a whole result set.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return {}
+    rows = db.session.query(User.id, User.height, User.sex).filter(User.id.in_(user_ids))
+    return {user_id: (height, sex) for user_id, height, sex in rows}
+
+
+def bump_data_version(*user_ids) -> dict:
+    """
+    Increment the data version of the given users.
+
+    Call this in the same transaction as the write that changes a user's
+    entries, goals or profile, so the new version is committed together with
+    the data it describes.  Returns ``{user_id: new version}``.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return {}
+    rows = db.session.execute(
+        update(User).where(User.id.in_(user_ids)).values(data_version=User.data_version + 1)
+        .returning(User.id, User.data_version)
+    )
+    return dict(rows.all())
+
+
+def written_values(user_id, versions, now=None) -> dict:
+    """
+    Column values recording that an entry or goal of ``user_id`` was written.
+
+    ``versions`` is the result of bump_data_version for the same transaction.
+    Use this for bulk INSERT/UPDATE statements and mark_written for objects.
+    """
+    return {'version': versions.get(user_id, 0), 'updated_at': now or datetime.utcnow()}
+
+
+def mark_written(row, versions) -> None:
+    """Stamp an entry or goal being written with its owner's new data version (see written_values)."""
+    for column, value in written_values(row.user_id, versions).items():
+        setattr(row, column, value)
+
+
+def log_deletions(kind: str, rows, versions) -> None:
+    """
+    Record tombstones for deleted rows so the change feed can report them.
+
+    ``kind`` is 'entry' or 'goal' and ``rows`` holds ``(id, user_id)`` pairs.
+    Call this in the transaction that deletes them, after bump_data_version.
+    """
+    now = datetime.utcnow()
+    db.session.add_all(
+        DeletionLog(kind=kind, object_id=object_id, user_id=user_id,
+                    version=versions.get(user_id, 0), deleted_at=now)
+        for object_id, user_id in rows
+    )
+
+
+def serialize_entries(entries) -> list:
+    """
+    Serialise a list of entries, producing the same dicts as Entry.to_dict.
+
+    Derived metrics are stored on the entry rows, so this issues no queries.
+    """
+    return [entry.to_dict() for entry in entries]
+
+
+def recompute_entry_metrics(user_id=None, chunk_size=5000) -> int:
+    """
+    Recompute the stored derived metrics for one user's entries, or for every entry.
+
+    Rows are processed in primary-key order, ``chunk_size`` at a time, using the
+    vectorised helpers and a bulk UPDATE per chunk.  The caller is responsible for
+    committing.  Returns the number of entries updated.
+    """
+    columns = (Entry.id, Entry.user_id, Entry.weight, Entry.neck, Entry.belly, Entry.hip)
+    updated = 0
+    last_id = 0
+    versions = {}
+    now = datetime.utcnow()
+
+    while True:
+        query = db.session.query(*columns).filter(Entry.id > last_id)
+        if user_id is not None:
+            query = query.filter(Entry.user_id == user_id)
+        rows = query.order_by(Entry.id).limit(chunk_size).all()
+        if not rows:
+            break
+
+        ids, user_ids, weights, necks, bellies, hips = zip(*rows)
+        profiles = load_user_profiles(user_ids)
+        row_profiles = [profiles.get(row_user_id, (None, None)) for row_user_id in user_ids]
+
+        fat_percentages = calculate_body_fat_percentage_array(
+            weights, necks, bellies,
+            [height for height, _ in row_profiles],
+            [sex for _, sex in row_profiles],
+            hips
+        )
+        muscle_masses = calculate_muscle_mass_array(weights, fat_percentages)
+
+        # Each affected user's version is bumped once, when first seen
+        versions.update(bump_data_version(*(set(user_ids) - versions.keys())))
+        db.session.execute(update(Entry), [
+            {'id': entry_id, 'fat_percentage': fat_percentage, 'muscle_mass': muscle_mass,
+             **written_values(row_user_id, versions, now)}
+            for entry_id, row_user_id, fat_percentage, muscle_mass
+            in zip(ids, user_ids, fat_percentages.tolist(), muscle_masses.tolist())
+        ])
+
+        updated += len(rows)
+        last_id = ids[-1]
+
+    return updated
+
+
 class Goal(db.Model):
     """
     Represents a goal set by a user, such as reaching a target weight or body fat
@@ -129,6 +283,16 @@ class Goal(db.Model):
     # begin on this date; otherwise the created_at timestamp is used.
     start_date = db.Column(db.DateTime, nullable=True)
 
+    # owner's data_version when this row was last written and the time of that
+    # write (see mark_written)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+
+    # user-scoped goal listings filter on user_id and order by target_date; the
+    # change feed looks up rows written after a given data version
+    __table_args__ = (db.Index('ix_goal_user_id_target_date', 'user_id', 'target_date'),
+                      db.Index('ix_goal_user_id_version', 'user_id', 'version'))
+
     def to_dict(self) -> dict:
         """Return a serialisable representation of this goal."""
         # If start_date is None, use created_at as fallback
@@ -145,3 +309,109 @@ class Goal(db.Model):
             'user_id': self.user_id,
             'start_date': start_date_value.strftime('%Y-%m-%d')
         }
+
+
+class TrendState(db.Model):
+    """
+    Running trend statistics for one metric of one user's entries.
+
+    Holds exponentially weighted least-squares sums over every entry and the
+    entries of the recent rolling window, so trends can be read and updated
+    without revisiting the user's history (see weight_tracker.trends).
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    metric = db.Column(db.String(20), primary_key=True)  # 'weight', 'fat_percentage' or 'muscle_mass'
+
+    count = db.Column(db.Integer, nullable=False, default=0)
+    # Weights and times in the sums are relative to the anchor, the latest date
+    # ever added; latest_date is the date of the newest entry still present
+    anchor = db.Column(db.DateTime, nullable=False)
+    latest_date = db.Column(db.DateTime, nullable=False)
+
+    # Sums of w, w*t, w*y, w*t^2 and w*t*y with t in days before the anchor
+    sum_w = db.Column(db.Float, nullable=False, default=0.0)
+    sum_wt = db.Column(db.Float, nullable=False, default=0.0)
+    sum_wy = db.Column(db.Float, nullable=False, default=0.0)
+    sum_wtt = db.Column(db.Float, nullable=False, default=0.0)
+    sum_wty = db.Column(db.Float, nullable=False, default=0.0)
+
+    # [[ISO date, value], ...] for entries within the rolling window, oldest first
+    window = db.Column(db.JSON, nullable=False, default=list)
+
+
+class Job(db.Model):
+    """
+    A unit of background work and its outcome (see weight_tracker.jobs).
+
+    Jobs are stored so their status can be polled and so queued or interrupted
+    work is picked up again after a restart.  user_id is not a foreign key
+    because a job (e.g. deleting a user) may outlive the user it concerns.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(40), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded or failed
+    user_id = db.Column(db.Integer, nullable=True)
+
+    params = db.Column(db.JSON, nullable=False, default=dict)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # Renewed by the worker running the job; a running job past it was abandoned
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+
+    # workers look up queued jobs on startup
+    __table_args__ = (db.Index('ix_job_status', 'status'),)
+
+    def to_dict(self) -> dict:
+        """Return a serialisable representation of this job (without its parameters)."""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'user_id': self.user_id,
+            'result': self.result,
+            'error': self.error,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'lease_expires_at': self.lease_expires_at.isoformat() if self.lease_expires_at else None
+        }
+
+
+class SchemaVersion(db.Model):
+    """
+    One applied schema migration (see weight_tracker.schema.MIGRATIONS).
+
+    The database's schema version is the highest version recorded here, so
+    startup can tell whether migrations are pending with a single query.
+    """
+    __tablename__ = 'schema_version'
+
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class DeletionLog(db.Model):
+    """
+    Tombstone of a deleted entry or goal, reported by the change feed.
+
+    Rows are kept until their user is deleted, so a client can catch up from
+    any earlier version.
+    """
+    __tablename__ = 'deletion_log'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'entry' or 'goal'
+    object_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    # owner's data_version after the deletion
+    version = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_deletion_log_user_id_version', 'user_id', 'version'),)
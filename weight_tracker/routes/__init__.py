@@ -4,6 +4,9 @@ from weight_tracker.routes.users import users_bp
 from weight_tracker.routes.progress import progress_bp
 from weight_tracker.routes.debug import debug_bp
 from weight_tracker.routes.auth import auth_bp
+from weight_tracker.routes.jobs import jobs_bp
+from weight_tracker.routes.analytics import analytics_bp
+from weight_tracker.routes.sync import sync_bp
 
 
 def register_blueprints(app):
@@ -16,3 +19,6 @@ def register_blueprints(app):
     app.register_blueprint(progress_bp)
     app.register_blueprint(debug_bp)
     app.register_blueprint(auth_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(analytics_bp)
+    app.register_blueprint(sync_bp)
@@ -0,0 +1,200 @@
+from datetime import datetime, timedelta
+
+from flask import Blueprint, jsonify, request
+from sqlalchemy import and_, case, exists, func, or_, select
+from sqlalchemy.orm import aliased
+
+from weight_tracker.models import db, Entry, Goal, User
+from weight_tracker.config import logger
+
+analytics_bp = Blueprint('analytics', __name__, url_prefix='/api/analytics')
+
+# Columns of the cohort table, in row order
+COHORT_COLUMNS = ('user_id', 'username', 'name', 'entries', 'first_date', 'latest_date',
+                  'first_weight', 'latest_weight', 'total_change', 'last_change', 'period_change',
+                  'current_streak', 'goals_hit', 'goals_missed', 'goal_hit_rate')
+
+# Default and largest period, in days, of the period_change column
+COHORT_DEFAULT_DAYS = 30
+COHORT_MAX_DAYS = 3650
+
+# Streaks are counted over at most this many recent days, so longer ones are
+# reported as this many
+COHORT_STREAK_MAX_DAYS = 365
+
+# Goal targets and the entry column each is measured against
+_GOAL_TARGETS = (('target_weight', 'weight'), ('target_fat_percentage', 'fat_percentage'),
+                 ('target_muscle_mass', 'muscle_mass'))
+
+
+def _entry_id(order, *conditions, offset=0):
+    """Correlated subquery: id of the user's first entry in ``order`` among those matching ``conditions``."""
+    return select(Entry.id).where(Entry.user_id == User.id, *conditions) \
+        .order_by(*order).limit(1).offset(offset).correlate(User).scalar_subquery()
+
+
+def _user_summaries(cutoff):
+    """
+    Return one row per user: the user's id, username and name, entry count and
+    their first, latest, previous (before the latest) and ``cutoff`` (latest on
+    or before ``cutoff``) entries, each None when missing.
+
+    Every lookup is an index seek on (user_id, date), so the cost follows the
+    number of users rather than the length of their histories.
+    """
+    oldest_first = (Entry.date, Entry.id)
+    newest_first = (Entry.date.desc(), Entry.id.desc())
+    ids = select(
+        User.id.label('user_id'), User.username, User.name,
+        select(func.count()).where(Entry.user_id == User.id).correlate(User).scalar_subquery().label('entries'),
+        _entry_id(oldest_first).label('first_id'),
+        _entry_id(newest_first).label('latest_id'),
+        _entry_id(newest_first, offset=1).label('previous_id'),
+        _entry_id(newest_first, Entry.date <= cutoff).label('cutoff_id')
+    ).subquery()
+
+    entries = [aliased(Entry) for _ in range(4)]
+    stmt = select(ids.c.user_id, ids.c.username, ids.c.name, ids.c.entries, *entries).select_from(ids)
+    for entry, column in zip(entries, ('first_id', 'latest_id', 'previous_id', 'cutoff_id')):
+        stmt = stmt.outerjoin(entry, entry.id == ids.c[column])
+    return db.session.execute(stmt.order_by(ids.c.user_id)).all()
+
+
+def _streaks(today):
+    """
+    Return ``{user_id: current_streak}`` for users with a streak.
+
+    The streak is the number of consecutive days with at least one entry,
+    ending today or yesterday.  Consecutive days share the same difference
+    between their day number and their ROW_NUMBER, so grouping by that
+    difference yields each run of days; only the run that reaches yesterday or
+    today is kept.
+    """
+    yesterday = (today - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    since = yesterday - timedelta(days=COHORT_STREAK_MAX_DAYS - 1)
+    # Only users with an entry since yesterday have a streak; selecting them
+    # first lets each one's recent days be read with an index range scan
+    active = select(User.id).where(
+        exists().where(Entry.user_id == User.id, Entry.date >= yesterday).correlate(User))
+    day = func.date(Entry.date)
+    days = select(Entry.user_id, day.label('day')) \
+        .where(Entry.user_id.in_(active), Entry.date >= since) \
+        .group_by(Entry.user_id, day).subquery()
+    runs = select(
+        days.c.user_id, days.c.day,
+        (func.julianday(days.c.day)
+         - func.row_number().over(partition_by=days.c.user_id, order_by=days.c.day)).label('run')
+    ).subquery()
+    streaks = select(runs.c.user_id, func.count()) \
+        .group_by(runs.c.user_id, runs.c.run).having(func.max(runs.c.day) >= yesterday.strftime('%Y-%m-%d'))
+    return {user_id: min(length, COHORT_STREAK_MAX_DAYS) for user_id, length in db.session.execute(streaks)}
+
+
+def _target_reached(goal_start, target, column):
+    """
+    SQL condition: an entry between the goal's start and target date reached ``target``.
+
+    The direction comes from the user's value at the start of the goal: the
+    latest entry on or before it, else the first entry after it.
+    """
+    before, after, reached = aliased(Entry), aliased(Entry), aliased(Entry)
+    start_value = func.coalesce(
+        select(getattr(before, column))
+        .where(before.user_id == Goal.user_id, before.date <= goal_start,
+               getattr(before, column).isnot(None))
+        .order_by(before.date.desc(), before.id.desc()).limit(1).correlate(Goal).scalar_subquery(),
+        select(getattr(after, column))
+        .where(after.user_id == Goal.user_id, after.date > goal_start,
+               getattr(after, column).isnot(None))
+        .order_by(after.date, after.id).limit(1).correlate(Goal).scalar_subquery()
+    )
+    value = getattr(reached, column)
+    return exists().where(
+        reached.user_id == Goal.user_id,
+        reached.date >= goal_start,
+        reached.date <= Goal.target_date,
+        case((start_value > target, value <= target), else_=value >= target)
+    )
+
+
+def _goal_outcomes(now):
+    """
+    Return ``{user_id: (goals_hit, goals_missed)}``.
+
+    A goal is hit once every target it sets has been reached by an entry
+    between its start and target dates, and missed when its target date has
+    passed without that.  Goals still in progress count as neither.  Each
+    lookup is an index range scan on the goal's user, so the cost follows the
+    number of goals rather than the size of the entry history.
+    """
+    goal_start = func.coalesce(Goal.start_date, Goal.created_at)
+    conditions = [or_(getattr(Goal, target).is_(None), _target_reached(goal_start, getattr(Goal, target), column))
+                  for target, column in _GOAL_TARGETS]
+    outcomes = select(
+        Goal.user_id,
+        case((and_(*conditions), 1), else_=0).label('hit'),
+        case((Goal.target_date < now, 1), else_=0).label('due')
+    ).where(or_(*(getattr(Goal, target).isnot(None) for target, _ in _GOAL_TARGETS))).subquery()
+    rows = db.session.execute(
+        select(outcomes.c.user_id, func.sum(outcomes.c.hit),
+               func.sum(case((and_(outcomes.c.hit == 0, outcomes.c.due == 1), 1), else_=0)))
+        .group_by(outcomes.c.user_id)
+    )
+    return {user_id: (hit, missed) for user_id, hit, missed in rows}
+
+
+def _change(latest, earlier):
+    if latest is None or earlier is None:
+        return None
+    return round(latest.weight - earlier.weight, 2)
+
+
+def _day(entry):
+    return entry.date.strftime('%Y-%m-%d') if entry is not None else None
+
+
+def build_cohort(days=COHORT_DEFAULT_DAYS, now=None) -> dict:
+    """
+    Summarise every user's progress as one compact table of COHORT_COLUMNS.
+
+    Runs three statements however many users there are, instead of loading
+    each user's entries.  ``period_change`` is the latest weight minus the
+    weight on the last entry at least ``days`` days old, and is None when
+    there are no newer entries.
+    """
+    now = now or datetime.now()
+    cutoff = now - timedelta(days=days)
+    streaks = _streaks(now)
+    goals = _goal_outcomes(now)
+
+    rows = []
+    for user_id, username, name, entries, first, latest, previous, at_cutoff in _user_summaries(cutoff):
+        hit, missed = goals.get(user_id, (0, 0))
+        rows.append([
+            user_id, username, name, entries, _day(first), _day(latest),
+            first.weight if first is not None else None,
+            latest.weight if latest is not None else None,
+            _change(latest, first),
+            _change(latest, previous),
+            _change(latest, at_cutoff) if latest is not None and latest.date > cutoff else None,
+            streaks.get(user_id, 0), hit, missed,
+            round(hit / (hit + missed), 3) if hit + missed else None
+        ])
+    return {'as_of': now.strftime('%Y-%m-%d'), 'period_days': days, 'columns': list(COHORT_COLUMNS), 'rows': rows}
+
+
+@analytics_bp.route('/cohort', methods=['GET'])
+def get_cohort():
+    """Per-user summary of every user: weight changes, current entry streak and goal hit rate."""
+    try:
+        days = request.args.get('days', COHORT_DEFAULT_DAYS, type=int)
+        if not 1 <= days <= COHORT_MAX_DAYS:
+            return jsonify({'error': f'days must be between 1 and {COHORT_MAX_DAYS}'}), 400
+
+        logger.debug("Processing GET request for cohort analytics")
+        cohort = build_cohort(days)
+        logger.debug("Summarised %s users", len(cohort['rows']))
+        return jsonify(cohort)
+    except Exception as e:
+        logger.error("Error building cohort analytics: %s", e)
+        return jsonify({'error': 'Failed to build cohort analytics'}), 500
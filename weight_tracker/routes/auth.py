@@ -1,9 +1,21 @@
 from flask import Blueprint, request, session, jsonify
 from weight_tracker.models import db, User
+from weight_tracker.cache import get_user_profile
+from weight_tracker.security import (password_hasher, PasswordHasherBusy, store_session_profile,
+                                     session_profile, clear_session_profile)
 
 # Blueprint for authentication routes
 auth_bp = Blueprint('auth', __name__)
 
+
+@auth_bp.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(error):
+    # Too many logins at once; ask the client to retry rather than queueing more
+    response = jsonify({'error': 'Server busy, please try again'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
 @auth_bp.route('/api/register', methods=['POST'])
 def register():
     data = request.get_json() or {}
@@ -22,15 +34,16 @@ def register():
     if User.query.filter_by(username=username).first():
         return jsonify({'error': 'Username already taken'}), 400
 
-    # Create user and hash password
+    # Create user and hash password (off the request thread)
     user = User(username=username, name=name or username, age=age, sex=sex, height=height)
-    user.set_password(password)
+    user.password_hash = password_hasher.hash(password)
     db.session.add(user)
     db.session.commit()
+    profile = user.to_dict()
 
     # Log the user in by storing their ID in the session
-    session['user_id'] = user.id
-    return jsonify({'message': 'User registered', 'user': user.to_dict()}), 201
+    store_session_profile(profile)
+    return jsonify({'message': 'User registered', 'user': profile}), 201
 
 @auth_bp.route('/api/login', methods=['POST'])
 def login():
@@ -39,16 +52,17 @@ def login():
     password = data.get('password')
 
     user = User.query.filter_by(username=username).first()
-    if not user or not user.check_password(password):
+    if not user or not password_hasher.verify(user.password_hash, password):
         return jsonify({'error': 'Invalid credentials'}), 401
 
-    session['user_id'] = user.id
-    return jsonify({'message': 'Logged in', 'user': user.to_dict()})
+    profile = user.to_dict()
+    store_session_profile(profile)
+    return jsonify({'message': 'Logged in', 'user': profile})
 
 @auth_bp.route('/api/logout', methods=['POST'])
 def logout():
-    # Remove user ID from session
-    session.pop('user_id', None)
+    # Remove user ID (and any profile snapshot) from session
+    clear_session_profile()
     return jsonify({'message': 'Logged out'})
 
 @auth_bp.route('/api/status', methods=['GET'])
@@ -56,5 +70,10 @@ def status():
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({'logged_in': False}), 200
-    user = User.query.get(user_id)
-    return jsonify({'logged_in': True, 'user': user.to_dict()})
+    # The session snapshot answers without a query, the profile cache with a version check
+    profile = session_profile() or get_user_profile(user_id)
+    if profile is None:
+        # The user was deleted since logging in
+        clear_session_profile()
+        return jsonify({'logged_in': False}), 200
+    return jsonify({'logged_in': True, 'user': profile})
@@ -1,35 +1,82 @@
-from flask import Blueprint, jsonify, current_app
-from weight_tracker.config import logger, DEBUG_MODE, log_file
+import hmac
+
+from flask import Blueprint, Response, jsonify, current_app, request
+from weight_tracker.config import logger, DEBUG_MODE, DEBUG_TOKEN, METRICS_ENABLED
+from weight_tracker.cache import progress_cache, profile_cache
+from weight_tracker.timeseries import entry_store
+from weight_tracker.logging_setup import recent_logs
+from weight_tracker.metrics import registry
 
 debug_bp = Blueprint('debug', __name__, url_prefix='/api/debug')
 
+# Addresses trusted with debug details when no DEBUG_TOKEN is configured
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+def is_trusted_request() -> bool:
+    """True for a request carrying DEBUG_TOKEN or, when there is none, coming from this host."""
+    if DEBUG_TOKEN:
+        return hmac.compare_digest(request.headers.get('X-Debug-Token', ''), DEBUG_TOKEN)
+    return request.remote_addr in LOCAL_ADDRESSES
+
+
 @debug_bp.route('/status', methods=['GET'])
 def server_status():
     try:
         # Check if debug mode is enabled
         debug_mode_enabled = DEBUG_MODE
+
+        # Anyone may see that the server is up; the details (database URI,
+        # cache sizes, logs) are for trusted requests only
+        if not is_trusted_request():
+            return jsonify({
+                "status": "running",
+                "debug_mode": debug_mode_enabled,
+                "warning": "Server details are only shown to requests with a valid X-Debug-Token."
+            })
         
         # Return basic server status info
         status = {
             "status": "running",
             "debug_mode": debug_mode_enabled,
-            "database_uri": current_app.config['SQLALCHEMY_DATABASE_URI']
+            "database_uri": current_app.config['SQLALCHEMY_DATABASE_URI'],
+            "storage_profile": current_app.config['STORAGE_PROFILE'],
+            "caches": {
+                "progress": progress_cache.stats(),
+                "profiles": profile_cache.stats(),
+                "entries": entry_store.stats()
+            }
         }
         
-        # Only include logs if debug mode is enabled
+        # Only include logs if debug mode is enabled.  Lines come from the
+        # in-memory log buffer; pollers pass back ?since=<log_cursor> to get only
+        # the lines logged after their previous request.  Each worker has its
+        # own buffer: log_reset says the lines replace the previous ones, and
+        # log_truncated that lines were skipped since the cursor.
         if debug_mode_enabled:
-            try:
-                with open(log_file, 'r') as f:
-                    # Get last 100 lines of log
-                    logs = f.readlines()[-100:]
-                status["logs"] = logs
-            except Exception as e:
-                logger.error(f"Error reading log file: {str(e)}")
-                status["logs_error"] = str(e)
+            page = recent_logs(request.args.get('since'), limit=100)
+            status["logs"] = page.lines
+            status["log_cursor"] = page.cursor
+            status["log_reset"] = page.reset
+            status["log_truncated"] = page.truncated
         else:
             status["warning"] = "Debug mode is disabled. Enable DEBUG_MODE=true to see detailed logs."
         
         return jsonify(status)
     except Exception as e:
-        logger.error(f"Error retrieving server status: {str(e)}")
+        logger.error("Error retrieving server status: %s", e)
         return jsonify({"error": "Failed to retrieve server status"}), 500
+
+
+@debug_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Request and SQL metrics in the Prometheus text format."""
+    if not METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled. Set METRICS_ENABLED=true to collect them."}), 404
+    if not is_trusted_request():
+        return jsonify({"error": "Metrics require a valid X-Debug-Token"}), 403
+    try:
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+    except Exception as e:
+        logger.error("Error rendering metrics: %s", e)
+        return jsonify({"error": "Failed to render metrics"}), 500
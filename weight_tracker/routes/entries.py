@@ -1,20 +1,166 @@
-from flask import Blueprint, request, jsonify
-from datetime import datetime
-from weight_tracker.models import db, Entry
-from weight_tracker.config import logger
+import base64
+import csv
+import io
+import json
+import os
+import uuid
+
+from flask import Blueprint, Response, request, jsonify, url_for, stream_with_context
+from datetime import datetime, timedelta
+from sqlalchemy import case, func, select, tuple_
+from weight_tracker.models import db, Entry, serialize_entries, bump_data_version, mark_written, log_deletions
+from weight_tracker.cache import invalidate_user
+from weight_tracker.trends import record_entry_added, record_entry_changed, snapshot
+from weight_tracker.timeseries import SERIES_FIELDS, entry_store, snapshot_row, to_microseconds, user_series
+from weight_tracker.etags import conditional_user_response
+from weight_tracker.bulk import parse_entry_data, read_csv_rows, import_entries
+from weight_tracker.config import (logger, ENTRIES_MAX_PAGE_SIZE, EXPORT_CHUNK_SIZE, IMPORT_CHUNK_SIZE,
+                                   JOB_OUTPUT_DIR)
+from weight_tracker.jobs import job_handler, enqueue_job, accepted_response, wants_background
+from weight_tracker.utils import largest_triangle_three_buckets
+from weight_tracker.lazy import lazy_import
+
+np = lazy_import('numpy')
 
 entries_bp = Blueprint('entries', __name__, url_prefix='/api/entries')
 
+
+def _encode_cursor(values):
+    """Encode the sort key of the last row on a page as an opaque cursor string."""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor, order_columns):
+    """Decode a cursor produced by _encode_cursor for the given sort columns."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(order_columns):
+            raise ValueError
+        return [datetime.fromisoformat(v) if column is Entry.date else int(v)
+                for column, v in zip(order_columns, values)]
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+def _parse_date_arg(name):
+    """Parse an optional YYYY-MM-DD query argument."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'Invalid date format for {name}. Use YYYY-MM-DD')
+
+
+def _wants_page():
+    """True if the request asked for a page rather than the full list."""
+    return 'limit' in request.args or 'cursor' in request.args
+
+
+def _page_limit():
+    """The ``limit`` query argument capped at ENTRIES_MAX_PAGE_SIZE, or None for no paging."""
+    limit = request.args.get('limit')
+    if limit is None:
+        return None
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, ENTRIES_MAX_PAGE_SIZE)
+
+
+def _query_entry_page(query, order_columns, descending=False):
+    """
+    Apply the from/to/limit/cursor query arguments to an entry query.
+
+    Pagination is keyset based: the cursor holds the values of ``order_columns``
+    for the last row of the previous page, and the next page continues strictly
+    after it, so every page costs the same regardless of how deep it is.
+    Returns ``(entries, next_cursor)``; next_cursor is None on the last page.
+    Raises ValueError for malformed arguments.
+    """
+    date_from = _parse_date_arg('from')
+    date_to = _parse_date_arg('to')
+    if date_from:
+        query = query.filter(Entry.date >= date_from)
+    if date_to:
+        # 'to' is inclusive of the whole day
+        query = query.filter(Entry.date < date_to + timedelta(days=1))
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        key = tuple_(*order_columns)
+        after = tuple_(*_decode_cursor(cursor, order_columns))
+        query = query.filter(key < after if descending else key > after)
+
+    query = query.order_by(*[column.desc() if descending else column for column in order_columns])
+
+    limit = _page_limit()
+    if limit is None:
+        return query.all(), None
+
+    # Fetch one extra row to find out whether there is another page
+    entries = query.limit(limit + 1).all()
+    if len(entries) <= limit:
+        return entries, None
+    entries = entries[:limit]
+    last = entries[-1]
+    return entries, _encode_cursor([getattr(last, column.key) for column in order_columns])
+
+
+def _series_page(series):
+    """
+    Apply the from/to/limit/cursor query arguments to a user's entry series.
+
+    The newest-first counterpart of _query_entry_page for a UserSeries, with
+    the same (date, id) cursors.  Returns ``(entry dicts, next_cursor)``.
+    """
+    start, stop = series.date_range(_parse_date_arg('from'), _parse_date_arg('to'))
+    cursor = request.args.get('cursor')
+    if cursor:
+        date, entry_id = _decode_cursor(cursor, (Entry.date, Entry.id))
+        stop = min(stop, series.position(to_microseconds(date), entry_id))
+
+    limit = _page_limit()
+    first = start if limit is None else max(start, stop - limit)
+    indices = np.arange(stop - 1, first - 1, -1)
+    entries = series.to_dicts(indices)
+    if first <= start or not entries:
+        return entries, None
+    last = series.row(first)
+    return entries, _encode_cursor([last.date, last.id])
+
+
+def _entry_page_response(entry_dicts, next_cursor):
+    """Return a page of serialised entries, advertising the next page in the response headers."""
+    response = jsonify(entry_dicts)
+    if next_cursor:
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        next_url = url_for(request.endpoint, **request.view_args, **args)
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
 @entries_bp.route('', methods=['GET'])
 def get_entries():
     try:
-        logger.info("Processing GET request for entries")
-        entries = Entry.query.order_by(Entry.date).all()
-        result = [entry.to_dict() for entry in entries]
-        logger.debug(f"Retrieved {len(result)} entries")
-        return jsonify(result)
+        logger.debug("Processing GET request for entries")
+        # Pages are keyed on (user_id, date, id) so they can walk the composite
+        # index; the unpaginated list keeps its historical date ordering
+        order_columns = (Entry.user_id, Entry.date, Entry.id) if _wants_page() else (Entry.date,)
+        entries, next_cursor = _query_entry_page(Entry.query, order_columns)
+        logger.debug("Retrieved %s entries", len(entries))
+        return _entry_page_response(serialize_entries(entries), next_cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Error retrieving entries: {str(e)}")
+        logger.error("Error retrieving entries: %s", e)
         return jsonify({"error": "Failed to retrieve entries"}), 500
 
 @entries_bp.route('', methods=['POST'])
@@ -22,51 +168,104 @@ def add_entry():
     try:
         data = request.json
         
-        # Validate required fields
-        if not data.get('weight'):
-            return jsonify({'error': 'Weight is required'}), 400
-        
-        # Parse date (if provided) or use current date
-        entry_date = data.get('date')
-        if entry_date:
-            try:
-                entry_date = datetime.strptime(entry_date, '%Y-%m-%d')
-            except ValueError:
-                return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
-        else:
-            entry_date = datetime.now()
+        try:
+            values = parse_entry_data(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Create new entry
-        new_entry = Entry(
-            date=entry_date,
-            weight=float(data.get('weight')),
-            neck=float(data.get('neck')) if data.get('neck') else None,
-            belly=float(data.get('belly')) if data.get('belly') else None,
-            hip=float(data.get('hip')) if data.get('hip') else None,
-            user_id=data.get('user_id')  # This can be null for backward compatibility
-        )
+        versions = bump_data_version(values['user_id'])
+        new_entry = Entry(**values)
+        new_entry.refresh_derived_metrics()
+        mark_written(new_entry, versions)
         
         db.session.add(new_entry)
+        record_entry_added(new_entry)
+        # The series row needs the new id; don't rely on a query autoflushing it
+        db.session.flush()
+        row = snapshot_row(new_entry)
         db.session.commit()
+        invalidate_user(new_entry.user_id)
+        entry_store.record_saved(row, versions)
         
         # Return the created entry
         return jsonify(new_entry.to_dict()), 201
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error adding entry: {e}")
+        logger.error("Error adding entry: %s", e)
         return jsonify({'error': 'Failed to add entry'}), 500
 
+@entries_bp.route('/import', methods=['POST'])
+def import_entries_route():
+    """
+    Bulk-import historical entries.
+
+    Accepts a JSON array of entries (or ``{"entries": [...]}``), a CSV body
+    (``Content-Type: text/csv``) or a CSV file upload in the ``file`` form field.
+    Query arguments: ``mode`` (insert or upsert), ``chunk_size`` (rows per
+    transaction), ``user_id`` (owner for rows that do not specify one) and
+    ``background`` (queue the import as a job and return 202 with its id; the
+    job's result is the import report).
+    """
+    try:
+        mode = request.args.get('mode', 'insert')
+        if mode not in ('insert', 'upsert'):
+            return jsonify({'error': 'Invalid mode. Use insert or upsert'}), 400
+        try:
+            chunk_size = int(request.args.get('chunk_size', IMPORT_CHUNK_SIZE))
+            default_user_id = request.args.get('user_id', type=int)
+        except ValueError:
+            return jsonify({'error': 'chunk_size must be an integer'}), 400
+        if chunk_size < 1:
+            return jsonify({'error': 'chunk_size must be positive'}), 400
+
+        if 'file' in request.files:
+            rows = read_csv_rows(request.files['file'].read().decode('utf-8-sig'))
+        elif request.mimetype == 'text/csv':
+            rows = read_csv_rows(request.get_data(as_text=True))
+        else:
+            rows = request.get_json(silent=True)
+            if isinstance(rows, dict):
+                rows = rows.get('entries')
+            if not isinstance(rows, list):
+                return jsonify({'error': 'Expected a JSON array of entries or a CSV upload'}), 400
+
+        if wants_background():
+            # The rows go to a file rather than into the job row, which every
+            # status poll reads; the job deletes it when it finishes
+            upload = _spool_import(rows)
+            job = enqueue_job('import_entries', {'file': upload, 'upsert': mode == 'upsert',
+                                                 'chunk_size': chunk_size, 'default_user_id': default_user_id},
+                              user_id=default_user_id)
+            return accepted_response(job)
+
+        logger.info("Importing %s entries (mode=%s, chunk_size=%s)", len(rows), mode, chunk_size)
+        report = import_entries(rows, upsert=(mode == 'upsert'), chunk_size=chunk_size,
+                                default_user_id=default_user_id)
+        return jsonify(report)
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Error importing entries: %s", e)
+        return jsonify({'error': 'Failed to import entries'}), 500
+
 @entries_bp.route('/<int:entry_id>', methods=['DELETE'])
 def delete_entry(entry_id):
     try:
-        logger.info(f"Processing DELETE request for entry ID: {entry_id}")
+        logger.info("Processing DELETE request for entry ID: %s", entry_id)
         entry = Entry.query.get_or_404(entry_id)
+        user_id = entry.user_id
+        before = snapshot(entry)
         db.session.delete(entry)
+        record_entry_changed(before)
+        versions = bump_data_version(user_id)
+        log_deletions('entry', [(entry_id, user_id)], versions)
         db.session.commit()
-        logger.info(f"Entry ID {entry_id} deleted successfully")
+        invalidate_user(user_id)
+        entry_store.record_removed(user_id, entry_id, versions)
+        logger.info("Entry ID %s deleted successfully", entry_id)
         return '', 204
     except Exception as e:
-        logger.error(f"Error deleting entry ID {entry_id}: {str(e)}")
+        logger.error("Error deleting entry ID %s: %s", entry_id, e)
         return jsonify({"error": "Failed to delete entry"}), 500
 
 @entries_bp.route('/<int:entry_id>', methods=['PUT'])
@@ -77,6 +276,8 @@ def update_entry(entry_id):
             return jsonify({'error': 'Entry not found'}), 404
             
         data = request.json
+        previous_user_id = entry.user_id
+        before = snapshot(entry)
         
         # Update entry fields if provided
         if 'date' in data:
@@ -95,19 +296,340 @@ def update_entry(entry_id):
             entry.hip = float(data['hip']) if data['hip'] else None
         if 'user_id' in data:
             entry.user_id = data['user_id']
-            
+        
+        entry.refresh_derived_metrics()
+        record_entry_changed(before, entry)
+        versions = bump_data_version(previous_user_id, entry.user_id)
+        mark_written(entry, versions)
+        if previous_user_id != entry.user_id:
+            # Gone from the previous owner's feed
+            log_deletions('entry', [(entry_id, previous_user_id)], versions)
+        row = snapshot_row(entry)
         db.session.commit()
+        invalidate_user(previous_user_id, entry.user_id)
+        if previous_user_id != row[1]:
+            entry_store.record_removed(previous_user_id, entry_id, versions)
+        entry_store.record_saved(row, versions)
         return jsonify(entry.to_dict())
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error updating entry: {e}")
+        logger.error("Error updating entry: %s", e)
         return jsonify({'error': 'Failed to update entry'}), 500
 
 @entries_bp.route('/user/<int:user_id>', methods=['GET'])
+@conditional_user_response
 def get_user_entries(user_id):
     try:
-        entries = Entry.query.filter_by(user_id=user_id).order_by(Entry.date.desc()).all()
-        return jsonify([entry.to_dict() for entry in entries])
+        series = user_series(user_id)
+        if series is not None:
+            return _entry_page_response(*_series_page(series))
+        entries, next_cursor = _query_entry_page(
+            Entry.query.filter_by(user_id=user_id), (Entry.date, Entry.id), descending=True
+        )
+        return _entry_page_response(serialize_entries(entries), next_cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Error fetching entries for user {user_id}: {e}")
+        logger.error("Error fetching entries for user %s: %s", user_id, e)
         return jsonify({'error': 'Failed to fetch entries'}), 500
+
+# Fields written by the export, in the same order and format as Entry.to_dict
+EXPORT_FIELDS = ('id', 'date', 'weight', 'neck', 'belly', 'hip',
+                 'fat_percentage', 'muscle_mass', 'user_id')
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'entries.ndjson'),
+    'csv': ('text/csv', 'entries.csv'),
+}
+
+
+def _iter_export_rows(user_id=None):
+    """
+    Yield chunks of export rows (as tuples in EXPORT_FIELDS order).
+
+    Rows are streamed from the database ``EXPORT_CHUNK_SIZE`` at a time and only
+    plain column tuples are loaded, so memory use does not grow with the export.
+    """
+    stmt = select(*(getattr(Entry, field) for field in EXPORT_FIELDS))
+    if user_id is not None:
+        stmt = stmt.where(Entry.user_id == user_id)
+    stmt = stmt.order_by(Entry.user_id, Entry.date, Entry.id) \
+        .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+
+    date_index = EXPORT_FIELDS.index('date')
+    for partition in db.session.execute(stmt).partitions():
+        rows = []
+        for row in partition:
+            row = list(row)
+            row[date_index] = row[date_index].strftime('%Y-%m-%d')
+            rows.append(row)
+        yield rows
+
+
+def _generate_ndjson(user_id):
+    for rows in _iter_export_rows(user_id):
+        yield ''.join(json.dumps(dict(zip(EXPORT_FIELDS, row))) + '\n' for row in rows)
+
+
+def _generate_csv(user_id):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for rows in _iter_export_rows(user_id):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, when there are no rows at all
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@entries_bp.route('/export', methods=['GET'])
+def export_entries():
+    """
+    Stream every entry (optionally only one user's) as NDJSON or CSV.
+
+    Query arguments: ``format`` (ndjson or csv, default ndjson), ``user_id`` and
+    ``background`` (write the export to a file in a job and return 202; the file
+    is then served at /api/jobs/<id>/download).
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'Invalid format. Use ndjson or csv'}), 400
+
+    user_id = request.args.get('user_id')
+    if user_id is not None:
+        try:
+            user_id = int(user_id)
+        except ValueError:
+            return jsonify({'error': 'user_id must be an integer'}), 400
+
+    if wants_background():
+        job = enqueue_job('export_entries', {'format': export_format, 'user_id': user_id}, user_id=user_id)
+        return accepted_response(job)
+
+    logger.info("Exporting entries as %s for user %s", export_format, user_id if user_id is not None else 'all')
+    generate = _generate_ndjson if export_format == 'ndjson' else _generate_csv
+    mimetype, filename = EXPORT_FORMATS[export_format]
+    return Response(
+        stream_with_context(generate(user_id)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+def _spool_import(rows) -> str:
+    """Write the rows of a background import to JOB_OUTPUT_DIR and return the file name."""
+    os.makedirs(JOB_OUTPUT_DIR, exist_ok=True)
+    name = f"import-{uuid.uuid4().hex}.json"
+    with open(os.path.join(JOB_OUTPUT_DIR, name), 'w') as handle:
+        json.dump(rows, handle)
+    return name
+
+
+@job_handler('import_entries')
+def import_entries_job(job):
+    """Run a bulk import queued by POST /api/entries/import?background=true, then delete its upload."""
+    params = job.params
+    path = os.path.join(JOB_OUTPUT_DIR, params['file'])
+    try:
+        with open(path) as handle:
+            rows = json.load(handle)
+        return import_entries(rows, upsert=params['upsert'], chunk_size=params['chunk_size'],
+                              default_user_id=params['default_user_id'])
+    finally:
+        # A failed import is not retried, so the upload is never needed again
+        if os.path.exists(path):
+            os.remove(path)
+
+
+@job_handler('export_entries')
+def export_entries_job(job):
+    """Write an export queued by GET /api/entries/export?background=true to JOB_OUTPUT_DIR."""
+    export_format, user_id = job.params['format'], job.params['user_id']
+    generate = _generate_ndjson if export_format == 'ndjson' else _generate_csv
+    mimetype, filename = EXPORT_FORMATS[export_format]
+
+    os.makedirs(JOB_OUTPUT_DIR, exist_ok=True)
+    output = f"job-{job.id}-{filename}"
+    with open(os.path.join(JOB_OUTPUT_DIR, output), 'w', newline='') as handle:
+        for chunk in generate(user_id):
+            handle.write(chunk)
+    logger.info("Exported entries for user %s to %s", user_id if user_id is not None else 'all', output)
+    return {'file': output, 'filename': filename, 'mimetype': mimetype,
+            'bytes': os.path.getsize(os.path.join(JOB_OUTPUT_DIR, output))}
+
+
+# Bucket start date for each aggregation period, as SQLite date expressions
+# (weeks start on Monday)
+AGGREGATE_BUCKETS = {
+    'day': lambda column: func.date(column),
+    'week': lambda column: func.date(column, 'weekday 0', '-6 days'),
+    'month': lambda column: func.strftime('%Y-%m-01', column),
+}
+
+AGGREGATE_METRICS = ('weight', 'fat_percentage', 'muscle_mass')
+
+# Default number of points returned by the LTTB downsampling mode
+DEFAULT_SERIES_POINTS = 500
+
+
+def _aggregate_buckets(user_id, bucket_name, date_from, date_to):
+    """Group a user's entries into time buckets in SQL, with mean/min/max/last per metric."""
+    bucket = AGGREGATE_BUCKETS[bucket_name](Entry.date).label('bucket')
+    # Rank rows within each bucket so the latest one can be picked out as "last"
+    ranked = select(
+        bucket,
+        *(getattr(Entry, metric) for metric in AGGREGATE_METRICS),
+        func.row_number().over(partition_by=bucket,
+                               order_by=(Entry.date.desc(), Entry.id.desc())).label('rank')
+    ).where(Entry.user_id == user_id)
+    if date_from:
+        ranked = ranked.where(Entry.date >= date_from)
+    if date_to:
+        ranked = ranked.where(Entry.date < date_to + timedelta(days=1))
+    ranked = ranked.subquery()
+
+    aggregates = []
+    for metric in AGGREGATE_METRICS:
+        column = ranked.c[metric]
+        aggregates += [func.avg(column), func.min(column), func.max(column),
+                       func.max(case((ranked.c.rank == 1, column)))]
+
+    stmt = select(ranked.c.bucket, func.count(), *aggregates) \
+        .group_by(ranked.c.bucket).order_by(ranked.c.bucket)
+
+    result = []
+    for row in db.session.execute(stmt):
+        bucket_dict = {'date': row[0], 'count': row[1]}
+        for i, metric in enumerate(AGGREGATE_METRICS):
+            mean, minimum, maximum, last = row[2 + i * 4: 6 + i * 4]
+            bucket_dict[metric] = {'mean': mean, 'min': minimum, 'max': maximum, 'last': last}
+        result.append(bucket_dict)
+    return result
+
+
+def _downsample_entries(user_id, metric, points, date_from, date_to):
+    """Return at most ``points`` of a user's entries, chosen by LTTB on ``metric``."""
+    stmt = select(*(getattr(Entry, field) for field in EXPORT_FIELDS)) \
+        .where(Entry.user_id == user_id, getattr(Entry, metric).isnot(None))
+    if date_from:
+        stmt = stmt.where(Entry.date >= date_from)
+    if date_to:
+        stmt = stmt.where(Entry.date < date_to + timedelta(days=1))
+    rows = db.session.execute(stmt.order_by(Entry.date, Entry.id)).all()
+    if not rows:
+        return []
+
+    date_index = EXPORT_FIELDS.index('date')
+    metric_index = EXPORT_FIELDS.index(metric)
+    x = [row[date_index].timestamp() for row in rows]
+    y = [row[metric_index] for row in rows]
+
+    result = []
+    for i in largest_triangle_three_buckets(x, y, points):
+        entry_dict = dict(zip(EXPORT_FIELDS, rows[i]))
+        entry_dict['date'] = entry_dict['date'].strftime('%Y-%m-%d')
+        result.append(entry_dict)
+    return result
+
+
+def _series_buckets(series, bucket_name, start, stop):
+    """Bucket start day (days since the epoch) of each entry, matching AGGREGATE_BUCKETS."""
+    dates = series.dates[start:stop]
+    if bucket_name == 'month':
+        return dates.astype('datetime64[us]').astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    days = dates // 86_400_000_000
+    if bucket_name == 'week':
+        # The epoch was a Thursday; step back to the Monday of each week
+        days = days - (days + 3) % 7
+    return days
+
+
+def _aggregate_series_buckets(series, bucket_name, date_from, date_to):
+    """_aggregate_buckets computed from a user's entry series instead of SQL."""
+    start, stop = series.date_range(date_from, date_to)
+    if start >= stop:
+        return []
+    days = _series_buckets(series, bucket_name, start, stop)
+    # Entries are sorted by date, so each bucket is a contiguous run
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    ends = np.r_[starts[1:], len(days)]
+
+    result = [{'date': date, 'count': count} for date, count in zip(
+        np.datetime_as_string(days[starts].astype('datetime64[D]')).tolist(), (ends - starts).tolist())]
+    for metric in AGGREGATE_METRICS:
+        values = series.values[SERIES_FIELDS.index(metric), start:stop]
+        present = ~np.isnan(values)
+        counts = np.add.reduceat(present, starts)
+        sums = np.add.reduceat(np.where(present, values, 0.0), starts)
+        with np.errstate(invalid='ignore'):
+            means = sums / counts
+        stats = zip(means.tolist(), np.fmin.reduceat(values, starts).tolist(),
+                    np.fmax.reduceat(values, starts).tolist(), values[ends - 1].tolist())
+        for bucket_dict, stat in zip(result, stats):
+            mean, minimum, maximum, last = (None if value != value else value for value in stat)
+            bucket_dict[metric] = {'mean': mean, 'min': minimum, 'max': maximum, 'last': last}
+    return result
+
+
+def _downsample_series(series, metric, points, date_from, date_to):
+    """_downsample_entries computed from a user's entry series instead of SQL."""
+    start, stop = series.date_range(date_from, date_to)
+    values = series.values[SERIES_FIELDS.index(metric), start:stop]
+    indices = np.flatnonzero(~np.isnan(values)) + start
+    if not len(indices):
+        return []
+    x = series.dates[indices] / 1e6
+    chosen = largest_triangle_three_buckets(x, series.values[SERIES_FIELDS.index(metric), indices], points)
+    return series.to_dicts(indices[chosen])
+
+
+@entries_bp.route('/user/<int:user_id>/aggregate', methods=['GET'])
+@conditional_user_response
+def aggregate_user_entries(user_id):
+    """
+    Chart-ready summary of a user's history.
+
+    ``mode=bucket`` (default) groups entries by ``bucket`` (day, week or month)
+    and returns mean/min/max/last of weight, fat percentage and muscle mass per
+    bucket.  ``mode=lttb`` instead returns at most ``points`` raw entries chosen
+    by Largest-Triangle-Three-Buckets downsampling on ``metric`` (default weight).
+    Both modes honour the ``from``/``to`` date filters.
+    """
+    try:
+        date_from = _parse_date_arg('from')
+        date_to = _parse_date_arg('to')
+        mode = request.args.get('mode', 'bucket')
+
+        if mode == 'bucket':
+            bucket_name = request.args.get('bucket', 'week')
+            if bucket_name not in AGGREGATE_BUCKETS:
+                return jsonify({'error': 'Invalid bucket. Use day, week or month'}), 400
+            series = user_series(user_id)
+            if series is not None:
+                return jsonify(_aggregate_series_buckets(series, bucket_name, date_from, date_to))
+            return jsonify(_aggregate_buckets(user_id, bucket_name, date_from, date_to))
+
+        if mode == 'lttb':
+            metric = request.args.get('metric', 'weight')
+            if metric not in AGGREGATE_METRICS:
+                return jsonify({'error': 'Invalid metric. Use weight, fat_percentage or muscle_mass'}), 400
+            try:
+                points = int(request.args.get('points', DEFAULT_SERIES_POINTS))
+            except ValueError:
+                return jsonify({'error': 'points must be an integer'}), 400
+            if points < 3:
+                return jsonify({'error': 'points must be at least 3'}), 400
+            series = user_series(user_id)
+            if series is not None:
+                return jsonify(_downsample_series(series, metric, points, date_from, date_to))
+            return jsonify(_downsample_entries(user_id, metric, points, date_from, date_to))
+
+        return jsonify({'error': 'Invalid mode. Use bucket or lttb'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error("Error aggregating entries for user %s: %s", user_id, e)
+        return jsonify({'error': 'Failed to aggregate entries'}), 500
@@ -1,15 +1,18 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta
-from weight_tracker.models import db, Goal
-from weight_tracker.config import logger
-from sqlalchemy import text
+from weight_tracker.models import db, Goal, User, bump_data_version, written_values, mark_written, log_deletions
+from weight_tracker.config import logger, GOAL_BATCH_LIMIT
+from weight_tracker.cache import invalidate_user
+from weight_tracker.etags import conditional_user_response
+from sqlalchemy import insert, update
+from sqlalchemy.orm.attributes import set_committed_value
 
 goals_bp = Blueprint('goals', __name__, url_prefix='/api/goals')
 
 @goals_bp.route('', methods=['GET'])
 def get_goals():
     try:
-        logger.info("Processing GET request for goals")
+        logger.debug("Processing GET request for goals")
         goals = Goal.query.order_by(Goal.target_date).all()
         
         # Convert each goal to dict and ensure start_date is included
@@ -27,91 +30,202 @@ def get_goals():
                     
             result.append(goal_dict)
             
-        logger.debug(f"Retrieved {len(result)} goals")
+        logger.debug("Retrieved %s goals", len(result))
         return jsonify(result)
     except Exception as e:
-        logger.error(f"Error retrieving goals: {str(e)}")
+        logger.error("Error retrieving goals: %s", e)
         return jsonify({"error": "Failed to retrieve goals"}), 500
 
+# Goal columns set from request data
+GOAL_TARGET_FIELDS = ('target_weight', 'target_fat_percentage', 'target_muscle_mass')
+
+
+def _parse_goal_date(data, field):
+    try:
+        return datetime.strptime(data[field], '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid date format for {field}. Use YYYY-MM-DD')
+
+
+def parse_goal_data(data, partial=False) -> dict:
+    """
+    Validate submitted goal data and convert it to Goal column values.
+
+    For a new goal (``partial=False``) at least one target is required and the
+    target and start dates default to 30 days from now and now.  For an update
+    only the fields present in ``data`` are returned.  Raises ValueError with a
+    user-facing message if the data is invalid.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Goal must be an object')
+    values = {}
+
+    if partial:
+        for field in ('target_date', 'start_date'):
+            if field in data:
+                values[field] = _parse_goal_date(data, field)
+        for field in GOAL_TARGET_FIELDS:
+            if field in data:
+                try:
+                    values[field] = float(data[field]) if data[field] is not None else None
+                except (TypeError, ValueError):
+                    raise ValueError(f'Invalid number for {field}')
+        if 'description' in data:
+            values['description'] = data.get('description', None)
+        return values
+
+    # Validate required fields (at least one target must be set)
+    if not any(data.get(field) for field in GOAL_TARGET_FIELDS):
+        raise ValueError('At least one target (weight, fat percentage, or muscle mass) is required')
+
+    # Parse target date (if provided) or use default date (30 days from now)
+    now = datetime.now()
+    values['target_date'] = _parse_goal_date(data, 'target_date') if data.get('target_date') \
+        else now + timedelta(days=30)
+    # Parse start date (if provided) or use current date
+    values['start_date'] = _parse_goal_date(data, 'start_date') if data.get('start_date') else now
+
+    # Handle optional numeric fields
+    for field in GOAL_TARGET_FIELDS:
+        try:
+            values[field] = float(data.get(field)) if data.get(field) else None
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid number for {field}')
+    values['description'] = data.get('description')
+    try:
+        values['user_id'] = int(data['user_id'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('A valid user_id is required')
+    values['created_at'] = now
+    return values
+
+
+def _goal_id(data) -> int:
+    try:
+        return int(data['id'])
+    except (TypeError, ValueError):
+        raise ValueError('id must be an integer')
+
+
+def _insert_goals(rows) -> list:
+    """
+    Insert goals with INSERT ... RETURNING and return the new Goal objects in row order.
+
+    The caller is responsible for committing.
+    """
+    # Without sort_by_parameter_order SQLAlchemy batches the rows into one
+    # multi-row INSERT on SQLite; ids are assigned in row order, so sort by them
+    goals = sorted(db.session.scalars(insert(Goal).returning(Goal), rows), key=lambda goal: goal.id)
+    # SQLite's RETURNING skips column affinity, so a whole-number REAL such as
+    # 80.0 comes back as the int 80; restore the floats a SELECT would return
+    for goal in goals:
+        for field in GOAL_TARGET_FIELDS:
+            value = getattr(goal, field)
+            if value is not None:
+                set_committed_value(goal, field, float(value))
+    return goals
+
+
 @goals_bp.route('', methods=['POST'])
 def add_goal():
     try:
-        data = request.json
-        
-        # Validate required fields (at least one target must be set)
-        if not any([data.get('target_weight'), data.get('target_fat_percentage'), data.get('target_muscle_mass')]):
-            return jsonify({'error': 'At least one target (weight, fat percentage, or muscle mass) is required'}), 400
-        
-        # Parse target date (if provided) or use default date (30 days from now)
-        target_date_str = data.get('target_date')
-        if target_date_str:
-            try:
-                target_date = datetime.strptime(target_date_str, '%Y-%m-%d')
-            except ValueError:
-                return jsonify({'error': 'Invalid date format for target_date. Use YYYY-MM-DD'}), 400
-        else:
-            target_date = datetime.now() + timedelta(days=30)
-        
-        # Parse start date (if provided) or use current date
-        start_date_str = data.get('start_date')
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-            except ValueError:
-                return jsonify({'error': 'Invalid date format for start_date. Use YYYY-MM-DD'}), 400
-        else:
-            start_date = datetime.now()
-        
-        # Handle optional numeric fields
-        target_weight = float(data.get('target_weight')) if data.get('target_weight') else None
-        target_fat_percentage = float(data.get('target_fat_percentage')) if data.get('target_fat_percentage') else None
-        target_muscle_mass = float(data.get('target_muscle_mass')) if data.get('target_muscle_mass') else None
-        description = data.get('description')
-        user_id = data.get('user_id')
-        created_at = datetime.now()
-        
-        # Use raw SQL to insert the goal with all fields including start_date
-        insert_stmt = text("""
-            INSERT INTO goal (target_date, start_date, target_weight, target_fat_percentage, 
-                             target_muscle_mass, description, user_id, created_at)
-            VALUES (:target_date, :start_date, :target_weight, :target_fat_percentage,
-                   :target_muscle_mass, :description, :user_id, :created_at)
-        """)
-        
-        result = db.session.execute(insert_stmt, {
-            'target_date': target_date,
-            'start_date': start_date,
-            'target_weight': target_weight,
-            'target_fat_percentage': target_fat_percentage,
-            'target_muscle_mass': target_muscle_mass,
-            'description': description,
-            'user_id': user_id,
-            'created_at': created_at
-        })
+        try:
+            values = parse_goal_data(request.json)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # The version bump is a statement of its own (SQLite cannot update the
+        # user and insert the goal in one), but both run in one transaction
+        versions = bump_data_version(values['user_id'])
+        values.update(written_values(values['user_id'], versions))
+        # One INSERT returns the stored row, so nothing is re-read afterwards
+        created_goal = _insert_goals([values])[0]
+        result = created_goal.to_dict()
         db.session.commit()
-        
-        # Get the ID of the inserted row
-        goal_id = result.lastrowid
-        
-        # Retrieve the goal to return it
-        created_goal = Goal.query.get(goal_id)
-        
-        # Check if start_date is set, and if not, fix it
-        if created_goal.start_date is None:
-            logger.warning(f"start_date is NULL for goal {goal_id}, fixing...")
-            fix_stmt = text("UPDATE goal SET start_date = :start_date WHERE id = :id")
-            db.session.execute(fix_stmt, {'start_date': start_date, 'id': goal_id})
-            db.session.commit()
-            # Refresh the goal
-            created_goal = Goal.query.get(goal_id)
+        invalidate_user(created_goal.user_id)
         
         # Return the created goal
-        return jsonify(created_goal.to_dict()), 201
+        return jsonify(result), 201
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error adding goal: {e}")
+        logger.error("Error adding goal: %s", e)
         return jsonify({'error': 'Failed to add goal'}), 500
 
+@goals_bp.route('/batch', methods=['POST'])
+def save_goals_batch():
+    """
+    Create and update many goals in one transaction.
+
+    Accepts a JSON array of goals (or ``{"goals": [...]}``).  An item with an
+    ``id`` updates that goal with the fields it contains; any other item creates
+    a goal, for the user in ``user_id`` or for each user in ``user_ids`` (for
+    example to give a whole group the same target).  Nothing is written unless
+    every item is valid; errors are reported per item index.
+    """
+    try:
+        items = request.get_json(silent=True)
+        if isinstance(items, dict):
+            items = items.get('goals')
+        if not isinstance(items, list):
+            return jsonify({'error': 'Expected a JSON array of goals'}), 400
+        if len(items) > GOAL_BATCH_LIMIT:
+            return jsonify({'error': f'At most {GOAL_BATCH_LIMIT} goals per batch'}), 400
+
+        errors = []
+        creates = []
+        updates = {}
+        for index, data in enumerate(items):
+            try:
+                if isinstance(data, dict) and data.get('id') is not None:
+                    goal_id = _goal_id(data)
+                    if goal_id in updates:
+                        raise ValueError(f'Goal {goal_id} appears more than once in the batch')
+                    updates[goal_id] = (index, parse_goal_data(data, partial=True))
+                elif isinstance(data, dict) and isinstance(data.get('user_ids'), list):
+                    base = {key: value for key, value in data.items() if key != 'user_ids'}
+                    creates.extend((index, parse_goal_data(dict(base, user_id=user_id)))
+                                   for user_id in data['user_ids'])
+                else:
+                    creates.append((index, parse_goal_data(data)))
+            except (TypeError, ValueError) as e:
+                errors.append({'index': index, 'error': str(e)})
+
+        owners = dict(db.session.query(Goal.id, Goal.user_id).filter(Goal.id.in_(list(updates)))) if updates else {}
+        for goal_id, (index, _) in updates.items():
+            if goal_id not in owners:
+                errors.append({'index': index, 'error': f'Goal {goal_id} not found'})
+        new_user_ids = {values['user_id'] for _, values in creates}
+        known_users = {user_id for (user_id,) in db.session.query(User.id).filter(User.id.in_(new_user_ids))}
+        for index, values in creates:
+            if values['user_id'] not in known_users:
+                errors.append({'index': index, 'error': f"User {values['user_id']} not found"})
+
+        if errors:
+            errors.sort(key=lambda error: error['index'])
+            return jsonify({'error': 'Invalid goals', 'errors': errors}), 400
+
+        affected_users = new_user_ids | set(owners.values())
+        versions = bump_data_version(*affected_users)
+        now = datetime.utcnow()
+        created = _insert_goals([dict(values, **written_values(values['user_id'], versions, now))
+                                 for _, values in creates]) if creates else []
+        update_rows = [dict(values, id=goal_id, **written_values(owners[goal_id], versions, now))
+                       for goal_id, (_, values) in updates.items() if values]
+        if update_rows:
+            db.session.execute(update(Goal), update_rows)
+        updated = Goal.query.filter(Goal.id.in_(list(updates))).all() if updates else []
+        result = {'created': [goal.to_dict() for goal in created],
+                  'updated': [goal.to_dict() for goal in updated]}
+
+        db.session.commit()
+        invalidate_user(*affected_users)
+        logger.info("Saved goal batch: %s created, %s updated", len(created), len(updated))
+        return jsonify(result)
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Error saving goal batch: %s", e)
+        return jsonify({'error': 'Failed to save goals'}), 500
+
 @goals_bp.route('/<int:goal_id>', methods=['DELETE'])
 def delete_goal(goal_id):
     try:
@@ -119,54 +233,44 @@ def delete_goal(goal_id):
         if not goal:
             return jsonify({'error': 'Goal not found'}), 404
         
+        user_id = goal.user_id
         db.session.delete(goal)
+        versions = bump_data_version(user_id)
+        log_deletions('goal', [(goal_id, user_id)], versions)
         db.session.commit()
+        invalidate_user(user_id)
         return jsonify({'message': 'Goal deleted successfully'})
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error deleting goal: {e}")
+        logger.error("Error deleting goal: %s", e)
         return jsonify({'error': 'Failed to delete goal'}), 500
 
 @goals_bp.route('/<int:goal_id>', methods=['PUT'])
 def update_goal(goal_id):
     try:
         goal = Goal.query.get_or_404(goal_id)
-        data = request.json
-        
+        try:
+            values = parse_goal_data(request.json, partial=True)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
         # Update fields if they exist in the request
-        if 'target_date' in data:
-            try:
-                goal.target_date = datetime.strptime(data['target_date'], '%Y-%m-%d')
-            except ValueError:
-                return jsonify({'error': 'Invalid date format for target_date. Use YYYY-MM-DD'}), 400
-        
-        if 'start_date' in data:
-            try:
-                goal.start_date = datetime.strptime(data['start_date'], '%Y-%m-%d')
-            except ValueError:
-                return jsonify({'error': 'Invalid date format for start_date. Use YYYY-MM-DD'}), 400
-                
-        if 'target_weight' in data:
-            goal.target_weight = float(data['target_weight']) if data['target_weight'] is not None else None
-            
-        if 'target_fat_percentage' in data:
-            goal.target_fat_percentage = float(data['target_fat_percentage']) if data['target_fat_percentage'] is not None else None
-            
-        if 'target_muscle_mass' in data:
-            goal.target_muscle_mass = float(data['target_muscle_mass']) if data['target_muscle_mass'] is not None else None
-            
-        if 'description' in data:
-            goal.description = data.get('description', None)
+        for field, value in values.items():
+            setattr(goal, field, value)
             
+        result = goal.to_dict()
+        mark_written(goal, bump_data_version(goal.user_id))
         db.session.commit()
+        invalidate_user(goal.user_id)
         
-        return jsonify(goal.to_dict())
+        return jsonify(result)
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error updating goal: {e}")
+        logger.error("Error updating goal: %s", e)
         return jsonify({'error': 'Failed to update goal'}), 500
 
 @goals_bp.route('/user/<int:user_id>', methods=['GET'])
+@conditional_user_response
 def get_user_goals(user_id):
     try:
         goals = Goal.query.filter_by(user_id=user_id).order_by(Goal.target_date.desc()).all()
@@ -188,7 +292,7 @@ def get_user_goals(user_id):
         
         return jsonify(result)
     except Exception as e:
-        logger.error(f"Error fetching goals for user {user_id}: {e}")
+        logger.error("Error fetching goals for user %s: %s", user_id, e)
         return jsonify({'error': 'Failed to fetch goals'}), 500
 
 @goals_bp.route('/<int:goal_id>', methods=['GET'])
@@ -207,5 +311,5 @@ def get_goal(goal_id):
         
         return jsonify(goal_dict)
     except Exception as e:
-        logger.error(f"Error fetching goal {goal_id}: {e}")
+        logger.error("Error fetching goal %s: %s", goal_id, e)
         return jsonify({'error': 'Failed to fetch goal'}), 500
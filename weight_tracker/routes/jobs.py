@@ -0,0 +1,44 @@
+import os
+
+from flask import Blueprint, jsonify, send_file
+
+from weight_tracker.models import db, Job
+from weight_tracker.config import logger, JOB_OUTPUT_DIR
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status of a background job, with its result once it has finished."""
+    try:
+        job = db.session.get(Job, job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        result = job.to_dict()
+        if job.status == 'succeeded' and isinstance(job.result, dict) and job.result.get('file'):
+            result['download_url'] = f'/api/jobs/{job.id}/download'
+        return jsonify(result)
+    except Exception as e:
+        logger.error("Error fetching job %s: %s", job_id, e)
+        return jsonify({'error': 'Failed to fetch job'}), 500
+
+
+@jobs_bp.route('/<int:job_id>/download', methods=['GET'])
+def download_job_output(job_id):
+    """The file written by a finished job, such as a background export."""
+    try:
+        job = db.session.get(Job, job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        if job.status != 'succeeded' or not isinstance(job.result, dict) or not job.result.get('file'):
+            return jsonify({'error': 'Job has no output to download'}), 409
+
+        path = os.path.join(JOB_OUTPUT_DIR, job.result['file'])
+        if not os.path.isfile(path):
+            return jsonify({'error': 'Job output no longer exists'}), 410
+        return send_file(path, mimetype=job.result.get('mimetype'), as_attachment=True,
+                         download_name=job.result.get('filename'))
+    except Exception as e:
+        logger.error("Error downloading output of job %s: %s", job_id, e)
+        return jsonify({'error': 'Failed to download job output'}), 500
@@ -1,169 +1,264 @@
-from flask import Blueprint, jsonify
-from weight_tracker.models import Entry, Goal, User
+from datetime import datetime
+from flask import Blueprint, g, jsonify
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+from weight_tracker.models import db, Entry, Goal, User, load_user_profiles
 from weight_tracker.config import logger
-from weight_tracker.utils import infer_belly_circumference
+from weight_tracker.cache import progress_cache
+from weight_tracker.etags import conditional_user_response
+from weight_tracker.trends import TREND_METRICS, load_trends, project
+from weight_tracker.timeseries import user_series
+from weight_tracker.utils import infer_belly_circumference_array
+from weight_tracker.lazy import lazy_import
+
+np = lazy_import('numpy')
 
 progress_bp = Blueprint('progress', __name__, url_prefix='/api/progress')
 
+
+def _latest_entries(user_id=None):
+    """
+    Return ``{user_id: Entry}`` with each user's most recent entry.
+
+    A single windowed query ranks every user's entries by date and keeps the
+    first, rather than issuing one query per user.
+    """
+    ranked = select(
+        Entry,
+        func.row_number().over(partition_by=Entry.user_id,
+                               order_by=(Entry.date.desc(), Entry.id.desc())).label('rank')
+    )
+    if user_id is not None:
+        ranked = ranked.where(Entry.user_id == user_id)
+    ranked = ranked.subquery()
+    latest = aliased(Entry, ranked)
+    entries = db.session.scalars(select(latest).where(ranked.c.rank == 1))
+    return {entry.user_id: entry for entry in entries}
+
+
+def _as_floats(values):
+    """Float array with NaN for missing values."""
+    return np.array(values, dtype=float)
+
+
+def _present(values):
+    """Mask of values the original per-goal code treated as set (non-missing, non-zero)."""
+    return ~np.isnan(values) & (values != 0)
+
+
+def _change_needed(targets, currents, days_remaining):
+    """Daily and weekly change needed per goal, as lists with None where a value is missing."""
+    missing = ~(_present(targets) & _present(currents))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        difference = targets - currents
+        daily = np.ma.masked_array(difference / days_remaining, mask=missing)
+        weekly = np.ma.masked_array(difference / (days_remaining / 7), mask=missing)
+    return daily.tolist(), weekly.tolist()
+
+
+def _trend_fields(summary, metric, target):
+    """Trend statistics and the projected date of reaching ``target`` for one metric block."""
+    if summary is None:
+        return {'trend_value': None, 'ewma': None, 'rolling_average': None,
+                'weekly_trend': None, 'projected_date': None}
+    projected = project(summary, metric, target) if target else None
+    slope = summary['slope_per_day']
+    return {
+        'trend_value': summary['trend_value'],
+        'ewma': summary['ewma'],
+        'rolling_average': summary['rolling_average'],
+        'weekly_trend': slope * 7 if slope is not None else None,
+        'projected_date': projected.strftime('%Y-%m-%d') if projected else None
+    }
+
+
+def _goal_projection(goal, trends):
+    """
+    Projected date a goal is met and whether that is on or before its target date.
+
+    A goal is met when every metric it targets is; the projection is None when
+    any of them is not trending towards its target, and ``on_track`` is None
+    when there is no trend data to judge by.
+    """
+    targets = {'weight': goal.target_weight, 'fat_percentage': goal.target_fat_percentage,
+               'muscle_mass': goal.target_muscle_mass}
+    targets = {metric: target for metric, target in targets.items() if target}
+    summaries = {metric: trends.get((goal.user_id, metric)) for metric in targets}
+    if not targets or any(summary is None for summary in summaries.values()):
+        return None, None
+
+    projections = [project(summaries[metric], metric, target) for metric, target in targets.items()]
+    if any(projection is None for projection in projections):
+        return None, False
+    projected = max(projections)
+    return projected.strftime('%Y-%m-%d'), projected <= goal.target_date
+
+
+def _compute_progress(goals, latest_entries, profiles, trends=None):
+    """
+    Compute progress for many goals at once.
+
+    ``latest_entries`` maps user id to that user's latest Entry and ``profiles``
+    maps user id to ``(height, sex)``.  Day counts, required changes and inferred
+    belly circumferences are computed for all goals together; goals whose owner
+    has no entries, or whose target date is not after the latest entry, are skipped.
+    ``trends`` is load_trends() for the goals' owners and supplies the trend
+    fields and projected dates without reading the entry history.
+    """
+    trends = trends or {}
+    goals = [goal for goal in goals if goal.user_id in latest_entries]
+    if not goals:
+        return []
+    latest = [latest_entries[goal.user_id] for goal in goals]
+    goal_profiles = [profiles.get(goal.user_id, (None, None)) for goal in goals]
+
+    # Day counts, floored like timedelta.days
+    one_day = np.timedelta64(1, 'D')
+    entry_dates = np.array([entry.date for entry in latest], dtype='datetime64[us]')
+    target_dates = np.array([goal.target_date for goal in goals], dtype='datetime64[us]')
+    # Use start_date if available, otherwise use latest entry date
+    start_dates = np.array([goal.start_date if goal.start_date else entry.date
+                            for goal, entry in zip(goals, latest)], dtype='datetime64[us]')
+    total_days = (target_dates - start_dates) // one_day
+    days_elapsed = (entry_dates - start_dates) // one_day
+    days_remaining = (target_dates - entry_dates) // one_day
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        progress_percentages = (days_elapsed / total_days * 100).tolist()
+
+    current_weights = _as_floats([entry.weight for entry in latest])
+    current_fats = _as_floats([entry.fat_percentage for entry in latest])
+    current_muscles = _as_floats([entry.muscle_mass for entry in latest])
+    target_weights = _as_floats([goal.target_weight for goal in goals])
+    target_fats = _as_floats([goal.target_fat_percentage for goal in goals])
+    target_muscles = _as_floats([goal.target_muscle_mass for goal in goals])
+
+    weight_daily, weight_weekly = _change_needed(target_weights, current_weights, days_remaining)
+    fat_daily, fat_weekly = _change_needed(target_fats, current_fats, days_remaining)
+    muscle_daily, muscle_weekly = _change_needed(target_muscles, current_muscles, days_remaining)
+
+    # Belly circumference that corresponds to the current and target fat percentage
+    necks = [entry.neck for entry in latest]
+    hips = [entry.hip for entry in latest]
+    heights = [height for height, _ in goal_profiles]
+    sexes = [sex for _, sex in goal_profiles]
+    current_inferred_bellies = infer_belly_circumference_array(
+        current_fats, necks, heights, sexes, hips).tolist()
+    target_inferred_bellies = infer_belly_circumference_array(
+        target_fats, necks, heights, sexes, hips).tolist()
+
+    results = []
+    for i, (goal, entry) in enumerate(zip(goals, latest)):
+        if days_remaining[i] <= 0:
+            # Goal date has passed
+            logger.debug("Skipping goal ID %s as target date has passed", goal.id)
+            continue
+
+        user_trends = {metric: trends.get((goal.user_id, metric)) for metric in TREND_METRICS}
+        projected_date, on_track = _goal_projection(goal, trends)
+        results.append({
+            'goal_id': goal.id,
+            'user_id': goal.user_id,
+            'target_date': goal.target_date.strftime('%Y-%m-%d'),
+            'start_date': goal.start_date.strftime('%Y-%m-%d') if goal.start_date else None,
+            'days_remaining': int(days_remaining[i]),
+            'days_elapsed': int(days_elapsed[i]),
+            'total_days': int(total_days[i]),
+            'progress_percentage': progress_percentages[i] if total_days[i] > 0 else 0,
+            'projected_date': projected_date,
+            'on_track': on_track,
+            'weight': {
+                'current': entry.weight,
+                'target': goal.target_weight,
+                'daily_change_needed': weight_daily[i],
+                'weekly_change_needed': weight_weekly[i],
+                **_trend_fields(user_trends['weight'], 'weight', goal.target_weight)
+            },
+            'fat_percentage': {
+                'current': entry.fat_percentage,
+                'target': goal.target_fat_percentage,
+                'daily_change_needed': fat_daily[i],
+                'weekly_change_needed': fat_weekly[i],
+                'current_inferred_belly': current_inferred_bellies[i],
+                'target_inferred_belly': target_inferred_bellies[i],
+                **_trend_fields(user_trends['fat_percentage'], 'fat_percentage', goal.target_fat_percentage)
+            },
+            'muscle_mass': {
+                'current': entry.muscle_mass,
+                'target': goal.target_muscle_mass,
+                'daily_change_needed': muscle_daily[i],
+                'weekly_change_needed': muscle_weekly[i],
+                **_trend_fields(user_trends['muscle_mass'], 'muscle_mass', goal.target_muscle_mass)
+            }
+        })
+
+    return results
+
+
 @progress_bp.route('', methods=['GET'])
 def get_progress():
+    """Progress of every user's active goals, each measured against that user's latest entry."""
     try:
-        logger.info("Processing GET request for progress")
-        # Get the latest entry and goal
-        latest_entry = Entry.query.order_by(Entry.date.desc()).first()
-        goals = Goal.query.order_by(Goal.target_date).all()
-        
-        if not latest_entry or not goals:
+        logger.debug("Processing GET request for progress")
+        latest_entries = _latest_entries()
+        goals = Goal.query.filter(Goal.target_date > datetime.now()) \
+            .order_by(Goal.user_id, Goal.target_date).all()
+
+        if not latest_entries or not goals:
             logger.warning("Cannot calculate progress: missing entries or goals")
             return jsonify({'error': 'Need at least one entry and one goal to calculate progress'}), 400
-        
-        # Convert latest entry to dict to get calculated values
-        latest_entry_dict = latest_entry.to_dict()
-        latest_fat_percentage = latest_entry_dict.get('fat_percentage')
-        latest_muscle_mass = latest_entry_dict.get('muscle_mass')
-        
-        results = []
-        
-        for goal in goals:
-            # Use start_date if available, otherwise use latest entry date
-            start_date = goal.start_date if goal.start_date else latest_entry.date
-            
-            # Calculate days between start date, current date, and target date
-            total_days = (goal.target_date - start_date).days
-            days_elapsed = (latest_entry.date - start_date).days
-            days_remaining = (goal.target_date - latest_entry.date).days
-            
-            if days_remaining <= 0:
-                # Goal date has passed
-                logger.debug(f"Skipping goal ID {goal.id} as target date has passed")
-                continue
-            
-            # Calculate progress percentage
-            progress_percentage = (days_elapsed / total_days * 100) if total_days > 0 else 0
-            
-            result = {
-                'goal_id': goal.id,
-                'target_date': goal.target_date.strftime('%Y-%m-%d'),
-                'start_date': goal.start_date.strftime('%Y-%m-%d') if goal.start_date else None,
-                'days_remaining': days_remaining,
-                'days_elapsed': days_elapsed,
-                'total_days': total_days,
-                'progress_percentage': progress_percentage,
-                'weight': {
-                    'current': latest_entry.weight,
-                    'target': goal.target_weight,
-                    'daily_change_needed': (goal.target_weight - latest_entry.weight) / days_remaining if goal.target_weight else None,
-                    'weekly_change_needed': (goal.target_weight - latest_entry.weight) / (days_remaining / 7) if goal.target_weight else None
-                },
-                'fat_percentage': {
-                    'current': latest_fat_percentage,
-                    'target': goal.target_fat_percentage,
-                    'daily_change_needed': (goal.target_fat_percentage - latest_fat_percentage) / days_remaining if goal.target_fat_percentage and latest_fat_percentage else None,
-                    'weekly_change_needed': (goal.target_fat_percentage - latest_fat_percentage) / (days_remaining / 7) if goal.target_fat_percentage and latest_fat_percentage else None
-                },
-                'muscle_mass': {
-                    'current': latest_muscle_mass,
-                    'target': goal.target_muscle_mass,
-                    'daily_change_needed': (goal.target_muscle_mass - latest_muscle_mass) / days_remaining if goal.target_muscle_mass and latest_muscle_mass else None,
-                    'weekly_change_needed': (goal.target_muscle_mass - latest_muscle_mass) / (days_remaining / 7) if goal.target_muscle_mass and latest_muscle_mass else None
-                }
-            }
-            
-            results.append(result)
-        
-        logger.debug(f"Calculated progress for {len(results)} goals")
+
+        profiles = load_user_profiles(goal.user_id for goal in goals)
+        trends = load_trends(goal.user_id for goal in goals)
+        results = _compute_progress(goals, latest_entries, profiles, trends)
+
+        logger.debug("Calculated progress for %s goals", len(results))
         return jsonify(results)
     except Exception as e:
-        logger.error(f"Error calculating progress: {str(e)}")
+        logger.error("Error calculating progress: %s", e)
         return jsonify({"error": "Failed to calculate progress"}), 500
 
+
+def _compute_user_progress(user_id):
+    """Build the progress results for every upcoming goal of a user."""
+    # Get the latest entry and goals for this user
+    series = user_series(user_id)
+    if series is None:
+        latest_entries = _latest_entries(user_id)
+    else:
+        latest_entries = {user_id: series.row(len(series) - 1)} if len(series) else {}
+    goals = Goal.query.filter_by(user_id=user_id).order_by(Goal.target_date).all()
+    user = User.query.get(user_id)
+
+    if not latest_entries or not goals or not user:
+        logger.warning("Cannot calculate progress for user %s: missing entries, goals, or user data", user_id)
+        return []
+
+    results = _compute_progress(goals, latest_entries, {user.id: (user.height, user.sex)},
+                                load_trends([user_id]))
+
+    logger.debug("Calculated progress for %s goals for user %s", len(results), user_id)
+    return results
+
+
 @progress_bp.route('/user/<int:user_id>', methods=['GET'])
+@conditional_user_response
 def get_user_progress(user_id):
     try:
-        logger.info(f"Processing GET request for progress for user {user_id}")
-        # Get the latest entry and goals for this user
-        latest_entry = Entry.query.filter_by(user_id=user_id).order_by(Entry.date.desc()).first()
-        goals = Goal.query.filter_by(user_id=user_id).order_by(Goal.target_date).all()
-        user = User.query.get(user_id)
-
-        if not latest_entry or not goals or not user:
-            logger.warning(f"Cannot calculate progress for user {user_id}: missing entries, goals, or user data")
-            return jsonify([])
-
-        # Convert latest entry to dict to get calculated values
-        latest_entry_dict = latest_entry.to_dict()
-        latest_fat_percentage = latest_entry_dict.get('fat_percentage')
-        latest_muscle_mass = latest_entry_dict.get('muscle_mass')
-        latest_neck = latest_entry.neck
-        latest_hip = latest_entry.hip # Will be None if not applicable or entered
-        user_height = user.height
-        user_gender = user.sex
-
-        results = []
-        
-        for goal in goals:
-            # Use start_date if available, otherwise use latest entry date
-            start_date = goal.start_date if goal.start_date else latest_entry.date
-            
-            # Calculate days between start date, current date, and target date
-            total_days = (goal.target_date - start_date).days
-            days_elapsed = (latest_entry.date - start_date).days
-            days_remaining = (goal.target_date - latest_entry.date).days
-            
-            if days_remaining <= 0:
-                # Goal date has passed
-                logger.debug(f"Skipping goal ID {goal.id} as target date has passed")
-                continue
-            
-            # Calculate progress percentage
-            progress_percentage = (days_elapsed / total_days * 100) if total_days > 0 else 0
-            
-            result = {
-                'goal_id': goal.id,
-                'target_date': goal.target_date.strftime('%Y-%m-%d'),
-                'start_date': goal.start_date.strftime('%Y-%m-%d') if goal.start_date else None,
-                'days_remaining': days_remaining,
-                'days_elapsed': days_elapsed,
-                'total_days': total_days,
-                'progress_percentage': progress_percentage,
-                'weight': {
-                    'current': latest_entry.weight,
-                    'target': goal.target_weight,
-                    'daily_change_needed': (goal.target_weight - latest_entry.weight) / days_remaining if goal.target_weight else None,
-                    'weekly_change_needed': (goal.target_weight - latest_entry.weight) / (days_remaining / 7) if goal.target_weight else None
-                },
-                'fat_percentage': {
-                    'current': latest_fat_percentage,
-                    'target': goal.target_fat_percentage,
-                    'daily_change_needed': (goal.target_fat_percentage - latest_fat_percentage) / days_remaining if goal.target_fat_percentage and latest_fat_percentage else None,
-                    'weekly_change_needed': (goal.target_fat_percentage - latest_fat_percentage) / (days_remaining / 7) if goal.target_fat_percentage and latest_fat_percentage else None,
-                    'current_inferred_belly': infer_belly_circumference(
-                        fat_percentage=latest_fat_percentage, 
-                        neck=latest_neck, 
-                        height=user_height, 
-                        gender=user_gender, 
-                        hip=latest_hip
-                    ) if latest_fat_percentage and latest_neck and user_height else None,
-                    'target_inferred_belly': infer_belly_circumference(
-                        fat_percentage=goal.target_fat_percentage, 
-                        neck=latest_neck, 
-                        height=user_height, 
-                        gender=user_gender, 
-                        hip=latest_hip
-                    ) if goal.target_fat_percentage and latest_neck and user_height else None
-                },
-                'muscle_mass': {
-                    'current': latest_muscle_mass,
-                    'target': goal.target_muscle_mass,
-                    'daily_change_needed': (goal.target_muscle_mass - latest_muscle_mass) / days_remaining if goal.target_muscle_mass and latest_muscle_mass else None,
-                    'weekly_change_needed': (goal.target_muscle_mass - latest_muscle_mass) / (days_remaining / 7) if goal.target_muscle_mass and latest_muscle_mass else None
-                }
-            }
-            
-            results.append(result)
-        
-        logger.debug(f"Calculated progress for {len(results)} goals for user {user_id}")
+        logger.debug("Processing GET request for progress for user %s", user_id)
+        # Results are tagged with the user's data version, so a write handled
+        # by another worker is never served from this worker's cache
+        version = g.get('user_data_versions', {}).get(user_id)
+        cached = progress_cache.get(user_id, version=version) if version is not None else None
+        if cached is not None:
+            return jsonify(cached)
+
+        # Inputs rarely change between polls; write routes invalidate the entry
+        generation = progress_cache.generation()
+        results = _compute_user_progress(user_id)
+        if version is not None:
+            progress_cache.set(user_id, results, generation, version=version)
         return jsonify(results)
     except Exception as e:
-        logger.error(f"Error calculating progress for user {user_id}: {str(e)}")
+        logger.error("Error calculating progress for user %s: %s", user_id, e)
         return jsonify({"error": "Failed to calculate progress"}), 500
@@ -0,0 +1,104 @@
+from datetime import datetime
+
+from flask import Blueprint, g, jsonify, request
+
+from weight_tracker.models import db, DeletionLog, Entry, Goal, User, serialize_entries
+from weight_tracker.config import logger
+from weight_tracker.etags import conditional_user_response
+
+sync_bp = Blueprint('sync', __name__, url_prefix='/api/sync')
+
+
+def _parse_since_time():
+    value = request.args.get('since_time')
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        raise ValueError('since_time must be an ISO 8601 timestamp')
+
+
+def _changed(model, user_id, since, since_time):
+    """Rows of ``model`` owned by ``user_id`` written after version ``since`` (and ``since_time`` if given)."""
+    query = model.query.filter(model.user_id == user_id)
+    if since:
+        query = query.filter(model.version > since)
+    if since_time is not None:
+        query = query.filter(model.updated_at > since_time)
+    return query
+
+
+def _tombstones(user_id, since, since_time, live_ids):
+    """Ids of deleted entries and goals, leaving out any that the user owns again."""
+    deleted = {'entries': [], 'goals': []}
+    if not since and since_time is None:
+        # A full snapshot replaces everything the client holds
+        return deleted
+    query = db.session.query(DeletionLog.kind, DeletionLog.object_id).filter(DeletionLog.user_id == user_id)
+    if since:
+        query = query.filter(DeletionLog.version > since)
+    if since_time is not None:
+        query = query.filter(DeletionLog.deleted_at > since_time)
+    seen = set()
+    for kind, object_id in query.order_by(DeletionLog.id):
+        key = 'entries' if kind == 'entry' else 'goals'
+        if object_id not in live_ids[key] and (key, object_id) not in seen:
+            seen.add((key, object_id))
+            deleted[key].append(object_id)
+    return deleted
+
+
+@sync_bp.route('/user/<int:user_id>', methods=['GET'])
+@conditional_user_response
+def get_changes(user_id):
+    """
+    Entries, goals and profile of a user changed since a client's last sync.
+
+    ``since`` is the ``version`` returned by the previous call (0 or absent for
+    a full snapshot); ``since_time`` optionally limits the result to rows
+    written after an ISO 8601 timestamp instead.  Changed rows are returned in
+    full and deletions as ids under ``deleted``; ``profile`` is None when the
+    profile has not changed.  Store the returned ``version`` for the next call.
+    """
+    try:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return jsonify({'error': 'User not found'}), 404
+        version = g.get('user_data_versions', {}).get(user_id, user.data_version)
+
+        since = request.args.get('since', 0, type=int)
+        try:
+            since_time = _parse_since_time()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if since < 0:
+            return jsonify({'error': 'since must not be negative'}), 400
+        if since > version:
+            # The client's cursor comes from another database or a deleted user
+            return jsonify({'error': 'since is ahead of the current version; resync from 0',
+                            'version': version}), 409
+
+        logger.debug("Processing sync request for user %s since version %s", user_id, since)
+        entries = _changed(Entry, user_id, since, since_time).order_by(Entry.date.desc(), Entry.id.desc()).all()
+        goals = _changed(Goal, user_id, since, since_time).order_by(Goal.target_date.desc()).all()
+        live_ids = {'entries': {entry.id for entry in entries}, 'goals': {goal.id for goal in goals}}
+
+        profile_changed = user.profile_version > since if since else True
+        if since_time is not None and user.updated_at is not None:
+            profile_changed = profile_changed and user.updated_at > since_time
+
+        result = {
+            'user_id': user_id,
+            'version': version,
+            'since': since,
+            'profile': user.to_dict() if profile_changed else None,
+            'entries': serialize_entries(entries),
+            'goals': [goal.to_dict() for goal in goals],
+            'deleted': _tombstones(user_id, since, since_time, live_ids)
+        }
+        logger.debug("Sync for user %s: %s entries, %s goals changed", user_id, len(entries), len(goals))
+        return jsonify(result)
+    except Exception as e:
+        logger.error("Error building changes for user %s: %s", user_id, e)
+        return jsonify({'error': 'Failed to fetch changes'}), 500
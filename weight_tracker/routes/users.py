@@ -1,6 +1,15 @@
-from flask import Blueprint, request, jsonify
-from weight_tracker.models import db, User, Entry, Goal
-from weight_tracker.config import logger
+from flask import Blueprint, request, jsonify, session
+from datetime import datetime
+from sqlalchemy import bindparam, update
+from weight_tracker.models import (db, User, Entry, Goal, recompute_entry_metrics, bump_data_version,
+                                   written_values, TrendState, DeletionLog)
+from weight_tracker.config import logger, PROFILE_RECOMPUTE_SYNC_MAX_ENTRIES
+from weight_tracker.utils import calculate_body_fat_percentage_array, calculate_muscle_mass_array
+from weight_tracker.cache import invalidate_user, invalidate_profile, get_user_profile
+from weight_tracker.etags import conditional_profile_response
+from weight_tracker.security import store_session_profile
+from weight_tracker.trends import rebuild_trends
+from weight_tracker.jobs import job_handler, enqueue_job, accepted_response, wants_background
 
 users_bp = Blueprint('users', __name__, url_prefix='/api/users')
 
@@ -10,7 +19,7 @@ def get_users():
         users = User.query.order_by(User.name).all()
         return jsonify([user.to_dict() for user in users])
     except Exception as e:
-        logger.error(f"Error fetching users: {e}")
+        logger.error("Error fetching users: %s", e)
         return jsonify({'error': 'Failed to fetch users'}), 500
 
 @users_bp.route('', methods=['POST'])
@@ -36,19 +45,20 @@ def add_user():
         return jsonify(new_user.to_dict()), 201
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error adding user: {e}")
+        logger.error("Error adding user: %s", e)
         return jsonify({'error': 'Failed to add user'}), 500
 
 @users_bp.route('/<int:user_id>', methods=['GET'])
+@conditional_profile_response
 def get_user(user_id):
     try:
-        user = User.query.get(user_id)
-        if not user:
+        profile = get_user_profile(user_id)
+        if not profile:
             return jsonify({'error': 'User not found'}), 404
         
-        return jsonify(user.to_dict())
+        return jsonify(profile)
     except Exception as e:
-        logger.error(f"Error fetching user: {e}")
+        logger.error("Error fetching user: %s", e)
         return jsonify({'error': 'Failed to fetch user'}), 500
 
 @users_bp.route('/<int:user_id>', methods=['PUT'])
@@ -59,22 +69,47 @@ def update_user(user_id):
             return jsonify({'error': 'User not found'}), 404
             
         data = request.json
-        
+        profile_before = [user.height, user.sex]
+        profile_after = [data.get('height', user.height), data.get('sex', user.sex)]
+        # Stored fat percentage and muscle mass depend on height and sex, so a
+        # change to either rewrites every entry.  With ?background=true and a
+        # long history a job does that and only then applies the change; until
+        # it has, the old height and sex stay in effect so entries and profile
+        # never disagree.
+        profile_changed = profile_after != profile_before
+        deferred = profile_changed and wants_background() and \
+            Entry.query.filter_by(user_id=user_id).count() > PROFILE_RECOMPUTE_SYNC_MAX_ENTRIES
+
         # Update user fields if provided
         if 'name' in data:
             user.name = data['name']
         if 'age' in data:
             user.age = data['age']
-        if 'sex' in data:
-            user.sex = data['sex']
-        if 'height' in data:
-            user.height = data['height']
-            
+        if not deferred:
+            user.height, user.sex = profile_after
+
+        user.profile_version = bump_data_version(user.id)[user.id]
+        user.updated_at = datetime.utcnow()
+        if profile_changed and not deferred:
+            recompute_entry_metrics(user_id=user_id)
+            rebuild_trends([user_id])
+        result = user.to_dict()
         db.session.commit()
-        return jsonify(user.to_dict())
+        invalidate_user(user_id)
+        invalidate_profile(user_id)
+        if session.get('user_id') == user_id:
+            # Keep this session's profile snapshot current
+            store_session_profile(result)
+
+        if deferred:
+            job = enqueue_job('apply_profile', {'user_id': user_id, 'height': profile_after[0],
+                                                'sex': profile_after[1], 'previous': profile_before},
+                              user_id=user_id)
+            return accepted_response(job, user=result)
+        return jsonify(result)
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error updating user: {e}")
+        logger.error("Error updating user: %s", e)
         return jsonify({'error': 'Failed to update user'}), 500
 
 @users_bp.route('/<int:user_id>', methods=['DELETE'])
@@ -84,14 +119,123 @@ def delete_user(user_id):
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Delete user's entries and goals
-        Entry.query.filter_by(user_id=user_id).delete()
-        Goal.query.filter_by(user_id=user_id).delete()
-        
-        db.session.delete(user)
-        db.session.commit()
+        if wants_background():
+            # The user's entries and goals are deleted in the background
+            job = enqueue_job('delete_user', {'user_id': user_id}, user_id=user_id)
+            return accepted_response(job, message='User deletion queued')
+
+        _delete_user(user)
         return jsonify({'message': 'User and associated data deleted successfully'})
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error deleting user: {e}")
+        logger.error("Error deleting user: %s", e)
         return jsonify({'error': 'Failed to delete user'}), 500
+
+
+@job_handler('recompute_metrics')
+def recompute_metrics_job(job):
+    """Recompute a user's stored derived metrics and trends (jobs queued before apply_profile existed)."""
+    user_id = job.params['user_id']
+    count = recompute_entry_metrics(user_id=user_id)
+    rebuild_trends([user_id])
+    db.session.commit()
+    invalidate_user(user_id)
+    logger.info("Recomputed derived metrics for %s entries of user %s", count, user_id)
+    return {'entries_updated': count}
+
+
+def _entry_metrics(query, height, sex) -> list:
+    """``(id, version, fat_percentage, muscle_mass)`` of the entries of ``query`` for the given profile."""
+    rows = query.with_entities(Entry.id, Entry.version, Entry.weight, Entry.neck, Entry.belly, Entry.hip).all()
+    if not rows:
+        return []
+    ids, versions, weights, necks, bellies, hips = zip(*rows)
+    fat_percentages = calculate_body_fat_percentage_array(weights, necks, bellies, height, sex, hips)
+    muscle_masses = calculate_muscle_mass_array(weights, fat_percentages)
+    return list(zip(ids, versions, fat_percentages.tolist(), muscle_masses.tolist()))
+
+
+@job_handler('apply_profile')
+def apply_profile_job(job):
+    """
+    Change a user's height and sex together with the derived metrics of their entries.
+
+    The metrics are computed first, outside any write transaction, while the
+    old profile stays in effect.  Then, in one transaction, they are written to
+    the entries that have not changed since (by ``version``), the entries that
+    did are recomputed, and the new height and sex are applied.
+    """
+    params = job.params
+    user_id, height, sex = params['user_id'], params['height'], params['sex']
+    computed = _entry_metrics(Entry.query.filter_by(user_id=user_id), height, sex)
+    # End the read transaction; SQLite cannot upgrade it to a write once
+    # another connection has written
+    db.session.rollback()
+
+    # Bumping the version locks the user against concurrent entry writes
+    versions = bump_data_version(user_id)
+    user = db.session.get(User, user_id)
+    if user is None:
+        raise LookupError(f"User {user_id} not found")
+    if [user.height, user.sex] != params['previous']:
+        # A later update changed height or sex again and has already been applied
+        db.session.rollback()
+        logger.info("Skipped superseded profile change of user %s", user_id)
+        return {'entries_updated': 0, 'superseded': True}
+
+    now = datetime.utcnow()
+    table = Entry.__table__
+    written = 0
+    if computed:
+        written = db.session.execute(
+            update(table).where(table.c.id == bindparam('entry_id'), table.c.version == bindparam('read_version'))
+            .values(fat_percentage=bindparam('fat'), muscle_mass=bindparam('muscle'), **written_values(user_id, versions, now)),
+            [{'entry_id': entry_id, 'read_version': version, 'fat': fat, 'muscle': muscle}
+             for entry_id, version, fat, muscle in computed]
+        ).rowcount
+    # Entries added or edited since they were read still have the old profile's metrics
+    stale = _entry_metrics(Entry.query.filter(Entry.user_id == user_id, Entry.version != versions[user_id]),
+                           height, sex)
+    if stale:
+        db.session.execute(update(Entry), [
+            {'id': entry_id, 'fat_percentage': fat, 'muscle_mass': muscle, **written_values(user_id, versions, now)}
+            for entry_id, _, fat, muscle in stale
+        ])
+
+    user.height, user.sex = height, sex
+    user.profile_version = versions[user_id]
+    user.updated_at = now
+    rebuild_trends([user_id])
+    db.session.commit()
+    invalidate_user(user_id)
+    invalidate_profile(user_id)
+    logger.info("Applied profile change of user %s to %s entries (%s rewritten after a concurrent change)",
+                user_id, written + len(stale), len(stale))
+    return {'entries_updated': written + len(stale), 'entries_recomputed_again': len(stale)}
+
+
+@job_handler('delete_user')
+def delete_user_job(job):
+    """Delete a user in the background (DELETE /api/users/<id>?background=true)."""
+    user_id = job.params['user_id']
+    user = User.query.get(user_id)
+    if not user:
+        raise LookupError(f"User {user_id} not found")
+    entries, goals = _delete_user(user)
+    return {'deleted_entries': entries, 'deleted_goals': goals}
+
+
+def _delete_user(user) -> tuple:
+    """Delete a user together with their entries, goals and trends; returns the entry and goal counts."""
+    user_id = user.id
+    # Delete user's entries and goals
+    entries = Entry.query.filter_by(user_id=user_id).delete()
+    goals = Goal.query.filter_by(user_id=user_id).delete()
+    TrendState.query.filter_by(user_id=user_id).delete()
+    DeletionLog.query.filter_by(user_id=user_id).delete()
+
+    db.session.delete(user)
+    db.session.commit()
+    invalidate_user(user_id)
+    invalidate_profile(user_id)
+    return entries, goals
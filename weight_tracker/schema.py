@@ -0,0 +1,131 @@
+from datetime import datetime
+
+from sqlalchemy import func, inspect, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from weight_tracker.config import logger
+from weight_tracker.models import db, Entry, Goal, User, TrendState, SchemaVersion, recompute_entry_metrics
+from weight_tracker.trends import rebuild_trends
+
+# Columns added to existing tables after their first release.  db.create_all()
+# only creates missing tables, so databases created by an older version of the
+# app are brought up to date here with ALTER TABLE.
+# Each item is (table, column, column DDL).
+ADDED_COLUMNS = [
+    ('entry', 'fat_percentage', 'FLOAT'),
+    ('entry', 'muscle_mass', 'FLOAT'),
+    ('user', 'data_version', 'INTEGER NOT NULL DEFAULT 0'),
+    ('user', 'profile_version', 'INTEGER NOT NULL DEFAULT 0'),
+    ('user', 'updated_at', 'DATETIME'),
+    ('entry', 'version', 'INTEGER NOT NULL DEFAULT 0'),
+    ('entry', 'updated_at', 'DATETIME'),
+    ('goal', 'version', 'INTEGER NOT NULL DEFAULT 0'),
+    ('goal', 'updated_at', 'DATETIME'),
+    ('job', 'lease_expires_at', 'DATETIME'),
+]
+
+
+def upgrade_schema() -> list:
+    """
+    Add any columns and indexes missing from existing tables and backfill derived data.
+
+    Returns the list of ``table.column`` names that were added.
+    """
+    inspector = inspect(db.engine)
+    added = []
+
+    for table, column, ddl in ADDED_COLUMNS:
+        existing = {col['name'] for col in inspector.get_columns(table)}
+        if column in existing:
+            continue
+        db.session.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+        added.append(f"{table}.{column}")
+        logger.info("Added column %s.%s", table, column)
+
+    # Indexes declared on the models are only created by create_all() together
+    # with their table, so create any that an older database is missing
+    connection = db.session.connection()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+    # Newly added derived-metric columns start out NULL; fill them in once
+    backfilled = bool({'entry.fat_percentage', 'entry.muscle_mass'} & set(added))
+    if backfilled:
+        count = recompute_entry_metrics()
+        logger.info("Backfilled derived metrics for %s entries", count)
+
+    # Trend states are maintained as entries change; build them for databases
+    # whose entries predate them or whose derived metrics were just backfilled
+    if backfilled or (db.session.query(TrendState.user_id).first() is None
+                       and db.session.query(Entry.id).first() is not None):
+        rebuild_trends()
+
+    db.session.commit()
+    return added
+
+
+def _create_tables() -> None:
+    """Create missing tables and upgrade databases that predate schema versioning."""
+    db.create_all()
+    upgrade_schema()
+
+
+def _add_change_tracking() -> None:
+    """Add the version/updated_at columns and deletion log used by the change feed."""
+    _create_tables()
+    # Rows written before the columns existed count as written now
+    now = datetime.utcnow()
+    for model in (User, Entry, Goal):
+        db.session.query(model).filter(model.updated_at.is_(None)) \
+            .update({model.updated_at: now}, synchronize_session=False)
+
+
+# Ordered schema migrations as (version, description, step).  A step makes its
+# changes in the session; migrate() records the version and commits.  Append
+# new steps here rather than editing released ones.  Columns and tables are
+# also added to the models (and ADDED_COLUMNS), so a new database gets them
+# from the first step and later steps must tolerate that.
+MIGRATIONS = [
+    (1, 'Create tables and upgrade unversioned databases', _create_tables),
+    (2, 'Add change tracking for the delta-sync feed', _add_change_tracking),
+    (3, 'Add leases to background jobs', _create_tables),
+]
+
+# Schema version this code expects
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def current_schema_version() -> int:
+    """
+    Return the database's schema version, 0 for a new or unversioned database.
+
+    This is a single query, cheap enough to run on every startup.
+    """
+    try:
+        return db.session.query(func.max(SchemaVersion.version)).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        # No schema_version table yet
+        db.session.rollback()
+        return 0
+
+
+def migrate() -> list:
+    """
+    Apply every migration newer than the database's schema version, in order.
+
+    Each migration is committed together with its version, so an interrupted
+    run resumes from the first migration that did not finish.  Returns the
+    versions applied.
+    """
+    current = current_schema_version()
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        logger.info("Applying schema migration %s: %s", version, description)
+        step()
+        db.session.add(SchemaVersion(version=version, description=description))
+        db.session.commit()
+        applied.append(version)
+    return applied
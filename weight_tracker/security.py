@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import session
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from weight_tracker.config import (PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE,
+                                   SESSION_PROFILE_SNAPSHOT, SESSION_PROFILE_MAX_AGE)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password hashes are already running or waiting."""
+
+
+class PasswordHasher:
+    """
+    Hash and verify passwords on a small bounded thread pool.
+
+    Werkzeug's PBKDF2 takes a few hundred milliseconds of CPU and releases the
+    GIL while it runs, so an unbounded burst of logins would take every core
+    away from other requests.  At most ``max_workers`` hashes run at once and
+    at most ``max_pending`` more wait; beyond that PasswordHasherBusy is raised
+    so the caller can shed the request.  The pool is created on first use in
+    each process, so it is never inherited across a fork.
+
+    This bounds the CPU spent on hashing; it does not free the calling thread,
+    which waits for the result.  A login still occupies a server thread for
+    the whole hash (or until it is shed), so size the server's threads for the
+    logins it should hold at once.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self._slots = threading.BoundedSemaphore(max(max_workers, 1) + max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='password-hash')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _call(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            if self.max_workers <= 0:
+                return func(*args)
+            return self._get_executor().submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password: str) -> str:
+        return self._call(generate_password_hash, password)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        return self._call(check_password_hash, password_hash, password)
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE)
+
+
+def store_session_profile(profile: dict) -> None:
+    """
+    Log a user in to the current session, keeping a snapshot of their profile
+    in the signed session cookie when SESSION_PROFILE_SNAPSHOT is enabled.
+    """
+    session['user_id'] = profile['id']
+    if SESSION_PROFILE_SNAPSHOT:
+        session['profile'] = profile
+        session['profile_at'] = time.time()
+
+
+def session_profile():
+    """Return the session's profile snapshot if it is enabled and recent enough, else None."""
+    if not SESSION_PROFILE_SNAPSHOT:
+        return None
+    profile = session.get('profile')
+    if not profile or profile.get('id') != session.get('user_id'):
+        return None
+    if time.time() - session.get('profile_at', 0) > SESSION_PROFILE_MAX_AGE:
+        return None
+    return profile
+
+
+def clear_session_profile() -> None:
+    """Log the current session out."""
+    for key in ('user_id', 'profile', 'profile_at'):
+        session.pop(key, None)
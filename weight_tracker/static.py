@@ -0,0 +1,180 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from dataclasses import dataclass, field
+
+from flask import Response, jsonify, request
+
+from weight_tracker.config import logger
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+# Content types worth compressing; images and fonts are already compressed
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json',
+                      'application/manifest+json', 'image/svg+xml', 'application/xml')
+# Files smaller than this gain nothing from compression
+MIN_COMPRESS_SIZE = 1024
+
+# Create React App fingerprints bundles as name.<content hash>.ext, which makes
+# them safe to cache forever: a new build produces a new name
+HASHED_NAME = re.compile(r'\.[0-9a-f]{8,}\.')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+# Everything else (index.html, manifest.json, ...) is revalidated on every use
+REVALIDATE_CACHE = 'no-cache'
+
+# Preferred encoding first
+ENCODINGS = ('br', 'gzip')
+
+
+@dataclass
+class StaticAsset:
+    body: bytes
+    mimetype: str
+    etag: str
+    cache_control: str
+    # Content-Encoding -> compressed body
+    variants: dict = field(default_factory=dict)
+
+
+def _is_compressible(mimetype: str) -> bool:
+    return mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(body: bytes) -> dict:
+    """Return the gzip (and, when available, brotli) encodings of ``body``."""
+    variants = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    return variants
+
+
+def _load_variants(path: str, body: bytes) -> dict:
+    variants = {}
+    for encoding, suffix in (('gzip', '.gz'), ('br', '.br')):
+        precompressed = path + suffix
+        if os.path.isfile(precompressed) and os.path.getmtime(precompressed) >= os.path.getmtime(path):
+            with open(precompressed, 'rb') as handle:
+                variants[encoding] = handle.read()
+    if 'gzip' not in variants or ('br' not in variants and brotli is not None):
+        for encoding, data in compress(body).items():
+            variants.setdefault(encoding, data)
+    # Keep only variants that are actually smaller
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body)}
+
+
+def build_asset_table(build_dir: str) -> dict:
+    """Index every file under ``build_dir`` by its URL path (e.g. ``/static/js/main.1a2b3c4d.js``)."""
+    table = {}
+    if not os.path.isdir(build_dir):
+        logger.warning("Frontend build directory %s not found; only the API is served", build_dir)
+        return table
+
+    for directory, _, filenames in os.walk(build_dir):
+        for filename in filenames:
+            if filename.endswith(('.gz', '.br')):
+                continue
+            path = os.path.join(directory, filename)
+            with open(path, 'rb') as handle:
+                body = handle.read()
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            variants = {}
+            if len(body) >= MIN_COMPRESS_SIZE and _is_compressible(mimetype):
+                variants = _load_variants(path, body)
+            url_path = '/' + os.path.relpath(path, build_dir).replace(os.sep, '/')
+            table[url_path] = StaticAsset(
+                body=body,
+                mimetype=mimetype,
+                etag=hashlib.blake2b(body, digest_size=12).hexdigest(),
+                cache_control=IMMUTABLE_CACHE if HASHED_NAME.search(filename) else REVALIDATE_CACHE,
+                variants=variants
+            )
+
+    logger.info("Indexed %s static files from %s", len(table), build_dir)
+    return table
+
+
+def _choose_encoding(asset: StaticAsset):
+    for encoding in ENCODINGS:
+        if encoding in asset.variants and request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def asset_response(asset: StaticAsset) -> Response:
+    """Serve an asset in the best encoding the client accepts, honouring If-None-Match."""
+    encoding = _choose_encoding(asset)
+    # Each encoding is a different representation and needs its own ETag
+    etag = f"{asset.etag}-{encoding}" if encoding else asset.etag
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        body = asset.variants[encoding] if encoding else asset.body
+        response = Response(body, mimetype=asset.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = asset.cache_control
+    if asset.variants:
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def init_static(app, build_dir: str) -> None:
+    """
+    Serve the React build at ``/`` with a fallback to ``index.html``.
+
+    Every file of the build is read once here and looked up in memory per
+    request.  Fingerprinted bundles get a year-long immutable Cache-Control and
+    everything else is revalidated by ETag.  Responses are gzip- or
+    brotli-encoded when the client accepts it (brotli needs the optional
+    ``brotli`` package).  Paths that are not files of the build are client-side
+    routes and get ``index.html``, except API paths and missing files under
+    ``/static/``, which are real 404s.
+    """
+    table = build_asset_table(build_dir)
+    app.extensions['static_assets'] = table
+
+    def serve_frontend(path=''):
+        asset = table.get('/' + path) if path else None
+        if asset is None:
+            if path.startswith(('api/', 'static/')):
+                return jsonify({'error': 'Not found'}), 404
+            asset = table.get('/index.html')
+            if asset is None:
+                return jsonify({'error': 'Frontend build not found'}), 404
+        return asset_response(asset)
+
+    app.add_url_rule('/', 'serve_frontend', serve_frontend, methods=['GET'])
+    app.add_url_rule('/<path:path>', 'serve_frontend', serve_frontend, methods=['GET'])
+
+
+def write_precompressed(build_dir: str) -> int:
+    """
+    Write ``.gz``/``.br`` files next to every compressible file of a build.
+
+    Run as a build step (``flask --app weight_tracker.wsgi compress-static``) so
+    servers load the variants instead of compressing at startup.  Returns the
+    number of files written.
+    """
+    written = 0
+    for directory, _, filenames in os.walk(build_dir):
+        for filename in filenames:
+            if filename.endswith(('.gz', '.br')):
+                continue
+            path = os.path.join(directory, filename)
+            mimetype = mimetypes.guess_type(filename)[0] or ''
+            if not _is_compressible(mimetype) or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+                continue
+            with open(path, 'rb') as handle:
+                body = handle.read()
+            for encoding, data in compress(body).items():
+                with open(path + ('.br' if encoding == 'br' else '.gz'), 'wb') as handle:
+                    handle.write(data)
+                written += 1
+    return written
@@ -0,0 +1,43 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from weight_tracker.config import logger
+
+
+def engine_options(database_uri, pool_options) -> dict:
+    """
+    Build SQLALCHEMY_ENGINE_OPTIONS for the configured database.
+
+    Pool sizing only applies to databases that use a connection pool; in-memory
+    SQLite is served from a single connection and is left untouched.
+    """
+    url = make_url(database_uri)
+    if url.get_backend_name() != 'sqlite':
+        return dict(pool_options)
+    if url.database in (None, '', ':memory:'):
+        return {}
+
+    options = dict(pool_options)
+    if options:
+        # Pooled connections are handed between server threads
+        options['connect_args'] = {'check_same_thread': False}
+    return options
+
+
+def configure_sqlite_pragmas(engine, pragmas) -> None:
+    """Apply the given PRAGMAs to every new connection of a SQLite engine."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    statements = [f"PRAGMA {name}={value}" for name, value in pragmas.items()]
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    logger.info("SQLite pragmas enabled: %s", ', '.join(statements))
@@ -0,0 +1,256 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+from flask import g
+from sqlalchemy import select
+
+from weight_tracker.config import ENTRY_STORE_MAX_BYTES
+from weight_tracker.lazy import lazy_import
+from weight_tracker.models import db, Entry, User
+
+np = lazy_import('numpy')
+
+# Numeric entry columns held by a series, in row order of UserSeries.values
+SERIES_FIELDS = ('weight', 'neck', 'belly', 'hip', 'fat_percentage', 'muscle_mass')
+
+# A series row with the attributes of an Entry that progress calculations read
+EntryRow = namedtuple('EntryRow', ('id', 'date', 'user_id') + SERIES_FIELDS)
+
+_MICROSECONDS_PER_DAY = 86_400_000_000
+
+
+def to_microseconds(date) -> int:
+    """Entry date (naive datetime) as int64 microseconds since the epoch."""
+    return int(np.datetime64(date, 'us').astype(np.int64))
+
+
+class UserSeries:
+    """
+    One user's entries as parallel typed arrays, sorted by (date, id).
+
+    ``dates`` holds int64 microseconds since the epoch so entries keep their
+    exact ordering and keyset cursors; ``values`` is a float64 array with one
+    row per SERIES_FIELDS column and NaN where a value is missing.  A series
+    is never modified once built: changes produce a new series, so requests
+    reading the old one are unaffected.
+    """
+    __slots__ = ('user_id', 'version', 'ids', 'dates', 'values')
+
+    def __init__(self, user_id, version, ids, dates, values):
+        self.user_id = user_id
+        self.version = version
+        self.ids = ids
+        self.dates = dates
+        self.values = values
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.dates.nbytes + self.values.nbytes
+
+    def position(self, date_us: int, entry_id: int) -> int:
+        """Index of the first entry whose (date, id) is not below the given key."""
+        low = int(np.searchsorted(self.dates, date_us, 'left'))
+        high = int(np.searchsorted(self.dates, date_us, 'right'))
+        return low + int(np.searchsorted(self.ids[low:high], entry_id, 'left'))
+
+    def date_range(self, date_from=None, date_to=None):
+        """``(start, stop)`` indices of the entries between two dates; ``date_to`` is inclusive of the whole day."""
+        start = int(np.searchsorted(self.dates, to_microseconds(date_from), 'left')) if date_from else 0
+        stop = len(self)
+        if date_to:
+            stop = int(np.searchsorted(self.dates, to_microseconds(date_to) + _MICROSECONDS_PER_DAY, 'left'))
+        return start, stop
+
+    def without(self, entry_id, version):
+        """A copy of this series at ``version`` without the given entry."""
+        index = np.flatnonzero(self.ids == entry_id)
+        return UserSeries(self.user_id, version, np.delete(self.ids, index), np.delete(self.dates, index),
+                          np.delete(self.values, index, axis=1))
+
+    def with_entry(self, entry_id, date_us, values, version):
+        """A copy of this series at ``version`` with the given entry added (or replaced)."""
+        series = self.without(entry_id, version)
+        index = series.position(date_us, entry_id)
+        return UserSeries(self.user_id, version, np.insert(series.ids, index, entry_id),
+                          np.insert(series.dates, index, date_us),
+                          np.insert(series.values, index, values, axis=1))
+
+    def date_strings(self, indices) -> list:
+        """Dates of the given entries formatted like Entry.to_dict."""
+        days = self.dates[indices].astype('datetime64[us]').astype('datetime64[D]')
+        return np.datetime_as_string(days).tolist()
+
+    def to_dicts(self, indices) -> list:
+        """Serialise the given entries, producing the same dicts as Entry.to_dict."""
+        indices = np.asarray(indices, dtype=np.int64)
+        ids = self.ids[indices].tolist()
+        dates = self.date_strings(indices)
+        columns = [[None if value != value else value for value in row]
+                   for row in self.values[:, indices].tolist()]
+        result = []
+        for i, (entry_id, date) in enumerate(zip(ids, dates)):
+            entry_dict = {'id': entry_id, 'date': date}
+            for field, column in zip(SERIES_FIELDS, columns):
+                entry_dict[field] = column[i]
+            entry_dict['user_id'] = self.user_id
+            result.append(entry_dict)
+        return result
+
+    def row(self, index) -> EntryRow:
+        """An entry of the series as an EntryRow (dates as datetime, missing values as None)."""
+        values = [None if value != value else value for value in self.values[:, index].tolist()]
+        date = self.dates[index].astype('datetime64[us]').item()
+        return EntryRow(int(self.ids[index]), date, self.user_id, *values)
+
+
+def _entry_values(entry):
+    return [np.nan if getattr(entry, field) is None else getattr(entry, field) for field in SERIES_FIELDS]
+
+
+def load_series(user_id, version) -> UserSeries:
+    """Build a user's series from a single query."""
+    stmt = select(Entry.id, Entry.date, *(getattr(Entry, field) for field in SERIES_FIELDS)) \
+        .where(Entry.user_id == user_id).order_by(Entry.date, Entry.id)
+    rows = db.session.execute(stmt).all()
+    if not rows:
+        return UserSeries(user_id, version, np.empty(0, np.int64), np.empty(0, np.int64),
+                          np.empty((len(SERIES_FIELDS), 0), np.float64))
+    columns = list(zip(*rows))
+    ids = np.array(columns[0], dtype=np.int64)
+    dates = np.array(columns[1], dtype='datetime64[us]').astype(np.int64)
+    values = np.array([[np.nan if value is None else value for value in column] for column in columns[2:]],
+                      dtype=np.float64)
+    return UserSeries(user_id, version, ids, dates, values)
+
+
+class EntryStore:
+    """
+    Read-through cache of UserSeries with least-recently-used eviction by memory.
+
+    Each series is tagged with the user's data_version.  A read at a newer
+    version reloads the series, so writes made by other processes are never
+    missed.  Writes made here are applied to a cached series without a reload
+    when it was exactly one version behind.  ``max_bytes`` bounds the memory
+    held by the arrays; 0 disables the store.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _store(self, series) -> None:
+        previous = self._data.pop(series.user_id, None)
+        if previous is not None:
+            self._bytes -= previous.nbytes
+        if series.nbytes > self.max_bytes:
+            return
+        self._data[series.user_id] = series
+        self._bytes += series.nbytes
+        while self._bytes > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def get(self, user_id, version) -> UserSeries:
+        """Return the user's series at ``version``, loading it on a miss."""
+        with self._lock:
+            series = self._data.get(user_id)
+            if series is not None and series.version == version:
+                self._data.move_to_end(user_id)
+                self.hits += 1
+                return series
+            self.misses += 1
+        series = load_series(user_id, version)
+        with self._lock:
+            current = self._data.get(user_id)
+            if current is None or current.version <= version:
+                self._store(series)
+        return series
+
+    def _apply(self, user_id, version, change) -> None:
+        with self._lock:
+            series = self._data.get(user_id)
+            if series is None or series.version == version:
+                return
+            if series.version == version - 1:
+                self._store(change(series))
+            else:
+                # Missed a write made elsewhere; reload on the next read
+                self._bytes -= series.nbytes
+                del self._data[user_id]
+
+    def record_removed(self, user_id, entry_id, versions) -> None:
+        """Drop an entry from a cached series after its deletion was committed."""
+        if user_id in versions:
+            self._apply(user_id, versions[user_id], lambda series: series.without(entry_id, versions[user_id]))
+
+    def record_saved(self, row, versions) -> None:
+        """Add or replace an entry in a cached series after it was committed; ``row`` is from snapshot_row()."""
+        entry_id, user_id, date_us, values = row
+        if user_id in versions:
+            self._apply(user_id, versions[user_id],
+                        lambda series: series.with_entry(entry_id, date_us, values, versions[user_id]))
+
+    def invalidate(self, *user_ids) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                series = self._data.pop(user_id, None)
+                if series is not None:
+                    self._bytes -= series.nbytes
+
+    def stats(self) -> dict:
+        """Return the current size and hit/miss/eviction counters."""
+        with self._lock:
+            return {
+                'users': len(self._data),
+                'entries': sum(len(series) for series in self._data.values()),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+def snapshot_row(entry):
+    """
+    Capture a flushed entry for EntryStore.record_saved.
+
+    Take it before committing: afterwards the entry is expired and reading it
+    would query the database again.
+    """
+    return entry.id, entry.user_id, to_microseconds(entry.date), _entry_values(entry)
+
+
+# Compact per-user entry histories shared by the read routes of this process
+entry_store = EntryStore(ENTRY_STORE_MAX_BYTES)
+
+
+def user_series(user_id):
+    """
+    Return a user's current series, or None when the store is disabled or the user does not exist.
+
+    Uses the data version already read by conditional_user_response when there
+    is one, so a cached series costs no query at all.
+    """
+    if not entry_store.enabled:
+        return None
+    known = g.get('user_data_versions', {})
+    version = known.get(user_id)
+    if version is None:
+        version = db.session.query(User.data_version).filter(User.id == user_id).scalar()
+        if version is None:
+            return None
+    return entry_store.get(user_id, version)
@@ -0,0 +1,247 @@
+from bisect import insort
+from datetime import timedelta
+
+from weight_tracker.config import logger, TREND_HALF_LIFE_DAYS, TREND_WINDOW_DAYS
+from weight_tracker.lazy import lazy_import
+from weight_tracker.models import db, Entry, TrendState
+
+np = lazy_import('numpy')
+
+# Entry columns that get a trend
+TREND_METRICS = ('weight', 'fat_percentage', 'muscle_mass')
+
+# A target counts as reached once the trend is this close to it
+TARGET_TOLERANCE = {'weight': 0.1, 'fat_percentage': 0.1, 'muscle_mass': 0.1}
+
+# Projections further out than this are reported as unreachable
+MAX_PROJECTION_DAYS = 3650
+
+_SECONDS_PER_DAY = 86400.0
+
+
+def _days(date, anchor) -> float:
+    return (date - anchor).total_seconds() / _SECONDS_PER_DAY
+
+
+def _decay(days):
+    """Weight of an observation ``days`` before the anchor."""
+    return 0.5 ** (days / TREND_HALF_LIFE_DAYS)
+
+
+def _window_start(state):
+    return state.latest_date - timedelta(days=TREND_WINDOW_DAYS)
+
+
+def _move_anchor(state, anchor) -> None:
+    """Re-express the sums relative to a later anchor, decaying the existing weights."""
+    shift = _days(anchor, state.anchor)
+    factor = _decay(shift)
+    sum_w, sum_wt, sum_wy = state.sum_w, state.sum_wt, state.sum_wy
+    # Every t becomes t - shift and every weight is multiplied by factor
+    state.sum_wtt = factor * (state.sum_wtt - 2 * shift * sum_wt + shift * shift * sum_w)
+    state.sum_wty = factor * (state.sum_wty - shift * sum_wy)
+    state.sum_wt = factor * (sum_wt - shift * sum_w)
+    state.sum_w = factor * sum_w
+    state.sum_wy = factor * sum_wy
+    state.anchor = anchor
+
+
+def _apply(state, date, value, sign) -> None:
+    """Add (``sign=1``) or remove (``sign=-1``) one observation from the weighted sums."""
+    if sign > 0 and date > state.anchor:
+        _move_anchor(state, date)
+    t = _days(date, state.anchor)
+    w = sign * _decay(-t)
+    state.sum_w += w
+    state.sum_wt += w * t
+    state.sum_wy += w * value
+    state.sum_wtt += w * t * t
+    state.sum_wty += w * t * value
+    state.count += sign
+
+
+def _window_add(state, date, value) -> None:
+    """Add an observation to the rolling window, dropping points that fall out of it."""
+    if date > state.latest_date:
+        state.latest_date = date
+    if date <= _window_start(state):
+        return
+    start = _window_start(state).isoformat()
+    window = [point for point in state.window if point[0] > start]
+    insort(window, [date.isoformat(), value])
+    # Assign a new list so the JSON column is marked as changed
+    state.window = window
+
+
+def _refresh_window(state) -> None:
+    """Reload the latest date and rolling window of a state from the entry index."""
+    column = getattr(Entry, state.metric)
+    present = db.session.query(Entry).filter(Entry.user_id == state.user_id, column.isnot(None))
+    latest = present.with_entities(db.func.max(Entry.date)).scalar()
+    state.latest_date = latest
+    rows = present.filter(Entry.date > _window_start(state)) \
+        .with_entities(Entry.date, column).order_by(Entry.date, Entry.id)
+    state.window = [[date.isoformat(), value] for date, value in rows]
+
+
+def _get_state(user_id, metric, date=None):
+    state = db.session.get(TrendState, (user_id, metric))
+    if state is None and date is not None:
+        state = TrendState(user_id=user_id, metric=metric, count=0, anchor=date, latest_date=date,
+                           sum_w=0.0, sum_wt=0.0, sum_wy=0.0, sum_wtt=0.0, sum_wty=0.0, window=[])
+        db.session.add(state)
+    return state
+
+
+def snapshot(entry) -> dict:
+    """Capture the trend-relevant values of an entry before it is modified."""
+    return {'user_id': entry.user_id, 'date': entry.date,
+            **{metric: getattr(entry, metric) for metric in TREND_METRICS}}
+
+
+def record_entry_added(entry) -> None:
+    """Fold a new entry into its owner's trends in constant time."""
+    values = snapshot(entry)
+    for metric in TREND_METRICS:
+        if values[metric] is None:
+            continue
+        state = _get_state(entry.user_id, metric, entry.date)
+        _apply(state, entry.date, values[metric], 1)
+        _window_add(state, entry.date, values[metric])
+
+
+def record_entry_changed(before, entry=None) -> None:
+    """
+    Update trends after an entry was edited (``entry`` given) or deleted.
+
+    ``before`` is the entry's snapshot() from before the change.  Call this after
+    the change has been made in the session.  The weighted sums are adjusted in
+    constant time; the rolling window is reloaded from the index only when the
+    change falls inside it.
+    """
+    after = snapshot(entry) if entry is not None else None
+    touched = set()
+    for metric in TREND_METRICS:
+        old_point = (before['user_id'], before['date'], before[metric])
+        new_point = (after['user_id'], after['date'], after[metric]) if after else (None, None, None)
+        if old_point == new_point:
+            continue
+        if old_point[2] is not None:
+            state = _get_state(old_point[0], metric)
+            if state is not None:
+                _apply(state, old_point[1], old_point[2], -1)
+                if old_point[1] > _window_start(state):
+                    touched.add(state)
+        if new_point[2] is not None:
+            state = _get_state(new_point[0], metric, new_point[1])
+            _apply(state, new_point[1], new_point[2], 1)
+            touched.add(state)
+
+    for state in touched:
+        if state.count <= 0:
+            db.session.delete(state)
+        else:
+            _refresh_window(state)
+
+
+def rebuild_trends(user_ids=None) -> int:
+    """
+    Recompute trend states from scratch for the given users (default: everyone).
+
+    Used after bulk changes such as imports or a metric recompute.  The caller
+    is responsible for committing.  Returns the number of states written.
+    """
+    query = db.session.query(Entry.user_id).distinct()
+    deleted = db.session.query(TrendState)
+    if user_ids is not None:
+        user_ids = {user_id for user_id in user_ids if user_id is not None}
+        if not user_ids:
+            return 0
+        query = query.filter(Entry.user_id.in_(user_ids))
+        deleted = deleted.filter(TrendState.user_id.in_(user_ids))
+    deleted.delete(synchronize_session='fetch')
+
+    written = 0
+    for (user_id,) in query.all():
+        rows = db.session.query(Entry.date, *(getattr(Entry, metric) for metric in TREND_METRICS)) \
+            .filter(Entry.user_id == user_id).order_by(Entry.date, Entry.id).all()
+        dates = [row[0] for row in rows]
+        for index, metric in enumerate(TREND_METRICS, start=1):
+            points = [(date, row[index]) for date, row in zip(dates, rows) if row[index] is not None]
+            if not points:
+                continue
+            anchor = points[-1][0]
+            t = np.array([_days(date, anchor) for date, _ in points])
+            y = np.array([value for _, value in points], dtype=float)
+            w = _decay(-t)
+            state = TrendState(
+                user_id=user_id, metric=metric, count=len(points), anchor=anchor, latest_date=anchor,
+                sum_w=float(w.sum()), sum_wt=float((w * t).sum()), sum_wy=float((w * y).sum()),
+                sum_wtt=float((w * t * t).sum()), sum_wty=float((w * t * y).sum())
+            )
+            start = _window_start(state)
+            state.window = [[date.isoformat(), value] for date, value in points if date > start]
+            db.session.add(state)
+            written += 1
+
+    logger.info("Rebuilt %s trend states", written)
+    return written
+
+
+def summarize(state):
+    """
+    Return the trend statistics held in a state, or None when it has no data.
+
+    ``ewma`` is the exponentially weighted mean (half-life TREND_HALF_LIFE_DAYS),
+    ``rolling_average`` the plain mean of the last TREND_WINDOW_DAYS days,
+    ``slope_per_day`` the exponentially weighted least-squares slope and
+    ``trend_value`` that fitted line evaluated at the latest entry.
+    """
+    if state is None or state.count <= 0 or state.sum_w <= 0:
+        return None
+    mean_t = state.sum_wt / state.sum_w
+    ewma = state.sum_wy / state.sum_w
+    variance_t = state.sum_wtt / state.sum_w - mean_t * mean_t
+    slope = None
+    if state.count > 1 and variance_t > 1e-9:
+        slope = (state.sum_wty / state.sum_w - mean_t * ewma) / variance_t
+    latest_t = _days(state.latest_date, state.anchor)
+    trend_value = ewma + slope * (latest_t - mean_t) if slope is not None else ewma
+    window_values = [value for _, value in state.window]
+    return {
+        'latest_date': state.latest_date,
+        'ewma': ewma,
+        'rolling_average': sum(window_values) / len(window_values) if window_values else None,
+        'slope_per_day': slope,
+        'trend_value': trend_value
+    }
+
+
+def load_trends(user_ids) -> dict:
+    """Return ``{(user_id, metric): summary}`` for the given users with one query."""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return {}
+    states = TrendState.query.filter(TrendState.user_id.in_(user_ids))
+    return {(state.user_id, state.metric): summarize(state) for state in states}
+
+
+def project(summary, metric, target):
+    """
+    Return the date the trend reaches ``target``, or None if it is not heading there.
+
+    A trend already within TARGET_TOLERANCE of the target is reached on its
+    latest date.
+    """
+    if summary is None or target is None:
+        return None
+    difference = target - summary['trend_value']
+    if abs(difference) <= TARGET_TOLERANCE[metric]:
+        return summary['latest_date']
+    slope = summary['slope_per_day']
+    if not slope or difference * slope <= 0:
+        return None
+    days = difference / slope
+    if days > MAX_PROJECTION_DAYS:
+        return None
+    return summary['latest_date'] + timedelta(days=days)
@@ -1,6 +1,8 @@
-import numpy as np
+from weight_tracker.lazy import lazy_import
 from weight_tracker.config import logger
 
+np = lazy_import('numpy')
+
 def calculate_body_fat_percentage(weight, neck, belly, height=185, gender='male', hip=None):
     """
     Calculate body fat percentage using the US Navy method.
@@ -89,11 +91,184 @@ def infer_belly_circumference(fat_percentage, neck, height, gender='male', hip=N
         
         # Add some sanity checks - belly circumference shouldn't be smaller than neck or excessively large
         if belly_cm < neck or belly_cm > 200: 
-            logger.warning(f"Inferred belly circumference ({belly_cm:.1f} cm) seems unrealistic.")
+            logger.warning("Inferred belly circumference (%.1f cm) seems unrealistic.", belly_cm)
             # Return None or handle as an edge case? For now, return calculated value.
             
         return round(belly_cm, 1)
 
     except (ValueError, OverflowError) as e:
-        logger.error(f"Error calculating inferred belly circumference: {e}")
+        logger.error("Error calculating inferred belly circumference: %s", e)
         return None
+
+
+# ---------------------------------------------------------------------------
+# Vectorised variants
+#
+# The functions below operate on whole columns at once (e.g. every entry in a
+# user's history) and produce exactly the same values as the scalar functions
+# above.  Missing inputs (None/NaN) are masked rather than raising, so results
+# are returned as numpy masked arrays: masked rows are the ones for which the
+# scalar function would have been skipped, and ``.tolist()`` yields None there.
+# ---------------------------------------------------------------------------
+
+def _as_float_array(values, size=None):
+    """Convert a column of numbers (None allowed) or a single value to a float array."""
+    if values is None or np.isscalar(values):
+        return np.full(size, np.nan if values is None else float(values))
+    return np.asarray(values, dtype=float)
+
+
+def _is_male_array(gender, size):
+    """Return (is_male, has_gender) boolean arrays for a column of sex values."""
+    if gender is None or isinstance(gender, str):
+        gender = [gender] * size
+    has_gender = np.fromiter((bool(g) for g in gender), dtype=bool, count=size)
+    is_male = np.fromiter((bool(g) and g.lower() == 'male' for g in gender), dtype=bool, count=size)
+    return is_male, has_gender
+
+
+def _present(values):
+    """Mask of values that would be truthy in the scalar functions (non-missing, non-zero)."""
+    return ~np.isnan(values) & (values != 0)
+
+
+def calculate_body_fat_percentage_array(weight, neck, belly, height, gender, hip=None):
+    """
+    Vectorised calculate_body_fat_percentage.
+
+    Each argument is a column with one value per row (height and gender are
+    usually the owning user's profile repeated per entry); scalars are broadcast.
+    Rows missing weight, neck, belly, height or gender are masked.
+    """
+    weight = _as_float_array(weight)
+    size = weight.shape[0]
+    neck = _as_float_array(neck, size)
+    belly = _as_float_array(belly, size)
+    height = _as_float_array(height, size)
+    hip = _as_float_array(hip, size)
+    is_male, has_gender = _is_male_array(gender, size)
+
+    valid = (_present(weight) & _present(neck) & _present(belly)
+             & ~np.isnan(height) & has_gender)
+    use_hip = ~is_male & _present(hip)
+
+    # Convert measurements from cm to inches
+    neck_inches = neck / 2.54
+    belly_inches = belly / 2.54
+    height_inches = height / 2.54
+    hip_inches = hip / 2.54
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        circumference = np.where(use_hip, belly_inches + hip_inches - neck_inches,
+                                 belly_inches - neck_inches)
+        log_circumference = np.log10(circumference)
+        log_height = np.log10(height_inches)
+        body_fat = np.where(
+            is_male,
+            86.010 * log_circumference - 70.041 * log_height + 36.76,
+            163.205 * log_circumference - 97.684 * log_height - 78.387
+        )
+
+    # Same bounds as the scalar version (NaN propagates exactly like max/min)
+    body_fat = np.minimum(np.maximum(body_fat, 3), 50)
+    return np.ma.masked_array(body_fat, mask=~valid)
+
+
+def calculate_muscle_mass_array(weight, fat_percentage):
+    """Vectorised calculate_muscle_mass; masked wherever fat_percentage is masked."""
+    weight = _as_float_array(weight)
+    fat_percentage = np.ma.asarray(fat_percentage, dtype=float)
+    fat_values = fat_percentage.filled(np.nan)
+
+    valid = _present(weight) & ~np.ma.getmaskarray(fat_percentage) & (fat_values != 0)
+
+    fat_mass = weight * (fat_values / 100)
+    essential_mass = weight * 0.2
+    muscle_mass = np.maximum(weight - fat_mass - essential_mass, 0)
+    return np.ma.masked_array(muscle_mass, mask=~valid)
+
+
+def infer_belly_circumference_array(fat_percentage, neck, height, gender='male', hip=None):
+    """
+    Vectorised infer_belly_circumference.
+
+    Typically called with one row per goal (target fat percentages) against the
+    same neck/height/sex/hip.  Rows missing fat_percentage, neck or height are
+    masked instead of logging one warning each.
+    """
+    fat_percentage = _as_float_array(fat_percentage)
+    size = fat_percentage.shape[0]
+    neck = _as_float_array(neck, size)
+    height = _as_float_array(height, size)
+    hip = _as_float_array(hip, size)
+    is_male, has_gender = _is_male_array(gender, size)
+
+    valid = _present(fat_percentage) & _present(neck) & _present(height) & has_gender
+    use_hip = ~is_male & _present(hip)
+
+    # Convert measurements from cm to inches
+    neck_inches = neck / 2.54
+    height_inches = height / 2.54
+    hip_inches = hip / 2.54
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        log_height = np.log10(height_inches)
+        log_arg = np.where(
+            is_male,
+            (fat_percentage - 36.76 + 70.041 * log_height) / 86.010,
+            (fat_percentage + 78.387 + 97.684 * log_height) / 163.205
+        )
+        # float_power matches the scalar ``10**x`` bit for bit; np.power may not
+        circumference = np.float_power(10, log_arg)
+        belly_inches = np.where(use_hip, circumference + neck_inches - hip_inches,
+                                circumference + neck_inches)
+
+        # Convert back to cm
+        belly_cm = belly_inches * 2.54
+
+    unrealistic = valid & ((belly_cm < neck) | (belly_cm > 200))
+    if unrealistic.any():
+        logger.warning("%s inferred belly circumference(s) seem unrealistic.", int(unrealistic.sum()))
+
+    return np.ma.masked_array(np.round(belly_cm, 1), mask=~valid)
+
+
+def largest_triangle_three_buckets(x, y, threshold):
+    """
+    Downsample a series with the Largest-Triangle-Three-Buckets algorithm.
+
+    ``x`` must be sorted ascending.  Returns the indices (in order) of the
+    ``threshold`` points that best preserve the visual shape of the series; the
+    first and last points are always kept.  If the series already has no more
+    than ``threshold`` points (or threshold < 3) every index is returned.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = x.shape[0]
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    indices = np.empty(threshold, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    # Interior points are split into threshold - 2 buckets of (nearly) equal size
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+
+        # Average of the next bucket is the third vertex of the triangle
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        # Pick the point in this bucket forming the largest triangle with the
+        # previously selected point and the next bucket's average
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a])
+                       - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+
+    return indices
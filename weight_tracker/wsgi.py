@@ -0,0 +1,12 @@
+"""
+WSGI entry point for production servers:
+
+    gunicorn -c gunicorn.conf.py weight_tracker.wsgi:app
+
+The schema is not checked here, so that pre-forked workers do not each do
+it; gunicorn.conf.py does it once in the master process before any worker
+starts.  With another server, run ``flask --app weight_tracker migrate`` first.
+"""
+from weight_tracker import create_app
+
+app = create_app(initialize_database=False)